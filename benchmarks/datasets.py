@@ -0,0 +1,178 @@
+"""
+Synthetic benchmark datasets.
+
+The bundled examples in ``haplogrep/data/examples`` are scaled up to cohort
+size by repeating their samples under new names, so benchmarks exercise
+realistic file layouts without needing real cohort data.
+"""
+
+import random
+from pathlib import Path
+from typing import List, Optional
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES_DIR = REPO_ROOT / "haplogrep" / "data" / "examples"
+TREES_DIR = REPO_ROOT / "haplogrep" / "trees"
+
+EXAMPLE_VCF = EXAMPLES_DIR / "example-wgs.vcf"
+EXAMPLE_HSD = EXAMPLES_DIR / "evaluation-data.hsd"
+
+
+def _read_vcf(path: Path):
+    meta, header, records = [], None, []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("##"):
+                meta.append(line)
+            elif line.startswith("#CHROM"):
+                header = line.rstrip("\r\n").split("\t")
+            else:
+                records.append(line.rstrip("\r\n").split("\t"))
+    return meta, header, records
+
+
+def scale_vcf(dest: Path, samples: int, source: Path = EXAMPLE_VCF) -> Path:
+    """
+    Write a multi-sample VCF with ``samples`` sample columns.
+
+    Columns of the source VCF are repeated cyclically; repeated samples get
+    a ``_<n>`` suffix.
+    """
+    meta, header, records = _read_vcf(source)
+    names = header[9:]
+    picks = [i % len(names) for i in range(samples)]
+    new_names = [
+        names[j] if i < len(names) else f"{names[j]}_{i // len(names)}"
+        for i, j in enumerate(picks)
+    ]
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(dest, 'w', encoding='utf-8') as f:
+        f.writelines(meta)
+        f.write("\t".join(header[:9] + new_names) + "\n")
+        for record in records:
+            calls = record[9:]
+            f.write("\t".join(record[:9] + [calls[j] for j in picks]) + "\n")
+    return dest
+
+
+def split_vcf(out_dir: Path, files: int, source: Path = EXAMPLE_VCF) -> List[Path]:
+    """
+    Write ``files`` single-sample VCFs taken cyclically from the source.
+
+    Returns:
+        Paths of the written files
+    """
+    meta, header, records = _read_vcf(source)
+    names = header[9:]
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(files):
+        column = 9 + i % len(names)
+        path = out_dir / f"sample{i:06d}.vcf"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(meta)
+            f.write("\t".join(header[:9] + [f"{names[i % len(names)]}_{i}"]) + "\n")
+            for record in records:
+                f.write("\t".join(record[:9] + [record[column]]) + "\n")
+        paths.append(path)
+    return paths
+
+
+def scale_hsd(dest: Path, profiles: int, source: Path = EXAMPLE_HSD) -> Path:
+    """Write an HSD file with ``profiles`` profiles repeated from the source."""
+    with open(source, 'r', encoding='utf-8') as f:
+        lines = [line.rstrip("\r\n").split("\t") for line in f if line.strip()]
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(dest, 'w', encoding='utf-8') as f:
+        for i in range(profiles):
+            fields = list(lines[i % len(lines)])
+            if i >= len(lines):
+                fields[0] = f"{fields[0]}_{i // len(lines)}"
+            f.write("\t".join(fields) + "\n")
+    return dest
+
+
+def make_results(
+    out_dir: Path,
+    files: int,
+    rows_per_file: int,
+    haplogroups: List[str],
+    seed: Optional[int] = 0
+) -> List[Path]:
+    """
+    Write Haplogrep3 results files with random haplogroups and qualities.
+
+    Returns:
+        Paths of the written files
+    """
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(files):
+        path = out_dir / f"sample{i:06d}_haplogroups.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('"SampleID"\t"Haplogroup"\t"Rank"\t"Quality"\t"Range"\n')
+            for j in range(rows_per_file):
+                f.write(
+                    f'"S{i}_{j}"\t"{rng.choice(haplogroups)}"\t"1"\t'
+                    f'"{rng.uniform(0.5, 1.0):.4f}"\t"1-16569"\n'
+                )
+        paths.append(path)
+    return paths
+
+
+def mix_vcf(
+    dest: Path,
+    samples: int,
+    contaminated: float = 0.2,
+    level: float = 0.2,
+    source: Path = EXAMPLE_VCF,
+    seed: Optional[int] = 0
+) -> Path:
+    """
+    Write a multi-sample VCF with ``GT:AF`` calls, some of them mixtures.
+
+    Every sample is a column of the source VCF; a ``contaminated`` share of
+    them is mixed with a random different column at ``level``. Mixed samples get
+    a ``_mix<n>`` suffix naming the contaminating column.
+    """
+    rng = random.Random(seed)
+    meta, header, records = _read_vcf(source)
+    names = header[9:]
+    majors = [i % len(names) for i in range(samples)]
+    minors = [
+        (m + rng.randrange(1, len(names))) % len(names) if rng.random() < contaminated else None
+        for m in majors
+    ]
+    new_names = [
+        f"{names[m]}_{i}" + (f"_mix{c}" if c is not None else "")
+        for i, (m, c) in enumerate(zip(majors, minors))
+    ]
+
+    def allele(call: str) -> int:
+        value = call.split(":", 1)[0].replace("|", "/").split("/")[0]
+        return int(value) if value.isdigit() else 0
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(dest, 'w', encoding='utf-8') as f:
+        f.writelines(m for m in meta if not m.startswith("##FORMAT"))
+        f.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+        f.write('##FORMAT=<ID=AF,Number=A,Type=Float,Description="Allele fraction">\n')
+        f.write("\t".join(header[:9] + new_names) + "\n")
+        for record in records:
+            alts = len(record[4].split(","))
+            calls = [allele(c) for c in record[9:]]
+            cells = []
+            for m, c in zip(majors, minors):
+                fractions = [0.0] * (alts + 1)
+                fractions[calls[m]] += 1.0 if c is None else 1.0 - level
+                if c is not None:
+                    fractions[calls[c]] += level
+                cells.append(f"{calls[m]}:" + ",".join(f"{x:.3g}" for x in fractions[1:]))
+            f.write("\t".join(record[:8] + ["GT:AF"] + cells) + "\n")
+    return dest
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the haplogrep3 launcher, used by the benchmark suite.
+
+It accepts the same ``classify`` and ``trees`` commands as haplogrep3, reads
+the sample IDs (and, for HSD and VCF input, the variants) from the input file
+and writes a results file in Haplogrep3's format. Haplogroups are assigned
+deterministically from the sample ID, so runs are reproducible. No Java is
+needed.
+
+Latency is configured through environment variables:
+
+    FAKE_HAPLOGREP3_STARTUP      Seconds before the first line of output (default 0)
+    FAKE_HAPLOGREP3_PER_SAMPLE   Seconds per classified sample (default 0)
+    FAKE_HAPLOGREP3_JITTER       Relative random variation of both delays (default 0)
+    FAKE_HAPLOGREP3_HANG_RATE    Fraction of runs that hang silently after startup (default 0)
+    FAKE_HAPLOGREP3_HANG         Seconds a hanging run hangs for (default 3600)
+    FAKE_HAPLOGREP3_SEED         Seed of the jitter and hang draws (default 0)
+
+Jitter and hangs are drawn from the seed and the input and output file names,
+so repeated runs see the same stragglers. A hanging run first writes the
+results header; a retry that finds this partial output does not hang again,
+while a hedged duplicate (written to a different file) gets its own draw.
+"""
+
+import hashlib
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+
+# Haplogroups present in all bundled rCRS trees
+HAPLOGROUPS = [
+    "H1", "H2a2a1", "H5", "HV0", "J1c", "K1a", "T2b", "U5a1", "V", "W1",
+    "I1", "X2", "N1b", "A2", "B4a1", "C1b", "D4", "M7b1a1", "F1a", "G2a",
+    "L0a1b", "L0d1", "L1b1a", "L1c2", "L2a1c", "L2b1a", "L3b1a", "L3d1a",
+    "L3e1a2", "L3e2b", "L3f1b", "L4b2", "L5a1", "L6",
+]
+
+TREES = [
+    "phylotree-fu-rcrs@1.2",
+    "phylotree-fu-rcrs@1.0",
+    "phylotree-rcrs@17.2",
+    "phylotree-rcrs@17.0",
+    "phylotree-rsrs@17.0",
+    "phylotree-rcrs@16.0",
+    "phylotree-rcrs@15.0",
+]
+
+EXTENDED_COLUMNS = ["Not_Found_Polys", "Found_Polys", "Remaining_Polys", "AAC_In_Remainings", "Input_Polys"]
+
+
+def _delay(rng: random.Random, variable: str, scale: float = 1.0):
+    seconds = float(os.environ.get(variable, "0")) * scale
+    jitter = float(os.environ.get("FAKE_HAPLOGREP3_JITTER", "0"))
+    if jitter:
+        seconds *= max(0.0, rng.uniform(1 - jitter, 1 + jitter))
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _read_samples(path: Path):
+    """Get (sample_id, range, polys) for every sample in the input file."""
+    suffix = path.suffix.lower()
+
+    if suffix == ".hsd" or suffix == ".txt":
+        samples = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = [c for c in line.rstrip("\r\n").split("\t")]
+                if not fields or not fields[0].strip():
+                    continue
+                polys = [p for p in fields[3:] if p.strip()] if len(fields) > 3 else []
+                samples.append((fields[0], fields[1].strip('"') if len(fields) > 1 else "1-16569", polys))
+        return samples
+
+    if suffix in (".fasta", ".fa", ".fas"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return [(line[1:].split()[0], "1-16569", []) for line in f if line.startswith(">")]
+
+    if suffix == ".vcf":
+        names = []
+        polys = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("##"):
+                    continue
+                fields = line.rstrip("\r\n").split("\t")
+                if line.startswith("#CHROM"):
+                    names = fields[9:]
+                    polys = [[] for _ in names]
+                    continue
+                alts = fields[4].split(",")
+                for i, call in enumerate(fields[9:]):
+                    allele = call.split(":", 1)[0].replace("|", "/").split("/")[0]
+                    if allele.isdigit() and allele != "0" and int(allele) <= len(alts):
+                        polys[i].append(f"{fields[1]}{alts[int(allele) - 1]}")
+        return [(name, "1-16569", p) for name, p in zip(names, polys)]
+
+    return [(path.stem, "1-16569", [])]
+
+
+def _classify(args):
+    options = {}
+    flags = set()
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("--") and "=" in arg:
+            key, value = arg.split("=", 1)
+            options[key] = value
+        elif arg in ("--in", "--out", "--tree", "--metric", "--chip", "--hits"):
+            options[arg] = args[i + 1]
+            i += 1
+        else:
+            flags.add(arg)
+        i += 1
+
+    input_path = Path(options["--in"])
+    output_path = Path(options["--out"])
+    hits = int(options.get("--hits", "1"))
+    extended = "--extend-report" in flags
+
+    seed = os.environ.get("FAKE_HAPLOGREP3_SEED", "0")
+    rng = random.Random(f"{seed}:{input_path.name}:{output_path.name}")
+    hangs = rng.random() < float(os.environ.get("FAKE_HAPLOGREP3_HANG_RATE", "0"))
+
+    _delay(rng, "FAKE_HAPLOGREP3_STARTUP")
+    print("HaploGrep 3 (benchmark stand-in)", flush=True)
+
+    if hangs and not output_path.exists():
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write('"SampleID"\t"Haplogroup"')
+        time.sleep(float(os.environ.get("FAKE_HAPLOGREP3_HANG", "3600")))
+
+    if not input_path.exists():
+        print(f"Error: Input file '{input_path}' not found.", flush=True)
+        return 1
+
+    print(f"Loading tree {options.get('--tree', TREES[0])}...", flush=True)
+    samples = _read_samples(input_path)
+    _delay(rng, "FAKE_HAPLOGREP3_PER_SAMPLE", scale=len(samples))
+
+    columns = ["SampleID", "Haplogroup", "Rank", "Quality", "Range"]
+    if extended:
+        columns += EXTENDED_COLUMNS
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write("\t".join(f'"{c}"' for c in columns) + "\n")
+        for sample_id, sample_range, polys in samples:
+            digest = hashlib.sha1(sample_id.encode("utf-8")).digest()
+            for rank in range(1, hits + 1):
+                haplogroup = HAPLOGROUPS[(digest[0] + rank - 1) % len(HAPLOGROUPS)]
+                quality = 0.7 + 0.3 * digest[1] / 255 - 0.05 * (rank - 1)
+                row = [sample_id, haplogroup, str(rank), f"{quality:.4f}", sample_range]
+                if extended:
+                    row += ["", " ".join(polys), "", "", " ".join(polys)]
+                f.write("\t".join(f'"{v}"' for v in row) + "\n")
+
+    print(f"Written {len(samples)} samples to {output_path}", flush=True)
+    return 0
+
+
+def main(argv):
+    if not argv:
+        print("Usage: haplogrep3 <classify|trees> [options]")
+        return 1
+    if argv[0] == "trees":
+        print("Available trees:")
+        for tree in TREES:
+            print(tree)
+        return 0
+    if argv[0] == "classify":
+        return _classify(argv[1:])
+    print(f"Error: Unknown command '{argv[0]}'.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
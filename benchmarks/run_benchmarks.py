@@ -0,0 +1,509 @@
+"""
+Benchmark suite for the Haplogrep3 wrapper.
+
+Runs against the stand-in launcher in ``fake_haplogrep3.py``, so it works on
+any Linux machine without Java, and writes machine-readable JSON. Pass a
+previous report with ``--baseline`` to flag performance regressions.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --output new.json --baseline bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy
+
+# Add parent directory to Python path to allow imports
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(parent_dir))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import haplogrep_wrapper
+from haplogrep_wrapper import BatchJournal, HaplogroupAggregator, Haplogrep3Wrapper, PhyloTree, iter_results
+from haplogrep_wrapper.annotation import load_annotation
+from haplogrep_wrapper.distance import PackedProfiles, ProfileDistance, TreeDistance
+from haplogrep_wrapper.journal import file_checksum
+from haplogrep_wrapper.metrics import count_input_samples
+from haplogrep_wrapper.phylotree import load_tree
+from haplogrep_wrapper.profiles import load_expected_profiles
+from haplogrep_wrapper.qc import ContaminationScreen, read_allele_fractions
+from haplogrep_wrapper.rules import AlignmentRules
+
+import datasets
+
+
+FAKE_HAPLOGREP3 = Path(__file__).resolve().parent / "fake_haplogrep3.py"
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "min": ordered[0],
+        "mean": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        "max": ordered[-1],
+    }
+
+
+def _timed(fn: Callable, repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def _primary(name: str, value: float, higher_is_better: bool) -> Dict:
+    return {"name": name, "value": value, "higher_is_better": higher_is_better}
+
+
+def bench_wrapper_overhead(work: Path, repeat: int) -> Dict:
+    """Time classify() against a bare subprocess call of the same command."""
+    input_file = datasets.split_vcf(work / "overhead", 1)[0]
+    output_file = work / "overhead" / "out.txt"
+    cmd = [str(FAKE_HAPLOGREP3), "classify", "--in", str(input_file), "--out", str(output_file),
+           "--tree", "phylotree-fu-rcrs@1.2"]
+
+    raw = _timed(lambda: subprocess.run(cmd, capture_output=True, text=True), repeat)
+
+    wrapper = Haplogrep3Wrapper(str(FAKE_HAPLOGREP3))
+    instrumented = _timed(lambda: wrapper.classify(input_file, output_file), repeat)
+
+    plain = Haplogrep3Wrapper(str(FAKE_HAPLOGREP3), collect_metrics=False)
+    uninstrumented = _timed(lambda: plain.classify(input_file, output_file), repeat)
+
+    overhead = statistics.median(instrumented) - statistics.median(raw)
+    return {
+        "raw_subprocess_s": _stats(raw),
+        "classify_s": _stats(instrumented),
+        "classify_without_metrics_s": _stats(uninstrumented),
+        "overhead_per_call_s": overhead,
+        "metrics_overhead_per_call_s": statistics.median(instrumented) - statistics.median(uninstrumented),
+        "primary": _primary("overhead_per_call_s", overhead, higher_is_better=False),
+    }
+
+
+def bench_batch_throughput(work: Path, files: int, worker_counts: List[int], startup: float) -> Dict:
+    """Measure files per second for sequential batches and queue workers."""
+    inputs = datasets.split_vcf(work / "batch_inputs", files)
+    env = dict(os.environ)
+    env["FAKE_HAPLOGREP3_STARTUP"] = str(startup)
+    env["PYTHONPATH"] = os.pathsep.join([str(parent_dir), env.get("PYTHONPATH", "")])
+
+    report = {"files": files, "startup_latency_s": startup, "runs": {}}
+
+    previous = os.environ.get("FAKE_HAPLOGREP3_STARTUP")
+    os.environ["FAKE_HAPLOGREP3_STARTUP"] = str(startup)
+    try:
+        wrapper = Haplogrep3Wrapper(str(FAKE_HAPLOGREP3))
+        started = time.perf_counter()
+        results = wrapper.classify_batch(inputs, work / "batch_sequential")
+        elapsed = time.perf_counter() - started
+    finally:
+        if previous is None:
+            del os.environ["FAKE_HAPLOGREP3_STARTUP"]
+        else:
+            os.environ["FAKE_HAPLOGREP3_STARTUP"] = previous
+    report["runs"]["sequential"] = {
+        "seconds": elapsed,
+        "files_per_s": files / elapsed,
+        "failed": sum(1 for r in results if not r.success),
+    }
+
+    for workers in worker_counts:
+        journal_path = work / f"queue_{workers}.db"
+        output_dir = work / f"batch_workers_{workers}"
+        wrapper.enqueue(inputs, output_dir, BatchJournal(journal_path))
+
+        started = time.perf_counter()
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "haplogrep_wrapper.worker", "run",
+                 "--journal", str(journal_path), "--haplogrep", str(FAKE_HAPLOGREP3), "--lease", "60"],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.wait()
+        elapsed = time.perf_counter() - started
+
+        summary = BatchJournal(journal_path).summary()
+        report["runs"][f"workers_{workers}"] = {
+            "seconds": elapsed,
+            "files_per_s": files / elapsed,
+            "failed": summary["FAILED"] + summary["PENDING"] + summary["RUNNING"],
+        }
+
+    best = max(run["files_per_s"] for run in report["runs"].values())
+    report["primary"] = _primary("best_files_per_s", best, higher_is_better=True)
+    return report
+
+
+def bench_tail_latency(work: Path, files: int, hang_rate: float, hang: float) -> Dict:
+    """Compare batch time with hanging runs, with and without tail-latency control."""
+    inputs = datasets.split_vcf(work / "tail_inputs", files)
+    variants = {
+        "uncontrolled": ({}, {}),
+        "stall_timeout_retry": ({"stall_timeout": hang / 4, "retries": 3, "retry_backoff": 0.0}, {}),
+        "hedged": ({}, {"hedge_after": 3.0}),
+    }
+
+    saved = {k: os.environ.get(k) for k in ("FAKE_HAPLOGREP3_HANG_RATE", "FAKE_HAPLOGREP3_HANG")}
+    os.environ["FAKE_HAPLOGREP3_HANG_RATE"] = str(hang_rate)
+    os.environ["FAKE_HAPLOGREP3_HANG"] = str(hang)
+    report = {"files": files, "hang_rate": hang_rate, "hang_s": hang, "runs": {}}
+    try:
+        for name, (options, batch_options) in variants.items():
+            wrapper = Haplogrep3Wrapper(str(FAKE_HAPLOGREP3), **options)
+            started = time.perf_counter()
+            results = wrapper.classify_batch(inputs, work / f"tail_{name}", max_workers=4, **batch_options)
+            elapsed = time.perf_counter() - started
+            job_times = [r.metrics.wall_time for r in results if r.metrics is not None]
+            report["runs"][name] = {
+                "seconds": elapsed,
+                "slowest_result_s": max(job_times) if job_times else None,
+                "failed": sum(1 for r in results if not r.success),
+                "retries": sum(len(r.retry_reasons) for r in results),
+                "hedged": sum(1 for r in results if r.hedged),
+            }
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    best = min(run["seconds"] for name, run in report["runs"].items() if name != "uncontrolled")
+    report["primary"] = _primary("controlled_batch_s", best, higher_is_better=False)
+    return report
+
+
+def bench_result_parsing(work: Path, files: int, rows_per_file: int) -> Dict:
+    """Measure streaming parse and aggregation speed of results files."""
+    tree = PhyloTree(datasets.TREES_DIR / "phylotree-fu-rcrs" / "1.2")
+    paths = datasets.make_results(work / "results", files, rows_per_file, sorted(tree.parents))
+    rows = files * rows_per_file
+
+    started = time.perf_counter()
+    parsed = sum(1 for path in paths for _ in iter_results(path))
+    parse_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    aggregator = HaplogroupAggregator()
+    aggregator.add_files(paths)
+    aggregate_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    aggregator.frequency_table(tree, level="macro")
+    table_s = time.perf_counter() - started
+
+    return {
+        "rows": parsed,
+        "parse_s": parse_s,
+        "parse_rows_per_s": rows / parse_s,
+        "aggregate_s": aggregate_s,
+        "aggregate_rows_per_s": rows / aggregate_s,
+        "frequency_table_s": table_s,
+        "primary": _primary("aggregate_rows_per_s", rows / aggregate_s, higher_is_better=True),
+    }
+
+
+def bench_tree_loading(repeat: int) -> Dict:
+    """Time cold loads of every installed tree package."""
+    report = {"trees": {}}
+    for tree_yaml in sorted(datasets.TREES_DIR.glob("*/*/tree.yaml")):
+        directory = tree_yaml.parent
+        durations = _timed(lambda: PhyloTree(directory), repeat)
+        name = f"{directory.parent.name}@{directory.name}"
+        report["trees"][name] = {"nodes": len(PhyloTree(directory)), "load_s": _stats(durations)}
+
+    total = sum(t["load_s"]["p50"] for t in report["trees"].values())
+    report["primary"] = _primary("total_load_s", total, higher_is_better=False)
+    return report
+
+
+def bench_annotation(positions: int, repeat: int) -> Dict:
+    """Map random positions to genes and codons with the GFF interval index."""
+    started = time.perf_counter()
+    index = load_annotation("phylotree-fu-rcrs@1.2", datasets.TREES_DIR)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(0)
+    sample = [rng.randint(1, index.length) for _ in range(positions)]
+    array = numpy.asarray(sample)
+
+    genes = _timed(lambda: index.gene_names(array), repeat)
+    codons = _timed(lambda: index.codons(array), repeat)
+
+    # Per-variant linear scan over the features, for comparison
+    scan_sample = sample[:10000]
+    started = time.perf_counter()
+    for position in scan_sample:
+        [f for f in index.features if f.start <= position <= f.end or f.start <= position + index.length <= f.end]
+    scan_rate = len(scan_sample) / (time.perf_counter() - started)
+
+    rate = positions / statistics.median(genes)
+    return {
+        "positions": positions,
+        "build_s": build_s,
+        "gene_names_s": _stats(genes),
+        "codons_s": _stats(codons),
+        "positions_per_s": rate,
+        "linear_scan_positions_per_s": scan_rate,
+        "primary": _primary("positions_per_s", rate, higher_is_better=True),
+    }
+
+
+def bench_contamination_screen(work: Path, samples: int, repeat: int) -> Dict:
+    """Screen a cohort VCF with synthetic mixtures for contamination."""
+    vcf = datasets.mix_vcf(work / "mixed.vcf", samples, contaminated=0.2, level=0.2)
+
+    started = time.perf_counter()
+    profiles = load_expected_profiles("phylotree-fu-rcrs@1.2", datasets.TREES_DIR)
+    build_s = time.perf_counter() - started
+    tree = load_tree("phylotree-fu-rcrs@1.2", datasets.TREES_DIR)
+    screen = ContaminationScreen(profiles, tree)
+
+    read = _timed(lambda: read_allele_fractions(vcf), repeat)
+    data = read_allele_fractions(vcf)
+    scored = _timed(lambda: screen.screen(data), repeat)
+    # One scoring pass over the dominant alleles alone, for comparison
+    dominant = [
+        [p for r in numpy.flatnonzero(data.fractions[:, s] >= 0.5) for p in data.polys[r]]
+        for s in range(samples)
+    ]
+    classify = _timed(lambda: profiles.classify(dominant), repeat)
+
+    results = screen.screen(data)
+    truth = [r.sample_id.rsplit("_mix", 1)[-1] != r.sample_id for r in results]
+    flagged = [r.contaminated for r in results]
+    rate = samples / statistics.median(scored)
+    return {
+        "samples": samples,
+        "alleles": int(data.fractions.shape[0]),
+        "profiles_build_s": build_s,
+        "read_s": _stats(read),
+        "screen_s": _stats(scored),
+        "classify_pass_s": _stats(classify),
+        "samples_per_s": rate,
+        "mixtures": sum(truth),
+        "detected": sum(t and f for t, f in zip(truth, flagged)),
+        "false_positives": sum(f and not t for t, f in zip(truth, flagged)),
+        "primary": _primary("samples_per_s", rate, higher_is_better=True),
+    }
+
+
+def bench_distance_matrix(work: Path, samples: int, repeat: int) -> Dict:
+    """Build all-pairs profile and tree distance matrices for a cohort."""
+    vcf = datasets.scale_vcf(work / "distance.vcf", samples)
+    data = read_allele_fractions(vcf)
+    profiles = [
+        [p for r in numpy.flatnonzero(data.fractions[:, s] >= 0.5) for p in data.polys[r]]
+        for s in range(samples)
+    ]
+    tree = load_tree("phylotree-fu-rcrs@1.2", datasets.TREES_DIR)
+    rng = random.Random(0)
+    haplogroups = [rng.choice(list(tree.parents)) for _ in range(samples)]
+
+    packed = PackedProfiles(profiles, data.samples)
+    hamming = _timed(lambda: ProfileDistance(packed).matrix(), repeat)
+    memmap = _timed(lambda: ProfileDistance(packed).matrix(out=work / "hamming.npy"), repeat)
+    nearest = _timed(lambda: ProfileDistance(packed).nearest(10), repeat)
+    tree_matrix = _timed(lambda: TreeDistance(tree, haplogroups).matrix(), repeat)
+
+    # Pairwise set differences in Python, for comparison
+    sets = [set(p) for p in profiles[:300]]
+    started = time.perf_counter()
+    [[len(a ^ b) for b in sets] for a in sets]
+    loop_rate = len(sets) ** 2 / (time.perf_counter() - started)
+
+    rate = samples ** 2 / statistics.median(hamming)
+    return {
+        "samples": samples,
+        "polymorphisms": len(packed.polys),
+        "hamming_s": _stats(hamming),
+        "hamming_memmap_s": _stats(memmap),
+        "nearest_10_s": _stats(nearest),
+        "tree_s": _stats(tree_matrix),
+        "pairs_per_s": rate,
+        "python_loop_pairs_per_s": loop_rate,
+        "primary": _primary("pairs_per_s", rate, higher_is_better=True),
+    }
+
+
+def bench_rules_normalization(work: Path, profiles: int, repeat: int) -> Dict:
+    """Normalize a cohort of HSD profiles with the alignment rules of a tree."""
+    hsd = datasets.scale_hsd(work / "normalize.hsd", profiles)
+    directory = datasets.TREES_DIR / "phylotree-fu-rcrs" / "1.2"
+    rules = AlignmentRules.from_directory(directory)
+
+    # Put the error side of a random rule into every fourth profile
+    rng = random.Random(0)
+    with open(hsd, 'r', encoding='utf-8') as f:
+        cohort = [[p for p in line.rstrip("\r\n").split("\t")[3:] if p.strip()] for line in f]
+    for polys in cohort[::4]:
+        polys.extend(rng.choice(rules.rules).error)
+
+    def cold():
+        return AlignmentRules.from_directory(directory).normalize_many(cohort, mask_hotspots=True)
+
+    normalize_cold = _timed(cold, repeat)
+    normalize_warm = _timed(lambda: rules.normalize_many(cohort, mask_hotspots=True), repeat)
+    # The scaled cohort repeats profiles; normalize each one without deduplication too
+    normalize_each = _timed(lambda: [rules.normalize(polys, mask_hotspots=True) for polys in cohort], repeat)
+    hsd_file = _timed(lambda: rules.normalize_hsd(hsd, work / "normalized.hsd"), repeat)
+
+    # Every rule checked against every profile, for comparison
+    sample = cohort[:2000]
+    started = time.perf_counter()
+    for polys in sample:
+        profile = set(polys)
+        for rule in rules.rules:
+            if all(p in profile for p in rule.error):
+                profile.difference_update(rule.error)
+                profile.update(rule.expected)
+    scan_rate = len(sample) / (time.perf_counter() - started)
+
+    rate = profiles / statistics.median(normalize_each)
+    return {
+        "profiles": profiles,
+        "unique_profiles": len({tuple(polys) for polys in cohort}),
+        "rules": len(rules),
+        "normalize_cold_s": _stats(normalize_cold),
+        "normalize_warm_s": _stats(normalize_warm),
+        "normalize_each_s": _stats(normalize_each),
+        "normalize_hsd_s": _stats(hsd_file),
+        "profiles_per_s": rate,
+        "rule_scan_profiles_per_s": scan_rate,
+        "primary": _primary("profiles_per_s", rate, higher_is_better=True),
+    }
+
+
+def bench_vcf_preprocessing(work: Path, samples: int, repeat: int) -> Dict:
+    """Time the input inspection done before a run on a cohort-sized VCF."""
+    vcf = datasets.scale_vcf(work / "cohort.vcf", samples)
+    size_mb = vcf.stat().st_size / 1e6
+
+    count = _timed(lambda: count_input_samples(vcf), repeat)
+    checksum = _timed(lambda: file_checksum(vcf), repeat)
+
+    return {
+        "samples": samples,
+        "size_mb": size_mb,
+        "count_samples_s": _stats(count),
+        "checksum_s": _stats(checksum),
+        "checksum_mb_per_s": size_mb / statistics.median(checksum),
+        "primary": _primary("checksum_mb_per_s", size_mb / statistics.median(checksum), higher_is_better=True),
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """List benchmarks whose primary metric regressed beyond the tolerance."""
+    regressions = []
+    for name, result in report["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or "primary" not in previous:
+            continue
+        new, old = result["primary"], previous["primary"]
+        if old["value"] == 0:
+            continue
+        change = (new["value"] - old["value"]) / abs(old["value"])
+        worse = -change if new["higher_is_better"] else change
+        if worse > tolerance:
+            regressions.append(
+                f"{name}: {new['name']} {old['value']:.4g} -> {new['value']:.4g} ({worse:+.0%} worse)"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Haplogrep3 wrapper.")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown (default: 0.25)")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetitions for timed micro-benchmarks")
+    parser.add_argument("--batch-files", type=int, default=40, help="Input files for batch throughput")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to test")
+    parser.add_argument("--startup-latency", type=float, default=0.2, help="Simulated JVM startup in seconds")
+    parser.add_argument("--tail-files", type=int, default=40, help="Input files for the tail-latency batch")
+    parser.add_argument("--hang-rate", type=float, default=0.05, help="Fraction of runs that hang in tail_latency")
+    parser.add_argument("--result-files", type=int, default=200, help="Results files for parsing")
+    parser.add_argument("--rows-per-file", type=int, default=500, help="Rows per results file")
+    parser.add_argument("--positions", type=int, default=1000000, help="Positions mapped in the annotation benchmark")
+    parser.add_argument("--hsd-profiles", type=int, default=100000, help="Profiles normalized in rules_normalization")
+    parser.add_argument("--cohort-samples", type=int, default=2000, help="Samples in the scaled cohort VCF")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="haplogrep_bench_") as tmp:
+        work = Path(tmp)
+        suite = {
+            "wrapper_overhead": lambda: bench_wrapper_overhead(work, args.repeat),
+            "batch_throughput": lambda: bench_batch_throughput(
+                work, args.batch_files, args.workers, args.startup_latency),
+            "tail_latency": lambda: bench_tail_latency(work, args.tail_files, args.hang_rate, hang=4.0),
+            "result_parsing": lambda: bench_result_parsing(work, args.result_files, args.rows_per_file),
+            "tree_loading": lambda: bench_tree_loading(max(args.repeat // 4, 1)),
+            "annotation": lambda: bench_annotation(args.positions, max(args.repeat // 4, 1)),
+            "contamination_screen": lambda: bench_contamination_screen(
+                work, args.cohort_samples, max(args.repeat // 4, 1)),
+            "distance_matrix": lambda: bench_distance_matrix(
+                work, args.cohort_samples, max(args.repeat // 4, 1)),
+            "rules_normalization": lambda: bench_rules_normalization(
+                work, args.hsd_profiles, max(args.repeat // 4, 1)),
+            "vcf_preprocessing": lambda: bench_vcf_preprocessing(
+                work, args.cohort_samples, max(args.repeat // 4, 1)),
+        }
+
+        report = {
+            "version": haplogrep_wrapper.__version__,
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "benchmarks": {},
+        }
+
+        for name, bench in suite.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"Running {name}...", file=sys.stderr)
+            report["benchmarks"][name] = bench()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,69 @@ Haplogrep3 Python Wrapper
 A Python wrapper for the Haplogrep3 CLI tool for mitochondrial haplogroup classification.
 """
 
-from .wrapper import Haplogrep3Wrapper, ClassificationMetric, Haplogrep3Result
+from .wrapper import Haplogrep3Wrapper, ClassificationMetric, Haplogrep3Result, enqueue_jobs
+from .phylotree import PhyloTree, load_tree
+from .annotation import Feature, FeatureIndex, load_annotation
+from .profiles import ExpectedProfiles, load_expected_profiles
+from .qc import (
+    AlleleFractions,
+    ContaminationResult,
+    ContaminationScreen,
+    read_allele_fractions,
+    write_contamination_report,
+)
+from .rules import AlignmentRule, AlignmentRules, load_alignment_rules
+from .distance import PackedProfiles, ProfileDistance, TreeDistance
+from .results import ResultRecord, CladeFrequency, HaplogroupAggregator, iter_results
+from .store import ResultStore
+from .journal import BatchJournal, JobState, JournalJob
+from .worker import QueueWorker
+from .metrics import (
+    JobMetrics,
+    PhaseTiming,
+    MetricsHook,
+    MetricsCollector,
+    PrometheusExporter,
+    JsonLinesTraceLog,
+)
 
 __version__ = "1.0.0"
-__all__ = ["Haplogrep3Wrapper", "ClassificationMetric", "Haplogrep3Result"]
+__all__ = [
+    "Haplogrep3Wrapper",
+    "ClassificationMetric",
+    "Haplogrep3Result",
+    "enqueue_jobs",
+    "PhyloTree",
+    "load_tree",
+    "Feature",
+    "FeatureIndex",
+    "load_annotation",
+    "ExpectedProfiles",
+    "load_expected_profiles",
+    "AlleleFractions",
+    "ContaminationResult",
+    "ContaminationScreen",
+    "read_allele_fractions",
+    "write_contamination_report",
+    "AlignmentRule",
+    "AlignmentRules",
+    "load_alignment_rules",
+    "PackedProfiles",
+    "ProfileDistance",
+    "TreeDistance",
+    "ResultRecord",
+    "CladeFrequency",
+    "HaplogroupAggregator",
+    "iter_results",
+    "ResultStore",
+    "BatchJournal",
+    "JobState",
+    "JournalJob",
+    "QueueWorker",
+    "JobMetrics",
+    "PhaseTiming",
+    "MetricsHook",
+    "MetricsCollector",
+    "PrometheusExporter",
+    "JsonLinesTraceLog",
+]
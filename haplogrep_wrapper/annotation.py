@@ -0,0 +1,375 @@
+"""
+Annotation Module
+
+This module loads the genome annotation shipped with every Haplogrep3 tree
+package (``mtdna.gff``) into an interval index, so that whole arrays of
+variant positions can be mapped to genes, tRNAs, rRNAs, the D-loop and codons
+in one vectorized call.
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from urllib.parse import unquote
+
+import numpy as np
+import yaml
+
+from .phylotree import tree_directory
+
+
+# Length of the rCRS/RSRS reference sequence
+MT_LENGTH = 16569
+
+# Feature types left out of the default index: "region" spans the whole
+# genome and exons repeat their tRNA/rRNA
+DEFAULT_EXCLUDED_TYPES = ("region", "exon")
+
+# When features overlap, the primary feature is the first type in this order
+TYPE_PRIORITY = ("CDS", "tRNA", "rRNA", "gene", "D_loop")
+
+_POSITION_PATTERN = re.compile(r"^\s*(\d+)")
+
+
+@dataclass(frozen=True)
+class Feature:
+    """
+    One feature of a GFF file.
+
+    Coordinates are 1-based and inclusive. Features that cross the origin of
+    the circular genome end after the sequence length (the D-loop is
+    16024-17145, i.e. 16024-16569 and 1-576).
+
+    Attributes:
+        id: GFF ID, e.g. ``cds-YP_003024026.1``
+        name: Gene symbol, e.g. ``ND1`` (``D-loop`` for the control region)
+        type: GFF feature type, e.g. ``CDS`` or ``tRNA``
+        start: First position
+        end: Last position
+        strand: ``+`` or ``-``
+        phase: CDS phase, None for other features
+        attributes: All GFF attributes
+    """
+    id: str
+    name: str
+    type: str
+    start: int
+    end: int
+    strand: str
+    phase: Optional[int] = None
+    attributes: Dict[str, str] = field(default_factory=dict, compare=False, hash=False)
+
+    @property
+    def length(self) -> int:
+        """Number of positions covered by the feature."""
+        return self.end - self.start + 1
+
+
+def read_gff(path: Union[str, Path]) -> List[Feature]:
+    """
+    Read the features of a GFF3 file.
+
+    Args:
+        path: Path to the GFF file
+
+    Returns:
+        List of features in file order
+    """
+    features = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            columns = line.rstrip("\r\n").split("\t")
+            if len(columns) < 9 or not columns[2]:
+                continue
+
+            attributes = {}
+            for item in columns[8].split(";"):
+                key, sep, value = item.partition("=")
+                if sep:
+                    attributes[key] = unquote(value)
+
+            features.append(Feature(
+                id=attributes.get("ID", f"{columns[2]}:{columns[3]}-{columns[4]}"),
+                name=attributes.get("gene") or attributes.get("Name") or attributes.get("gbkey") or columns[2],
+                type=columns[2],
+                start=int(columns[3]),
+                end=int(columns[4]),
+                strand=columns[6],
+                phase=int(columns[7]) if columns[7].isdigit() else None,
+                attributes=attributes
+            ))
+    return features
+
+
+def variant_positions(polys: Iterable[str]) -> np.ndarray:
+    """
+    Get the reference positions of polymorphisms in Haplogrep notation.
+
+    Insertions (``315.1C``) map to the position they follow, deletions
+    (``523d``) to the deleted position.
+
+    Args:
+        polys: Polymorphisms such as ``73G``, ``315.1C`` or ``523d``
+
+    Returns:
+        Integer array of positions
+
+    Raises:
+        ValueError: If a polymorphism does not start with a position
+    """
+    positions = []
+    for poly in polys:
+        match = _POSITION_PATTERN.match(poly)
+        if match is None:
+            raise ValueError(f"Not a polymorphism: {poly!r}")
+        positions.append(int(match.group(1)))
+    return np.asarray(positions, dtype=np.int64)
+
+
+class FeatureIndex:
+    """
+    Sorted, array-backed interval index over genome features.
+
+    The genome is cut at every feature boundary into elementary segments.
+    Each segment stores the features covering it in CSR form (``offsets``
+    into ``members``), so a lookup is one binary search per position and
+    overlapping features (ATP8/ATP6, ND4L/ND4, ...) are all found. Features
+    crossing the origin are split into two segments.
+
+    Args:
+        features: Features to index
+        length: Length of the circular genome
+        genes: Gene names in genome order (e.g. ``genes`` from tree.yaml)
+
+    Example:
+        >>> index = load_annotation("phylotree-fu-rcrs@1.2", "haplogrep/trees")
+        >>> index.gene_names([73, 3308, 16519])
+        array(['D-loop', 'ND1', 'D-loop'], dtype=object)
+    """
+
+    def __init__(
+        self,
+        features: Sequence[Feature],
+        length: int = MT_LENGTH,
+        genes: Optional[Sequence[str]] = None
+    ):
+        self.features: List[Feature] = list(features)
+        self.length = length
+        self.genes: List[str] = list(genes) if genes is not None else list(dict.fromkeys(
+            f.name for f in self.features if f.type == "gene"
+        ))
+
+        self.starts = np.array([f.start for f in self.features], dtype=np.int64)
+        self.ends = np.array([f.end for f in self.features], dtype=np.int64)
+        self.reverse = np.array([f.strand == "-" for f in self.features], dtype=bool)
+        self.coding = np.array([f.type == "CDS" for f in self.features], dtype=bool)
+        self.names = np.array([f.name for f in self.features], dtype=object)
+        self.types = np.array([f.type for f in self.features], dtype=object)
+
+        for f in self.features:
+            if f.start < 1 or f.end < f.start or f.length > length:
+                raise ValueError(f"Invalid feature coordinates: {f.id} {f.start}-{f.end}")
+
+        # Segments on the linear coordinate 1..length; wrapping features are split
+        seg_start, seg_end, seg_feature = [], [], []
+        for i, f in enumerate(self.features):
+            if f.end > length:
+                seg_start += [f.start, 1]
+                seg_end += [length, f.end - length]
+                seg_feature += [i, i]
+            else:
+                seg_start.append(f.start)
+                seg_end.append(f.end)
+                seg_feature.append(i)
+        seg_start = np.array(seg_start, dtype=np.int64)
+        seg_end = np.array(seg_end, dtype=np.int64)
+        seg_feature = np.array(seg_feature, dtype=np.int32)
+
+        # Elementary segment k covers bounds[k] .. bounds[k + 1] - 1
+        self.bounds = np.unique(np.concatenate([seg_start, seg_end + 1, [1, length + 1]]))
+        members = [[] for _ in range(len(self.bounds) - 1)]
+        first = np.searchsorted(self.bounds, seg_start)
+        last = np.searchsorted(self.bounds, seg_end + 1)
+        for s, e, i in zip(first, last, seg_feature):
+            for k in range(s, e):
+                members[k].append(int(i))
+
+        rank = {t: r for r, t in enumerate(TYPE_PRIORITY)}
+
+        def priority(i: int):
+            return rank.get(self.features[i].type, len(TYPE_PRIORITY)), self.starts[i], i
+
+        for covering in members:
+            covering.sort(key=priority)
+
+        self.offsets = np.zeros(len(members) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(m) for m in members])
+        self.members = np.array([i for m in members for i in m], dtype=np.int32)
+        # Primary (highest priority) feature of every segment, -1 if none
+        self.primary_members = np.array([m[0] if m else -1 for m in members], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def _segments(self, positions) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalize positions onto the circle and find their segments."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size and positions.min() < 1:
+            raise ValueError("Positions must be 1-based")
+        positions = (positions - 1) % self.length + 1
+        return positions, np.searchsorted(self.bounds, positions, side="right") - 1
+
+    def query(self, positions) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find all features covering each position.
+
+        Args:
+            positions: 1-based positions; positions past the end wrap around
+
+        Returns:
+            (hits, features): for every match, the index into ``positions``
+            and the index into ``features``. Matches of one position are in
+            priority order.
+        """
+        positions, segments = self._segments(positions)
+        begin = self.offsets[segments]
+        counts = self.offsets[segments + 1] - begin
+        hits = np.repeat(np.arange(positions.size), counts)
+        within = np.arange(hits.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        return hits, self.members[np.repeat(begin, counts) + within].astype(np.int64)
+
+    def primary(self, positions) -> np.ndarray:
+        """
+        Get the highest-priority feature at each position.
+
+        Coding sequences come first, then tRNAs, rRNAs, genes and the D-loop
+        (see ``TYPE_PRIORITY``); ties go to the feature that starts first.
+
+        Args:
+            positions: 1-based positions
+
+        Returns:
+            Feature index per position, -1 where no feature is annotated
+        """
+        _, segments = self._segments(positions)
+        return self.primary_members[segments].astype(np.int64)
+
+    def gene_names(self, positions, missing: str = "") -> np.ndarray:
+        """
+        Get the name of the primary feature at each position.
+
+        Args:
+            positions: 1-based positions
+            missing: Name used for unannotated positions
+
+        Returns:
+            Object array of gene names
+        """
+        primary = self.primary(positions)
+        names = np.full(primary.size, missing, dtype=object)
+        found = primary >= 0
+        names[found] = self.names[primary[found]]
+        return names
+
+    def codons(self, positions) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Map positions to codons of every coding sequence covering them.
+
+        Codons are counted from the start codon in the direction of
+        transcription, so on the minus strand (ND6) they are counted from
+        the feature end.
+
+        Args:
+            positions: 1-based positions
+
+        Returns:
+            (hits, features, codon, codon_position): index into
+            ``positions``, index into ``features``, 1-based codon number and
+            position within the codon (1-3) of every match
+        """
+        positions, _ = self._segments(positions)
+        hits, features = self.query(positions)
+        keep = self.coding[features]
+        hits, features = hits[keep], features[keep]
+
+        pos = positions[hits]
+        start, end = self.starts[features], self.ends[features]
+        pos = np.where(pos < start, pos + self.length, pos)
+        offset = np.where(self.reverse[features], end - pos, pos - start)
+        return hits, features, offset // 3 + 1, offset % 3 + 1
+
+    def annotate(self, polys: Sequence[str]) -> List[Dict[str, object]]:
+        """
+        Annotate polymorphisms with their primary feature and codon.
+
+        Args:
+            polys: Polymorphisms in Haplogrep notation
+
+        Returns:
+            One dict per polymorphism with ``poly``, ``position``, ``gene``,
+            ``type``, ``codon`` and ``codon_position`` (None outside coding
+            sequences, and for the second gene of overlapping reading frames)
+        """
+        positions = variant_positions(polys)
+        primary = self.primary(positions)
+        codon = np.zeros(positions.size, dtype=np.int64)
+        codon_position = np.zeros(positions.size, dtype=np.int64)
+
+        hits, features, numbers, within = self.codons(positions)
+        # Keep the codon of the primary feature only
+        match = features == primary[hits]
+        codon[hits[match]] = numbers[match]
+        codon_position[hits[match]] = within[match]
+
+        rows = []
+        for i, poly in enumerate(polys):
+            f = self.features[primary[i]] if primary[i] >= 0 else None
+            rows.append({
+                "poly": poly,
+                "position": int(positions[i]),
+                "gene": f.name if f else None,
+                "type": f.type if f else None,
+                "codon": int(codon[i]) if codon[i] else None,
+                "codon_position": int(codon_position[i]) if codon[i] else None
+            })
+        return rows
+
+
+@lru_cache(maxsize=None)
+def _load_annotation_cached(directory: str) -> FeatureIndex:
+    directory = Path(directory)
+    config_file = directory / "tree.yaml"
+    if not config_file.exists():
+        raise FileNotFoundError(f"Tree configuration not found: {config_file}")
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    gff = directory / config.get("gff", "mtdna.gff")
+    if not gff.exists():
+        raise FileNotFoundError(f"Annotation file not found: {gff}")
+
+    features = [f for f in read_gff(gff) if f.type not in DEFAULT_EXCLUDED_TYPES]
+    return FeatureIndex(features, genes=config.get("genes"))
+
+
+def load_annotation(tree: str, trees_dir: Union[str, Path]) -> FeatureIndex:
+    """
+    Load the feature index of a tree package, reusing previously built indexes.
+
+    Args:
+        tree: Tree name, e.g. ``phylotree-fu-rcrs@1.2``
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Returns:
+        FeatureIndex over the tree's GFF annotation
+
+    Raises:
+        FileNotFoundError: If the tree package or its GFF file does not exist
+    """
+    directory = tree_directory(tree, trees_dir).resolve()
+    return _load_annotation_cached(str(directory))
@@ -0,0 +1,336 @@
+"""
+Distance Module
+
+This module computes all-pairs distances between the samples of a cohort,
+either as the number of tree branches between their haplogroups or as
+Hamming, Jaccard or Kulczynski distances between their variant profiles.
+
+Profiles are stored as bit-packed presence matrices. Matrices are computed in
+blocks: the profiles of a row and a column block are unpacked and their
+overlaps counted with one matrix product, so the working memory stays
+bounded. Full matrices can be written to a memory-mapped ``.npy`` file when
+N x N does not fit into memory.
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .phylotree import PhyloTree
+from .profiles import normalize_poly
+from .results import ResultRecord
+from .wrapper import ClassificationMetric
+
+
+# Upper bound of the cells (unpacked profile bits or distances) per block
+_BLOCK_CELLS = 1 << 22
+
+
+class PackedProfiles:
+    """
+    Bit-packed presence matrix of the variant profiles of a cohort.
+
+    Every distinct polymorphism of the cohort gets one bit; each sample is a
+    row of uint64 words.
+
+    Args:
+        profiles: Polymorphisms of every sample in Haplogrep notation
+        samples: Sample IDs (defaults to the row numbers)
+        reference: Reference sequence; when given, polymorphisms are brought
+            into canonical notation first (see ``normalize_poly``)
+
+    Example:
+        >>> packed = PackedProfiles([["73G", "263G"], ["73G", "16519C"]], samples=["A", "B"])
+        >>> ProfileDistance(packed).matrix()
+        array([[0, 2],
+               [2, 0]], dtype=int32)
+    """
+
+    def __init__(
+        self,
+        profiles: Sequence[Iterable[str]],
+        samples: Optional[Sequence[str]] = None,
+        reference: Optional[str] = None
+    ):
+        rows = []
+        vocabulary: Dict[str, int] = {}
+        for polys in profiles:
+            canonical = set()
+            for poly in polys:
+                poly = poly.strip()
+                if not poly:
+                    continue
+                canonical.update(normalize_poly(poly, reference) if reference is not None else [poly])
+            rows.append([vocabulary.setdefault(p, len(vocabulary)) for p in canonical])
+
+        self.samples: List[str] = [str(s) for s in samples] if samples is not None else [str(i) for i in range(len(rows))]
+        if len(self.samples) != len(rows):
+            raise ValueError(f"Got {len(rows)} profiles for {len(self.samples)} samples")
+        self.polys: List[str] = list(vocabulary)
+
+        words = max(1, (len(self.polys) + 63) // 64)
+        self.bits = np.zeros((len(rows), words), dtype=np.uint64)
+        # Rows per block, so that the unpacked presence matrix stays bounded
+        step = max(1, _BLOCK_CELLS // (words * 64))
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            dense = np.zeros((len(block), words * 64), dtype=bool)
+            owners = np.repeat(np.arange(len(block)), [len(r) for r in block])
+            dense[owners, np.fromiter((i for r in block for i in r), dtype=np.int64, count=len(owners))] = True
+            self.bits[start:start + len(block)] = np.packbits(dense, axis=1).view(np.uint64)
+        self.counts = np.array([len(r) for r in rows], dtype=np.int64)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[ResultRecord],
+        column: str = "Input_Polys",
+        reference: Optional[str] = None
+    ) -> "PackedProfiles":
+        """
+        Pack the profiles of an extended Haplogrep3 report.
+
+        Only the best hit (rank 1) of every sample is used.
+
+        Args:
+            records: Rows of a results file written with ``extend_report=True``
+            column: Report column holding the space-separated polymorphisms
+            reference: Reference sequence for canonical notation
+
+        Raises:
+            ValueError: If the records lack the profile column
+        """
+        samples, profiles = [], []
+        for record in records:
+            if record.rank != 1:
+                continue
+            if column not in record.extra:
+                raise ValueError(f"Result rows have no {column} column; use extend_report=True")
+            samples.append(record.sample_id)
+            profiles.append(record.extra[column].split())
+        return cls(profiles, samples=samples, reference=reference)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def unpack(self, rows: slice) -> np.ndarray:
+        """Get the presence matrix of a block of samples as float32 (0/1)."""
+        return np.unpackbits(self.bits[rows].view(np.uint8), axis=1).astype(np.float32)
+
+    def intersections(self, rows: slice, columns: slice) -> np.ndarray:
+        """Count the polymorphisms shared by every pair of a row and column block."""
+        shared = self.unpack(rows) @ self.unpack(columns).T
+        return shared.astype(np.int32)
+
+
+class _BlockedDistances(ABC):
+    """All-pairs distances computed block by block."""
+
+    dtype = np.int32
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of samples."""
+
+    def _block_size(self) -> int:
+        return max(1, int(np.sqrt(_BLOCK_CELLS)))
+
+    @abstractmethod
+    def block(self, rows: slice, columns: slice) -> np.ndarray:
+        """Compute the distances between a block of rows and a block of columns."""
+
+    def matrix(self, out: Optional[Union[str, Path]] = None) -> np.ndarray:
+        """
+        Compute the full N x N distance matrix.
+
+        Only blocks on and above the diagonal are computed; the matrix is
+        symmetric.
+
+        Args:
+            out: Write the matrix to this ``.npy`` file through a memory map
+                instead of keeping it in memory; reopen it with
+                ``np.load(out, mmap_mode="r")``
+
+        Returns:
+            Distance matrix (a memory map when ``out`` is given)
+        """
+        n = len(self)
+        if out is not None:
+            Path(out).parent.mkdir(parents=True, exist_ok=True)
+            result = np.lib.format.open_memmap(str(out), mode="w+", dtype=self.dtype, shape=(n, n))
+        else:
+            result = np.empty((n, n), dtype=self.dtype)
+
+        size = self._block_size()
+        for r in range(0, n, size):
+            rows = slice(r, min(r + size, n))
+            for c in range(r, n, size):
+                columns = slice(c, min(c + size, n))
+                values = self.block(rows, columns)
+                result[rows, columns] = values
+                if c != r:
+                    result[columns, rows] = values.T
+
+        if out is not None:
+            result.flush()
+        return result
+
+    def nearest(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest other samples of every sample.
+
+        The full matrix is never materialized; ties are broken by sample
+        order.
+
+        Args:
+            k: Number of neighbours per sample
+
+        Returns:
+            (indices, distances): arrays of shape (N, k), nearest first
+        """
+        n = len(self)
+        k = min(k, n - 1)
+        indices = np.zeros((n, max(k, 0)), dtype=np.int64)
+        distances = np.zeros((n, max(k, 0)), dtype=self.dtype)
+        if k <= 0:
+            return indices, distances
+
+        size = self._block_size()
+        # Rows per step, so that one step holds at most _BLOCK_CELLS distances
+        step = max(1, min(size, _BLOCK_CELLS // n))
+        for r in range(0, n, step):
+            rows = slice(r, min(r + step, n))
+            values = np.concatenate(
+                [self.block(rows, slice(c, min(c + size, n))) for c in range(0, n, size)], axis=1
+            ).astype(np.float64)
+            local = np.arange(rows.stop - rows.start)
+            values[local, local + r] = np.inf
+
+            # Everything below the k-th distance, then ties at it in sample order
+            kth = np.partition(values, k - 1, axis=1)[:, k - 1:k]
+            below = values < kth
+            tied = values == kth
+            wanted = k - below.sum(axis=1, keepdims=True)
+            selected = below | (tied & (np.cumsum(tied, axis=1) <= wanted))
+            candidates = np.nonzero(selected)[1].reshape(-1, k)
+            picked = np.take_along_axis(values, candidates, axis=1)
+            order = np.lexsort((candidates, picked))
+            indices[rows] = np.take_along_axis(candidates, order, axis=1)
+            distances[rows] = np.take_along_axis(picked, order, axis=1)
+        return indices, distances
+
+
+class ProfileDistance(_BlockedDistances):
+    """
+    Distances between the variant profiles of all samples.
+
+    With ``a`` and ``b`` the polymorphism counts of two samples and ``s`` the
+    number they share:
+
+    - ``HAMMING``: ``a + b - 2s`` polymorphisms found in only one of them
+    - ``JACCARD``: ``1 - s / (a + b - s)``
+    - ``KULCZYNSKI``: ``1 - (s / a + s / b) / 2``
+
+    Two empty profiles have distance 0; an empty and a non-empty profile
+    have the largest distance (1 for Jaccard and Kulczynski).
+
+    Args:
+        profiles: Bit-packed profiles of the cohort
+        metric: Distance measure (``KIMURA`` needs sequences and is not
+            supported)
+
+    Raises:
+        ValueError: If the metric is not supported
+    """
+
+    def __init__(
+        self,
+        profiles: PackedProfiles,
+        metric: ClassificationMetric = ClassificationMetric.HAMMING
+    ):
+        if metric not in (ClassificationMetric.HAMMING, ClassificationMetric.JACCARD,
+                          ClassificationMetric.KULCZYNSKI):
+            raise ValueError(f"Unsupported metric for profile distances: {metric.value}")
+        self.profiles = profiles
+        self.metric = metric
+        self.dtype = np.int32 if metric == ClassificationMetric.HAMMING else np.float32
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def _block_size(self) -> int:
+        # Bounded by both the unpacked profiles and the distance block
+        bits = self.profiles.bits.shape[1] * 64
+        return max(1, min(super()._block_size(), _BLOCK_CELLS // bits))
+
+    def block(self, rows: slice, columns: slice) -> np.ndarray:
+        shared = self.profiles.intersections(rows, columns)
+        a = self.profiles.counts[rows][:, None]
+        b = self.profiles.counts[columns][None, :]
+
+        if self.metric == ClassificationMetric.HAMMING:
+            return (a + b - 2 * shared).astype(np.int32)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.metric == ClassificationMetric.JACCARD:
+                union = a + b - shared
+                similarity = np.where(union > 0, shared / union, 1.0)
+            else:
+                of_a = np.where(a > 0, shared / a, 0.0)
+                of_b = np.where(b > 0, shared / b, 0.0)
+                similarity = np.where((a > 0) | (b > 0), 0.5 * (of_a + of_b), 1.0)
+        return (1.0 - similarity).astype(np.float32)
+
+
+class TreeDistance(_BlockedDistances):
+    """
+    Branches on the tree path between the haplogroups of all samples.
+
+    Distances are first computed between the distinct haplogroups of the
+    cohort, by comparing their root paths, and then looked up per pair of
+    samples.
+
+    Args:
+        tree: Classification tree
+        haplogroups: Haplogroup of every sample, as reported by Haplogrep3
+
+    Raises:
+        KeyError: If a haplogroup is not part of the tree
+    """
+
+    def __init__(self, tree: PhyloTree, haplogroups: Sequence[str]):
+        self.tree = tree
+        nodes = [tree.resolve(h) for h in haplogroups]
+        for haplogroup, node in zip(haplogroups, nodes):
+            if node is None:
+                raise KeyError(f"Unknown haplogroup for {tree.name}: {haplogroup}")
+
+        self.haplogroups, self.inverse = np.unique(np.array(nodes, dtype=object), return_inverse=True)
+        self.inverse = self.inverse.reshape(-1)
+
+        # Root paths as node numbers, padded with values unique to each row.
+        # Paths that meet at some depth agree on all depths above it, so the
+        # shared prefix is the number of equal positions.
+        node_ids: Dict[str, int] = {}
+        paths = [[node_ids.setdefault(n, len(node_ids)) for n in tree.lineage(h)] for h in self.haplogroups]
+        lengths = np.array([len(p) for p in paths], dtype=np.int64)
+        padded = -1 - np.repeat(np.arange(len(paths), dtype=np.int32)[:, None], max(lengths, default=0), axis=1)
+        for u, path in enumerate(paths):
+            padded[u, :len(path)] = path
+
+        unique = len(paths)
+        self.unique_distances = np.zeros((unique, unique), dtype=np.int32)
+        size = max(1, _BLOCK_CELLS // max(unique * padded.shape[1], 1))
+        for r in range(0, unique, size):
+            block = padded[r:r + size]
+            shared = (block[:, None, :] == padded[None, :, :]).sum(axis=2)
+            shared = np.minimum(shared, np.minimum(lengths[r:r + size, None], lengths[None, :]))
+            self.unique_distances[r:r + size] = lengths[r:r + size, None] + lengths[None, :] - 2 * shared
+
+    def __len__(self) -> int:
+        return len(self.inverse)
+
+    def block(self, rows: slice, columns: slice) -> np.ndarray:
+        return self.unique_distances[self.inverse[rows][:, None], self.inverse[columns][None, :]]
@@ -0,0 +1,496 @@
+"""
+Batch Journal Module
+
+This module records classification jobs in a SQLite journal so that an
+interrupted batch can be resumed without repeating completed work, and so that
+several worker processes can pull jobs from the same batch.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .results import is_complete_results_file
+
+
+class JobState(Enum):
+    """Lifecycle states of a journaled job."""
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+@dataclass
+class JournalJob:
+    """
+    A classification job recorded in the journal.
+
+    Attributes:
+        id: Journal row id
+        input_file: Path to the input file
+        output_file: Path to the output file
+        input_hash: SHA-256 of the input file when the job was added
+        params: Parameters passed to classify(), including the tree
+        state: Current job state
+        output_checksum: SHA-256 of the output file once the job is done
+        return_code: Return code of the last run
+        error: Error message of the last failed run
+        attempts: Number of times the job was started
+        worker: Worker that last claimed the job
+        lease_expires: Time (epoch seconds) at which a RUNNING job's lease
+            runs out, or None for jobs claimed without a lease
+    """
+    id: int
+    input_file: str
+    output_file: str
+    input_hash: str
+    params: Dict
+    state: JobState
+    output_checksum: Optional[str]
+    return_code: Optional[int]
+    error: Optional[str]
+    attempts: int
+    worker: Optional[str]
+    lease_expires: Optional[float] = None
+
+
+def file_checksum(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def worker_id() -> str:
+    """Identifier of the current process, as ``<hostname>:<pid>``."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+_WINDOWS = os.name == "nt"
+
+# Windows API constants used by _pid_alive_windows()
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_STILL_ACTIVE = 259
+_ERROR_INVALID_PARAMETER = 87
+
+
+def _kernel32():
+    import ctypes
+    return ctypes.WinDLL("kernel32")
+
+
+def _pid_alive_windows(pid: int) -> bool:
+    """Check a process on Windows through OpenProcess/GetExitCodeProcess."""
+    import ctypes
+
+    kernel32 = _kernel32()
+    handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # Only a PID that does not exist is reported as dead; when access is
+        # denied the job is left to its lease
+        return kernel32.GetLastError() != _ERROR_INVALID_PARAMETER
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == _STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _pid_alive(pid: int) -> bool:
+    if _WINDOWS:
+        # os.kill() calls TerminateProcess on Windows for any signal other
+        # than CTRL_C_EVENT/CTRL_BREAK_EVENT, so it cannot be used as a probe
+        return _pid_alive_windows(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input_file TEXT NOT NULL,
+    output_file TEXT NOT NULL UNIQUE,
+    input_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    output_checksum TEXT,
+    return_code INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+class BatchJournal:
+    """
+    SQLite journal of classification jobs.
+
+    Each job records its input hash, parameters, state and output checksum.
+    All state changes run in short ``BEGIN IMMEDIATE`` transactions, so
+    several processes can claim jobs from the same journal file without
+    running a job twice.
+
+    Args:
+        path: Path to the journal database (created if missing)
+        timeout: Seconds to wait for a lock held by another process
+
+    Example:
+        >>> journal = BatchJournal("results/batch.journal")
+        >>> results = wrapper.classify_batch(vcf_files, "results", journal=journal)
+    """
+
+    def __init__(self, path: Union[str, Path], timeout: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+
+        with self._transaction() as conn:
+            for statement in _SCHEMA.strip().split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _job(row) -> JournalJob:
+        return JournalJob(
+            id=row[0],
+            input_file=row[1],
+            output_file=row[2],
+            input_hash=row[3],
+            params=json.loads(row[4]),
+            state=JobState(row[5]),
+            output_checksum=row[6],
+            return_code=row[7],
+            error=row[8],
+            attempts=row[9],
+            worker=row[10],
+            lease_expires=row[11]
+        )
+
+    _COLUMNS = (
+        "id, input_file, output_file, input_hash, params, state, "
+        "output_checksum, return_code, error, attempts, worker, lease_expires"
+    )
+
+    def add(
+        self,
+        input_file: Union[str, Path],
+        output_file: Union[str, Path],
+        params: Dict
+    ) -> JournalJob:
+        """
+        Register a job, keeping completed work when nothing changed.
+
+        A job that already exists for the output file is reset to PENDING if
+        its input hash or parameters differ, if it FAILED (so that restarting
+        a batch retries transient failures), or if it is DONE but its output
+        file is missing, truncated or does not match the recorded checksum.
+
+        Args:
+            input_file: Path to the input file
+            output_file: Path to the output file
+            params: JSON-serializable parameters for classify()
+
+        Returns:
+            The journaled job
+        """
+        input_file = str(Path(input_file))
+        output_file = str(Path(output_file))
+        input_hash = file_checksum(input_file)
+        params_json = json.dumps(params, sort_keys=True)
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE output_file = ?",
+                (output_file,)
+            ).fetchone()
+
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (input_file, output_file, input_hash, params, state, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (input_file, output_file, input_hash, params_json, JobState.PENDING.value, time.time())
+                )
+            else:
+                job = self._job(row)
+                changed = (
+                    job.input_file != input_file
+                    or job.input_hash != input_hash
+                    or json.dumps(job.params, sort_keys=True) != params_json
+                )
+                invalid = job.state == JobState.DONE and not self.verify(job)
+                failed = job.state == JobState.FAILED
+                if (changed or invalid or failed) and job.state != JobState.RUNNING:
+                    conn.execute(
+                        "UPDATE jobs SET input_file = ?, input_hash = ?, params = ?, state = ?, "
+                        "output_checksum = NULL, return_code = NULL, error = NULL, updated_at = ? "
+                        "WHERE id = ?",
+                        (input_file, input_hash, params_json, JobState.PENDING.value, time.time(), job.id)
+                    )
+
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE output_file = ?",
+                (output_file,)
+            ).fetchone()
+
+        return self._job(row)
+
+    def claim(
+        self,
+        worker: Optional[str] = None,
+        lease: Optional[float] = None
+    ) -> Optional[JournalJob]:
+        """
+        Atomically take the next job and mark it RUNNING.
+
+        PENDING jobs are taken first. RUNNING jobs whose lease has expired
+        (their worker stopped sending heartbeats) are taken over as well.
+
+        Args:
+            worker: Identifier of the claiming worker (defaults to worker_id())
+            lease: Seconds the claim stays valid without a heartbeat; None
+                claims the job without a lease
+
+        Returns:
+            The claimed job, or None if no job is available
+        """
+        worker = worker or worker_id()
+        now = time.time()
+        lease_expires = now + lease if lease is not None else None
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE state = ? "
+                "OR (state = ? AND lease_expires IS NOT NULL AND lease_expires < ?) "
+                "ORDER BY state = ?, id LIMIT 1",
+                (JobState.PENDING.value, JobState.RUNNING.value, now, JobState.RUNNING.value)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, "
+                "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (JobState.RUNNING.value, worker, lease_expires, now, row[0])
+            )
+
+        job = self._job(row)
+        job.state = JobState.RUNNING
+        job.worker = worker
+        job.attempts += 1
+        job.lease_expires = lease_expires
+        return job
+
+    def heartbeat(self, job: JournalJob, lease: float) -> bool:
+        """
+        Extend the lease of a RUNNING job.
+
+        Args:
+            job: Job claimed by this worker
+            lease: Seconds from now until the lease expires
+
+        Returns:
+            False if the job is no longer held by this worker (its lease
+            expired and another worker took it over)
+        """
+        lease_expires = time.time() + lease
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (lease_expires, time.time(), job.id, job.worker, JobState.RUNNING.value)
+            )
+        if cursor.rowcount != 1:
+            return False
+        job.lease_expires = lease_expires
+        return True
+
+    def complete(
+        self,
+        job: JournalJob,
+        return_code: int = 0,
+        moves: Iterable[Tuple[Union[str, Path], Union[str, Path]]] = ()
+    ) -> bool:
+        """
+        Mark a job DONE and record the checksum of its output file.
+
+        Staged files are moved into place inside the same transaction, and
+        only while the job is still held by this worker. The transaction
+        holds the journal's write lock, so no other worker can take the job
+        over in between and at most one worker ever publishes its output.
+
+        Args:
+            job: Job claimed by this worker
+            return_code: Return code of the run
+            moves: (staged path, final path) pairs, moved with os.replace()
+
+        Returns:
+            False if the job is no longer held by this worker; nothing is
+            moved then
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND state = ?",
+                (job.id, job.worker, JobState.RUNNING.value)
+            ).fetchone()
+            if row is None:
+                return False
+            for source, destination in moves:
+                os.replace(source, destination)
+            checksum = file_checksum(job.output_file)
+            conn.execute(
+                "UPDATE jobs SET state = ?, output_checksum = ?, return_code = ?, error = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ?",
+                (JobState.DONE.value, checksum, return_code, time.time(), job.id)
+            )
+        job.state = JobState.DONE
+        job.output_checksum = checksum
+        job.return_code = return_code
+        return True
+
+    def fail(self, job: JournalJob, error: str, return_code: Optional[int] = None) -> bool:
+        """
+        Mark a job FAILED with an error message.
+
+        Returns:
+            False if the job is no longer held by this worker
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, return_code = ?, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND state = ?",
+                (JobState.FAILED.value, error, return_code, time.time(), job.id, job.worker,
+                 JobState.RUNNING.value)
+            )
+        if cursor.rowcount != 1:
+            return False
+        job.state = JobState.FAILED
+        job.error = error
+        job.return_code = return_code
+        return True
+
+    def verify(self, job: JournalJob) -> bool:
+        """
+        Check that the output of a DONE job is still complete and unchanged.
+
+        Args:
+            job: Journaled job
+
+        Returns:
+            True if the output file exists, is a complete results file and
+            matches the recorded checksum
+        """
+        if not job.output_checksum or not os.path.exists(job.output_file):
+            return False
+        if not is_complete_results_file(job.output_file):
+            return False
+        return file_checksum(job.output_file) == job.output_checksum
+
+    def recover(self) -> int:
+        """
+        Requeue RUNNING jobs whose worker process died.
+
+        Only workers on this host can be checked; jobs claimed by a process
+        that no longer exists are reset to PENDING. Jobs on other hosts are
+        recovered through their leases instead (see ``claim()``).
+
+        Returns:
+            Number of requeued jobs
+        """
+        host = socket.gethostname()
+        requeued = 0
+
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, worker FROM jobs WHERE state = ?",
+                (JobState.RUNNING.value,)
+            ).fetchall()
+            for job_id, worker in rows:
+                worker_host, _, pid = (worker or "").rpartition(":")
+                if worker_host != host or not pid.isdigit() or _pid_alive(int(pid)):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ?",
+                    (JobState.PENDING.value, time.time(), job_id)
+                )
+                requeued += 1
+
+        return requeued
+
+    def retry_failed(self) -> int:
+        """
+        Reset all FAILED jobs to PENDING.
+
+        Returns:
+            Number of requeued jobs
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?",
+                (JobState.PENDING.value, time.time(), JobState.FAILED.value)
+            )
+            return cursor.rowcount
+
+    def get(self, output_file: Union[str, Path]) -> Optional[JournalJob]:
+        """Look up the job that writes a given output file."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE output_file = ?",
+                (str(Path(output_file)),)
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def jobs(self, state: Optional[JobState] = None) -> List[JournalJob]:
+        """List journaled jobs, optionally filtered by state."""
+        with self._transaction() as conn:
+            if state is None:
+                rows = conn.execute(f"SELECT {self._COLUMNS} FROM jobs ORDER BY id").fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {self._COLUMNS} FROM jobs WHERE state = ? ORDER BY id",
+                    (state.value,)
+                ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def summary(self) -> Dict[str, int]:
+        """Count jobs per state."""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state.value: 0 for state in JobState}
+        counts.update(dict(rows))
+        return counts
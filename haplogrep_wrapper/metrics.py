@@ -0,0 +1,502 @@
+"""
+Metrics Module
+
+This module defines the per-run measurements attached to Haplogrep3Result,
+the hook interface the wrapper reports them through, and hooks that aggregate
+them into histograms (with Prometheus text-format export) or write them to a
+JSON-lines trace log.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the duration histogram buckets
+DEFAULT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Upper bounds (kB) of the peak RSS histogram buckets
+DEFAULT_RSS_BUCKETS = tuple(2 ** i * 1024 for i in range(5, 15))  # 32 MB to 16 GB
+
+
+@dataclass
+class PhaseTiming:
+    """
+    Wall and CPU time spent in one phase of a run.
+
+    Attributes:
+        wall: Elapsed wall-clock seconds
+        cpu: CPU seconds, or None if it could not be measured
+    """
+    wall: float
+    cpu: Optional[float] = None
+
+
+@dataclass
+class JobMetrics:
+    """
+    Measurements of a single haplogrep3 run.
+
+    Phases are, in order: ``input`` (inspecting the input file), ``spawn``
+    (starting the process), ``startup`` (until haplogrep3 prints its first
+    line, i.e. JVM startup), ``run`` (until the process exits; only split
+    further if the wrapper is given ``phase_markers``) and ``output``
+    (inspecting the results file). CPU time of the ``startup`` and ``run`` phases is that of the child
+    process tree and is only available on Linux.
+
+    Attributes:
+        phases: Timing per phase, in execution order
+        wall_time: Total wall-clock seconds of the run
+        child_user_cpu: User CPU seconds of haplogrep3 and its children
+        child_system_cpu: System CPU seconds of haplogrep3 and its children
+        child_peak_rss_kb: Peak resident set size of the largest child
+            process in kilobytes (converted from bytes on macOS)
+        input_size: Size of the input file in bytes
+        input_samples: Number of samples in the input file; only counted
+            when the wrapper has hooks, since it means reading the input
+        output_samples: Number of samples in the results file
+    """
+    phases: Dict[str, PhaseTiming] = field(default_factory=dict)
+    wall_time: float = 0.0
+    child_user_cpu: Optional[float] = None
+    child_system_cpu: Optional[float] = None
+    child_peak_rss_kb: Optional[int] = None
+    input_size: int = 0
+    input_samples: Optional[int] = None
+    output_samples: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        """Convert to a JSON-compatible dictionary."""
+        return asdict(self)
+
+
+def process_tree_cpu(pid: int) -> Optional[float]:
+    """
+    Get the CPU seconds used so far by a process and its descendants.
+
+    Reads ``/proc``, so it is only available on Linux. The haplogrep3
+    launcher script runs java as a child process, which is why the whole
+    process tree is summed.
+
+    Args:
+        pid: Process id of the tree's root
+
+    Returns:
+        User plus system CPU seconds, or None if it cannot be measured
+    """
+    try:
+        ticks = os.sysconf("SC_CLK_TCK")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+    total = 0
+    stack = [pid]
+    try:
+        while stack:
+            current = stack.pop()
+            with open(f"/proc/{current}/stat", 'rb') as f:
+                # Skip "pid (comm)", since comm may contain spaces
+                fields = f.read().rsplit(b")", 1)[1].split()
+            total += sum(int(v) for v in fields[11:15])  # utime, stime, cutime, cstime
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", 'rb') as f:
+                    stack.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError, IndexError):
+        if total == 0:
+            return None
+
+    return total / ticks
+
+
+def count_input_samples(input_file: Union[str, Path]) -> Optional[int]:
+    """
+    Count the samples in a VCF, HSD or FASTA input file.
+
+    VCF files are only read up to the ``#CHROM`` header line.
+
+    Args:
+        input_file: Path to the input file
+
+    Returns:
+        Number of samples, or None for unknown formats
+    """
+    path = Path(input_file)
+    suffixes = [s.lower() for s in path.suffixes]
+
+    try:
+        if ".vcf" in suffixes:
+            opener = open
+            if suffixes[-1] in (".gz", ".bgz"):
+                import gzip
+                opener = gzip.open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith("#CHROM"):
+                        return max(len(line.rstrip("\r\n").split("\t")) - 9, 0)
+                    if not line.startswith("#"):
+                        break
+            return 0
+        if suffixes and suffixes[-1] in (".hsd", ".txt"):
+            with open(path, 'rb') as f:
+                return sum(1 for line in f if line.strip())
+        if suffixes and suffixes[-1] in (".fasta", ".fa", ".fas"):
+            with open(path, 'rb') as f:
+                return sum(1 for line in f if line.startswith(b">"))
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    return None
+
+
+def count_output_samples(output_file: Union[str, Path]) -> Optional[int]:
+    """
+    Count the distinct samples in a Haplogrep3 results file.
+
+    Args:
+        output_file: Path to the results file
+
+    Returns:
+        Number of samples, or None if the file cannot be read
+    """
+    samples = set()
+    try:
+        with open(output_file, 'rb') as f:
+            next(f, None)
+            for line in f:
+                sample = line.split(b"\t", 1)[0].strip()
+                if sample:
+                    samples.add(sample)
+    except OSError:
+        return None
+    return len(samples)
+
+
+class MetricsHook:
+    """
+    Interface for receiving run metrics from the wrapper.
+
+    Subclasses override the callbacks they need. Hooks are called
+    synchronously after each run, so they should be cheap. Exceptions raised
+    by a hook are logged and otherwise ignored.
+    """
+
+    def on_result(self, result) -> None:
+        """Called with every Haplogrep3Result produced by classify()."""
+
+    def on_batch(self, results: List) -> None:
+        """Called with all results of a classify_batch() call."""
+
+
+def notify_hooks(hooks: Iterable["MetricsHook"], event: str, *args) -> None:
+    """
+    Call a callback on every hook, logging instead of raising errors.
+
+    A failing hook must not turn a successful run into a failed one, nor keep
+    the remaining hooks from being called.
+
+    Args:
+        hooks: Hooks to notify
+        event: Name of the callback, ``"on_result"`` or ``"on_batch"``
+        *args: Arguments passed to the callback
+    """
+    for hook in hooks:
+        try:
+            getattr(hook, event)(*args)
+        except Exception:
+            logger.exception("Metrics hook %s failed in %s", type(hook).__name__, event)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the style of Prometheus.
+
+    Args:
+        buckets: Sorted upper bounds of the buckets (``+Inf`` is implicit)
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        """Add the observations of a histogram with the same buckets."""
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation within buckets."""
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            if cumulative + count >= rank and count:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return lower
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsCollector(MetricsHook):
+    """
+    Hook that aggregates run metrics into counters and histograms.
+
+    Memory use is fixed by the bucket layout, no matter how many runs are
+    observed. The collected values can be rendered in the Prometheus text
+    exposition format with ``to_prometheus()``.
+
+    Args:
+        time_buckets: Bucket bounds for durations in seconds
+        rss_buckets: Bucket bounds for peak RSS in kB
+
+    Example:
+        >>> collector = MetricsCollector()
+        >>> wrapper = Haplogrep3Wrapper("haplogrep/haplogrep3", hooks=[collector])
+        >>> wrapper.classify_batch(vcf_files, "results")
+        >>> print(collector.to_prometheus())
+    """
+
+    def __init__(
+        self,
+        time_buckets: Sequence[float] = DEFAULT_TIME_BUCKETS,
+        rss_buckets: Sequence[float] = DEFAULT_RSS_BUCKETS
+    ):
+        self.time_buckets = tuple(time_buckets)
+        self.rss_buckets = tuple(rss_buckets)
+        self.runs = {"success": 0, "failure": 0}
+        self.killed = {"timeout": 0, "stalled": 0}
+        self.retries = 0
+        self.hedges = 0
+        self.samples = 0
+        self.input_bytes = 0
+        self.wall_time = Histogram(self.time_buckets)
+        self.phase_time: Dict[str, Histogram] = {}
+        self.peak_rss = Histogram(self.rss_buckets)
+        self._lock = threading.Lock()
+
+    def on_result(self, result) -> None:
+        metrics = result.metrics
+        with self._lock:
+            self.runs["success" if result.success else "failure"] += 1
+            reasons = list(result.retry_reasons)
+            if result.timed_out:
+                reasons.append("timeout")
+            if result.stalled:
+                reasons.append("stalled")
+            for reason in reasons:
+                if reason in self.killed:
+                    self.killed[reason] += 1
+            self.retries += len(result.retry_reasons)
+            self.hedges += result.hedged
+            if metrics is None:
+                return
+            self.wall_time.observe(metrics.wall_time)
+            for phase, timing in metrics.phases.items():
+                histogram = self.phase_time.get(phase)
+                if histogram is None:
+                    histogram = self.phase_time[phase] = Histogram(self.time_buckets)
+                histogram.observe(timing.wall)
+            if metrics.child_peak_rss_kb is not None:
+                self.peak_rss.observe(metrics.child_peak_rss_kb)
+            self.samples += metrics.output_samples or 0
+            self.input_bytes += metrics.input_size
+
+    def merge(self, other: "MetricsCollector") -> "MetricsCollector":
+        """Fold the observations of another collector into this one."""
+        with self._lock:
+            for key, value in other.runs.items():
+                self.runs[key] += value
+            for key, value in other.killed.items():
+                self.killed[key] += value
+            self.retries += other.retries
+            self.hedges += other.hedges
+            self.samples += other.samples
+            self.input_bytes += other.input_bytes
+            self.wall_time.merge(other.wall_time)
+            self.peak_rss.merge(other.peak_rss)
+            for phase, histogram in other.phase_time.items():
+                mine = self.phase_time.get(phase)
+                if mine is None:
+                    mine = self.phase_time[phase] = Histogram(self.time_buckets)
+                mine.merge(histogram)
+        return self
+
+    def summary(self) -> dict:
+        """Summarize run counts and median/p95/p99 latencies."""
+        def quantiles(histogram: Histogram) -> dict:
+            return {
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count if histogram.count else math.nan,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99)
+            }
+
+        with self._lock:
+            return {
+                "runs": dict(self.runs),
+                "killed": dict(self.killed),
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "samples": self.samples,
+                "input_bytes": self.input_bytes,
+                "wall_time": quantiles(self.wall_time),
+                "phases": {phase: quantiles(h) for phase, h in self.phase_time.items()},
+                "peak_rss_kb": quantiles(self.peak_rss)
+            }
+
+    def to_prometheus(self, prefix: str = "haplogrep3") -> str:
+        """
+        Render the collected metrics in the Prometheus text format.
+
+        Args:
+            prefix: Prefix of all metric names
+
+        Returns:
+            Text exposition of the metrics
+        """
+        lines = []
+
+        def histogram(name: str, help_text: str, series: Dict[str, Histogram], label: Optional[str] = None):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for label_value, h in series.items():
+                base = f'{label}="{_escape(label_value)}",' if label else ""
+                cumulative = 0
+                for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                    cumulative += count
+                    le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                    lines.append(f'{prefix}_{name}_bucket{{{base}le="{le}"}} {cumulative}')
+                labels = f"{{{base[:-1]}}}" if base else ""
+                lines.append(f"{prefix}_{name}_sum{labels} {h.sum!r}")
+                lines.append(f"{prefix}_{name}_count{labels} {h.count}")
+
+        with self._lock:
+            lines.append(f"# HELP {prefix}_runs_total Completed haplogrep3 runs by outcome.")
+            lines.append(f"# TYPE {prefix}_runs_total counter")
+            for outcome, count in self.runs.items():
+                lines.append(f'{prefix}_runs_total{{outcome="{outcome}"}} {count}')
+            lines.append(f"# HELP {prefix}_killed_total Runs killed by the watchdog, by reason.")
+            lines.append(f"# TYPE {prefix}_killed_total counter")
+            for reason, count in self.killed.items():
+                lines.append(f'{prefix}_killed_total{{reason="{reason}"}} {count}')
+            lines.append(f"# HELP {prefix}_retries_total Runs started again after a timeout, stall or signal.")
+            lines.append(f"# TYPE {prefix}_retries_total counter")
+            lines.append(f"{prefix}_retries_total {self.retries}")
+            lines.append(f"# HELP {prefix}_hedges_total Jobs for which a duplicate run was started.")
+            lines.append(f"# TYPE {prefix}_hedges_total counter")
+            lines.append(f"{prefix}_hedges_total {self.hedges}")
+            lines.append(f"# HELP {prefix}_samples_total Samples in successful results files.")
+            lines.append(f"# TYPE {prefix}_samples_total counter")
+            lines.append(f"{prefix}_samples_total {self.samples}")
+            lines.append(f"# HELP {prefix}_input_bytes_total Bytes of input files classified.")
+            lines.append(f"# TYPE {prefix}_input_bytes_total counter")
+            lines.append(f"{prefix}_input_bytes_total {self.input_bytes}")
+            histogram("run_seconds", "Wall time per run.", {"": self.wall_time})
+            histogram("phase_seconds", "Wall time per run phase.", self.phase_time, label="phase")
+            histogram("peak_rss_kilobytes", "Peak resident set size of the haplogrep3 process.", {"": self.peak_rss})
+
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter(MetricsCollector):
+    """
+    Collector that writes its metrics to a Prometheus text file.
+
+    The file is rewritten atomically after every batch (and on ``write()``),
+    which suits the node_exporter textfile collector.
+
+    Args:
+        path: Output file, e.g. ``/var/lib/node_exporter/haplogrep3.prom``
+        prefix: Prefix of all metric names
+        **kwargs: Bucket options passed to MetricsCollector
+    """
+
+    def __init__(self, path: Union[str, Path], prefix: str = "haplogrep3", **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.prefix = prefix
+
+    def on_batch(self, results: List) -> None:
+        self.write()
+
+    def write(self):
+        """Write the current metrics to the file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(self.prefix))
+        os.replace(tmp_path, self.path)
+
+
+class JsonLinesTraceLog(MetricsHook):
+    """
+    Hook that appends one JSON line per run to a trace log.
+
+    Each line holds the timestamp, input and output files, outcome and the
+    full JobMetrics of the run.
+
+    Args:
+        path: Path to the log file (appended to)
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def on_result(self, result) -> None:
+        record = {
+            "timestamp": time.time(),
+            "input_file": result.input_file,
+            "output_file": result.output_file,
+            "tree": result.tree,
+            "success": result.success,
+            "return_code": result.return_code,
+            "attempts": result.attempts,
+            "retry_reasons": result.retry_reasons,
+            "timed_out": result.timed_out,
+            "stalled": result.stalled,
+            "hedged": result.hedged,
+            "hedge_won": result.hedge_won,
+            "metrics": result.metrics.to_dict() if result.metrics else None
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+def read_trace_log(path: Union[str, Path]) -> Iterable[dict]:
+    """Stream the records of a JSON-lines trace log."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
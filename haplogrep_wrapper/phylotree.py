@@ -0,0 +1,329 @@
+"""
+Phylotree Module
+
+This module loads the phylogenetic tree packages shipped with Haplogrep3
+(``haplogrep/trees/<id>/<version>``) and answers ancestry questions about
+haplogroup names, such as lineages, macro-haplogroups and clade membership.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+import yaml
+
+
+# Names used for the most recent common ancestor in the bundled trees
+ROOT_NAMES = ("mt-MRCA", "mtMRCA")
+
+# Levels accepted by PhyloTree.rollup()
+ROLLUP_LEVELS = ("haplogroup", "macro", "L")
+
+_BASAL_PATTERN = re.compile(r"^L\d+$")
+_MACRO_FALLBACK_PATTERN = re.compile(r"^(L\d+|[A-Z]+)$")
+
+
+class PhyloTree:
+    """
+    Ancestry view of a Haplogrep3 tree package.
+
+    rCRS-based trees are stored in ``tree.xml`` rooted at the reference
+    haplogroup (H2a2a1); the parent links are re-oriented here so that every
+    lineage starts at the mt-MRCA.
+
+    Args:
+        directory: Directory containing ``tree.yaml`` and ``tree.xml``
+
+    Example:
+        >>> tree = PhyloTree("haplogrep/trees/phylotree-fu-rcrs/1.2")
+        >>> tree.macro_haplogroup("L3e1a2")
+        'L3'
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Load a tree package from disk.
+
+        Args:
+            directory: Directory containing ``tree.yaml`` and ``tree.xml``
+
+        Raises:
+            FileNotFoundError: If the tree package files do not exist
+        """
+        self.directory = Path(directory)
+        config_file = self.directory / "tree.yaml"
+
+        if not config_file.exists():
+            raise FileNotFoundError(f"Tree configuration not found: {config_file}")
+
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = yaml.safe_load(f) or {}
+
+        self.id = str(self.config.get("id", self.directory.parent.name))
+        self.version = str(self.config.get("version", self.directory.name))
+
+        xml_file = self.directory / self.config.get("tree", "tree.xml")
+        if not xml_file.exists():
+            raise FileNotFoundError(f"Tree file not found: {xml_file}")
+
+        self.parents: Dict[str, Optional[str]] = {}
+        self.children: Dict[str, List[str]] = {}
+        self.depth: Dict[str, int] = {}
+        self._load_xml(xml_file)
+
+        # Cluster labels from tree.yaml define the macro-haplogroups
+        self.clusters: Dict[str, str] = {}
+        for cluster in self.config.get("clusters") or []:
+            label = str(cluster["label"])
+            self.clusters[label] = label
+            for node in cluster.get("nodes") or []:
+                self.clusters[str(node)] = label
+
+        self._macro_cache: Dict[str, str] = {}
+        self._basal_cache: Dict[str, str] = {}
+
+    @property
+    def name(self) -> str:
+        """Tree name in Haplogrep3 notation, e.g. ``phylotree-fu-rcrs@1.2``."""
+        return f"{self.id}@{self.version}"
+
+    @property
+    def root(self) -> str:
+        """Name of the root haplogroup."""
+        return self._root
+
+    def _load_xml(self, xml_file: Path):
+        """Read tree.xml and orient all parent links towards the mt-MRCA."""
+        document = ET.parse(xml_file).getroot()
+
+        neighbours: Dict[str, List[str]] = {}
+        stack = [(element, None) for element in document.findall("haplogroup")]
+        while stack:
+            element, parent = stack.pop()
+            name = element.get("name")
+            neighbours.setdefault(name, [])
+            if parent is not None:
+                neighbours[name].append(parent)
+                neighbours[parent].append(name)
+            for child in element.findall("haplogroup"):
+                stack.append((child, name))
+
+        root = next((n for n in ROOT_NAMES if n in neighbours), None)
+        if root is None:
+            root = document.find("haplogroup").get("name")
+        self._root = root
+
+        self.parents[root] = None
+        self.depth[root] = 0
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            self.children[node] = []
+            for other in neighbours[node]:
+                if other not in self.parents:
+                    self.parents[other] = node
+                    self.depth[other] = self.depth[node] + 1
+                    self.children[node].append(other)
+                    queue.append(other)
+
+    def __contains__(self, haplogroup: str) -> bool:
+        return self.resolve(haplogroup) is not None
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def resolve(self, haplogroup: str) -> Optional[str]:
+        """
+        Map a haplogroup as reported by Haplogrep3 to a tree node.
+
+        Reported haplogroups may be quoted or carry private mutations
+        (e.g. ``H1+16189``); these are stripped before the lookup.
+
+        Args:
+            haplogroup: Haplogroup name from a results file
+
+        Returns:
+            Name of the tree node, or None if it is not part of the tree
+        """
+        name = haplogroup.strip().strip('"')
+        if name in self.parents:
+            return name
+        name = name.split("+", 1)[0].strip()
+        return name if name in self.parents else None
+
+    def lineage(self, haplogroup: str) -> List[str]:
+        """
+        Get the path from the root to a haplogroup.
+
+        Args:
+            haplogroup: Haplogroup name
+
+        Returns:
+            List of node names starting at the root and ending at the haplogroup
+
+        Raises:
+            KeyError: If the haplogroup is not part of the tree
+        """
+        node = self.resolve(haplogroup)
+        if node is None:
+            raise KeyError(f"Unknown haplogroup for {self.name}: {haplogroup}")
+
+        path = []
+        while node is not None:
+            path.append(node)
+            node = self.parents[node]
+        path.reverse()
+        return path
+
+    def distance(self, a: str, b: str) -> int:
+        """
+        Count the branches on the path between two haplogroups.
+
+        Raises:
+            KeyError: If either haplogroup is not part of the tree
+        """
+        path_a, path_b = self.lineage(a), self.lineage(b)
+        shared = 0
+        for x, y in zip(path_a, path_b):
+            if x != y:
+                break
+            shared += 1
+        return len(path_a) + len(path_b) - 2 * shared
+
+    def ancestor_at_depth(self, haplogroup: str, depth: int) -> str:
+        """
+        Get the ancestor of a haplogroup at a given depth below the root.
+
+        Haplogroups shallower than ``depth`` are returned unchanged.
+        """
+        path = self.lineage(haplogroup)
+        return path[min(depth, len(path) - 1)]
+
+    def macro_haplogroup(self, haplogroup: str) -> str:
+        """
+        Get the macro-haplogroup (e.g. ``H``, ``L3``, ``B``) of a haplogroup.
+
+        Uses the cluster labels from tree.yaml when the tree defines them and
+        otherwise the nearest ancestor with a plain letter name.
+        """
+        node = self.resolve(haplogroup)
+        if node is None:
+            raise KeyError(f"Unknown haplogroup for {self.name}: {haplogroup}")
+
+        if node not in self._macro_cache:
+            macro = None
+            for ancestor in reversed(self.lineage(node)):
+                if self.clusters:
+                    macro = self.clusters.get(ancestor)
+                elif _MACRO_FALLBACK_PATTERN.match(ancestor):
+                    macro = ancestor
+                if macro is not None:
+                    break
+            self._macro_cache[node] = macro or self.basal_haplogroup(node)
+
+        return self._macro_cache[node]
+
+    def basal_haplogroup(self, haplogroup: str) -> str:
+        """
+        Get the basal African lineage (``L0`` to ``L6``) of a haplogroup.
+
+        Out-of-Africa lineages resolve to ``L3``. Nodes above the L-level
+        (e.g. the mt-MRCA) are returned unchanged.
+        """
+        node = self.resolve(haplogroup)
+        if node is None:
+            raise KeyError(f"Unknown haplogroup for {self.name}: {haplogroup}")
+
+        if node not in self._basal_cache:
+            path = self.lineage(node)
+            basal = next((n for n in path if _BASAL_PATTERN.match(n)), node)
+            self._basal_cache[node] = basal
+
+        return self._basal_cache[node]
+
+    def rollup(self, haplogroup: str, level: Union[str, int]) -> str:
+        """
+        Map a haplogroup to the clade it belongs to at a given level.
+
+        Args:
+            haplogroup: Haplogroup name
+            level: ``"haplogroup"`` (the node itself), ``"macro"``,
+                ``"L"`` or an integer depth below the root
+
+        Returns:
+            Name of the clade
+        """
+        if isinstance(level, int):
+            return self.ancestor_at_depth(haplogroup, level)
+        if level == "haplogroup":
+            node = self.resolve(haplogroup)
+            if node is None:
+                raise KeyError(f"Unknown haplogroup for {self.name}: {haplogroup}")
+            return node
+        if level == "macro":
+            return self.macro_haplogroup(haplogroup)
+        if level == "L":
+            return self.basal_haplogroup(haplogroup)
+        raise ValueError(f"Unknown rollup level: {level!r} (expected one of {ROLLUP_LEVELS} or an int)")
+
+    def descendants(self, haplogroup: str) -> Set[str]:
+        """
+        Get a haplogroup and all haplogroups below it.
+
+        Args:
+            haplogroup: Haplogroup name
+
+        Returns:
+            Set of node names in the clade, including the haplogroup itself
+        """
+        node = self.resolve(haplogroup)
+        if node is None:
+            raise KeyError(f"Unknown haplogroup for {self.name}: {haplogroup}")
+
+        clade = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            clade.add(current)
+            stack.extend(self.children[current])
+        return clade
+
+
+def tree_directory(tree: str, trees_dir: Union[str, Path]) -> Path:
+    """
+    Get the package directory of a tree given in ``<id>@<version>`` notation.
+
+    Args:
+        tree: Tree name, e.g. ``phylotree-fu-rcrs@1.2``
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Returns:
+        Path to the tree package directory
+    """
+    tree_id, _, version = tree.partition("@")
+    if not version:
+        raise ValueError(f"Tree must be given as <id>@<version>: {tree}")
+    return Path(trees_dir) / tree_id / version
+
+
+@lru_cache(maxsize=None)
+def _load_tree_cached(directory: str) -> PhyloTree:
+    return PhyloTree(directory)
+
+
+def load_tree(tree: str, trees_dir: Union[str, Path]) -> PhyloTree:
+    """
+    Load a tree package, reusing previously loaded trees.
+
+    Args:
+        tree: Tree name, e.g. ``phylotree-fu-rcrs@1.2``
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Returns:
+        PhyloTree for the requested tree
+    """
+    directory = tree_directory(tree, trees_dir).resolve()
+    return _load_tree_cached(str(directory))
@@ -0,0 +1,395 @@
+"""
+Profiles Module
+
+This module derives the expected variant profile of every haplogroup from a
+tree package (``tree.xml`` and the reference FASTA) and scores whole cohorts
+of sample profiles against all haplogroups at once.
+
+Scores use the Kulczynski measure without Haplogrep3's polymorphism
+weights, so they are meant for screening (e.g. contamination checks), not as
+a replacement for classification with haplogrep3.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import yaml
+
+from .phylotree import tree_directory
+
+
+_POLY_PATTERN = re.compile(r"^(\d+)(?:\.(\d+|X))?([A-Za-z]*)$")
+
+_TRANSITIONS = {"A": "G", "G": "A", "C": "T", "T": "C"}
+
+# Upper bound of the (haplogroup x sample) cells scored at once
+_SCORE_BLOCK_CELLS = 1 << 22
+
+
+def read_reference(path: Union[str, Path]) -> str:
+    """Read the sequence of a single-record FASTA file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return "".join(line.strip() for line in f if not line.startswith(">")).upper()
+
+
+def canonical_poly(poly: str, reference: Optional[str] = None) -> str:
+    """
+    Write a polymorphism the way haplogrep3 reports it.
+
+    Bases are upper-cased, deletions are written ``d`` (``523DEL`` becomes
+    ``523d``) and, given the reference, a bare position is the transition
+    of the reference base (``16519`` becomes ``16519C``). Insertions keep
+    all their bases, so ``309.1CC`` and ``309.1C 309.2C`` stay different,
+    as they are in haplogrep3. Tokens that are not recognized are returned
+    stripped but otherwise unchanged.
+
+    Args:
+        poly: Polymorphism in Haplogrep notation
+        reference: Reference sequence the polymorphism refers to
+
+    Returns:
+        Polymorphism in canonical notation
+    """
+    token = poly.strip()
+    match = _POLY_PATTERN.match(token)
+    if match is None:
+        return token
+    position, insert, allele = match.group(1).lstrip("0") or "0", match.group(2), match.group(3).upper()
+
+    if insert is not None:
+        return f"{position}.{insert}{allele}"
+    if allele in ("D", "DEL"):
+        return f"{position}d"
+    if not allele and reference is not None and 0 < int(position) <= len(reference):
+        allele = _TRANSITIONS.get(reference[int(position) - 1], "")
+    return f"{position}{allele}"
+
+
+def normalize_poly(poly: str, reference: str) -> List[str]:
+    """
+    Bring one polymorphism into the canonical notation used for matching.
+
+    The notation is that of ``canonical_poly()``; back-mutation marks
+    (``!``) are dropped, and tokens that do not name an allele (unknown
+    notation, or a bare position at an ambiguous reference base) are
+    skipped.
+
+    Args:
+        poly: Polymorphism in Haplogrep notation
+        reference: Reference sequence the polymorphism refers to
+
+    Returns:
+        The canonical polymorphism, or an empty list if it is not recognized
+    """
+    token = canonical_poly(poly.strip().rstrip("!"), reference)
+    match = _POLY_PATTERN.match(token)
+    return [token] if match is not None and match.group(3) else []
+
+
+class ExpectedProfiles:
+    """
+    Expected polymorphisms of every haplogroup of a tree package.
+
+    Each haplogroup's profile is the composition of the mutations on its
+    path in ``tree.xml`` (back mutations included), relative to the tree's
+    reference sequence. Profiles are stored as a sparse haplogroup x
+    polymorphism matrix in CSR form. For scoring, only the difference of
+    every profile to its parent's is kept, indexed by polymorphism, so the
+    matches of a sample with all haplogroups are summed down the tree one
+    depth level at a time. Hotspots listed in ``tree.yaml`` are left out of
+    profiles and scores.
+
+    Args:
+        directory: Directory of the tree package
+
+    Example:
+        >>> profiles = ExpectedProfiles("haplogrep/trees/phylotree-fu-rcrs/1.2")
+        >>> profiles.classify([["73G", "263G", "2706G", "7028T", "11719A", "14766T"]])
+        [('R', 0.77...)]
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Build the profiles of a tree package.
+
+        Args:
+            directory: Directory containing ``tree.yaml``, ``tree.xml`` and
+                the reference FASTA
+
+        Raises:
+            FileNotFoundError: If the tree package files do not exist
+        """
+        self.directory = Path(directory)
+        config_file = self.directory / "tree.yaml"
+        if not config_file.exists():
+            raise FileNotFoundError(f"Tree configuration not found: {config_file}")
+
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = yaml.safe_load(f) or {}
+
+        fasta = self.directory / self.config.get("fasta", "rcrs.fasta")
+        xml_file = self.directory / self.config.get("tree", "tree.xml")
+        for path in (fasta, xml_file):
+            if not path.exists():
+                raise FileNotFoundError(f"Tree file not found: {path}")
+
+        self.reference = read_reference(fasta)
+        self.hotspots = {
+            p for hotspot in self.config.get("hotspots") or []
+            for p in normalize_poly(str(hotspot), self.reference)
+        }
+
+        self.polys: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.haplogroups: List[str] = []
+        self.index: Dict[str, int] = {}
+
+        parents: List[int] = []
+        rows = self._walk(ET.parse(xml_file).getroot(), parents)
+
+        self.indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(r) for r in rows])
+        self.indices = np.array([i for r in rows for i in sorted(r)], dtype=np.int32)
+        self.sizes = np.diff(self.indptr)
+        self.parents = np.array(parents, dtype=np.int64)
+
+        # Sorted (haplogroup, polymorphism) keys for membership tests
+        owners = np.repeat(np.arange(len(rows), dtype=np.int64), self.sizes)
+        self._keys = owners * max(len(self.polys), 1) + self.indices
+
+        # Profile differences to the parent: (haplogroup, +1/-1) per polymorphism
+        delta_poly, delta_owner, delta_sign = [], [], []
+        for h, row in enumerate(rows):
+            own = set(row)
+            inherited = set(rows[parents[h]]) if parents[h] >= 0 else set()
+            for sign, polys in ((1, own - inherited), (-1, inherited - own)):
+                for poly in polys:
+                    delta_poly.append(poly)
+                    delta_owner.append(h)
+                    delta_sign.append(sign)
+        delta_poly = np.array(delta_poly, dtype=np.int64)
+        order = np.argsort(delta_poly, kind="stable")
+        self._delta_indptr = np.zeros(len(self.polys) + 1, dtype=np.int64)
+        self._delta_indptr[1:] = np.cumsum(np.bincount(delta_poly, minlength=len(self.polys)))
+        self._delta_owners = np.array(delta_owner, dtype=np.int64)[order]
+        self._delta_signs = np.array(delta_sign, dtype=np.float64)[order]
+
+        # Haplogroups per depth level below the roots, parents before children
+        depth = np.zeros(len(rows), dtype=np.int64)
+        for h, parent in enumerate(parents):
+            if parent >= 0:
+                depth[h] = depth[parent] + 1
+        self._levels = [np.flatnonzero(depth == d) for d in range(1, int(depth.max(initial=0)) + 1)]
+
+    def _poly_id(self, poly: str) -> int:
+        poly_id = self.vocabulary.get(poly)
+        if poly_id is None:
+            poly_id = self.vocabulary[poly] = len(self.polys)
+            self.polys.append(poly)
+        return poly_id
+
+    def _walk(self, document, parents: List[int]) -> List[List[int]]:
+        """Compose the mutations along every path of tree.xml."""
+        rows = []
+        stack = [(element, {}, -1) for element in reversed(document.findall("haplogroup"))]
+        while stack:
+            element, parent_state, parent = stack.pop()
+            state = dict(parent_state)
+            for node in element.findall("details/poly"):
+                if node.text:
+                    self._apply(state, node.text.strip())
+            name = element.get("name")
+            h = self.index[name] = len(self.haplogroups)
+            self.haplogroups.append(name)
+            parents.append(parent)
+            rows.append([self._poly_id(p) for p in self._expected(state) if p not in self.hotspots])
+            for child in reversed(element.findall("haplogroup")):
+                stack.append((child, state, h))
+        return rows
+
+    def _apply(self, state: dict, poly: str):
+        """Apply one mutation of tree.xml to a position -> allele state."""
+        back = poly.endswith("!")
+        match = _POLY_PATTERN.match(poly.rstrip("!"))
+        if match is None:
+            return
+        position, insert, allele = int(match.group(1)), match.group(2), match.group(3).upper()
+        reference = self.reference[position - 1] if 0 < position <= len(self.reference) else "N"
+
+        if insert is not None:
+            if back:
+                state.pop((position, insert), None)
+            else:
+                state[(position, insert)] = allele
+        elif allele == "D":
+            state[position] = reference if back else "d"
+        elif allele:
+            state[position] = allele
+        else:
+            state[position] = _TRANSITIONS.get(state.get(position, reference), reference)
+
+    def _expected(self, state: dict) -> List[str]:
+        polys = []
+        for key, allele in state.items():
+            if isinstance(key, tuple):
+                polys.append(f"{key[0]}.{key[1]}{allele}")
+            elif key > len(self.reference) or allele != self.reference[key - 1]:
+                polys.append(f"{key}{allele}")
+        return polys
+
+    def __len__(self) -> int:
+        return len(self.haplogroups)
+
+    def profile(self, haplogroup: str) -> List[str]:
+        """
+        Get the expected polymorphisms of a haplogroup.
+
+        Raises:
+            KeyError: If the haplogroup is not part of the tree
+        """
+        h = self.index[haplogroup]
+        return [self.polys[i] for i in self.indices[self.indptr[h]:self.indptr[h + 1]]]
+
+    def contains(self, haplogroups: np.ndarray, polys: np.ndarray) -> np.ndarray:
+        """
+        Test element-wise whether haplogroups expect polymorphisms.
+
+        Args:
+            haplogroups: Haplogroup indices
+            polys: Polymorphism indices (into ``polys``), same shape
+
+        Returns:
+            Boolean array
+        """
+        keys = np.asarray(haplogroups, dtype=np.int64) * max(len(self.polys), 1) + np.asarray(polys)
+        found = np.searchsorted(self._keys, keys)
+        found = np.minimum(found, len(self._keys) - 1)
+        return self._keys[found] == keys
+
+    def encode(self, profiles: Sequence[Iterable[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encode sample profiles for scoring.
+
+        Args:
+            profiles: Polymorphisms of every sample in Haplogrep notation
+
+        Returns:
+            (indptr, indices, totals): CSR rows of known polymorphism indices
+            per sample and the number of non-hotspot polymorphisms per sample
+            (including those the tree does not know)
+        """
+        indptr = [0]
+        indices = []
+        totals = []
+        for polys in profiles:
+            canonical = {c for p in polys for c in normalize_poly(p, self.reference)} - self.hotspots
+            known = sorted(self.vocabulary[p] for p in canonical if p in self.vocabulary)
+            indices.extend(known)
+            indptr.append(len(indices))
+            totals.append(len(canonical))
+        return (
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(totals, dtype=np.int64)
+        )
+
+    def score_encoded(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        totals: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the best-scoring haplogroup of every encoded sample profile.
+
+        The Kulczynski score of a sample and a haplogroup is the mean of the
+        found share of the haplogroup's expected polymorphisms and of the
+        sample's polymorphisms. Samples are scored in blocks that keep the
+        haplogroup x sample matrix to a bounded size.
+
+        Args:
+            indptr: CSR row pointers, one row per sample
+            indices: Polymorphism indices of all samples
+            totals: Polymorphisms per sample, including unknown ones
+
+        Returns:
+            (best, score): index of the best haplogroup and its score per sample
+        """
+        samples = len(indptr) - 1
+        n_haplogroups = len(self.haplogroups)
+        best = np.zeros(samples, dtype=np.int64)
+        score = np.zeros(samples, dtype=np.float64)
+        if not n_haplogroups:
+            return best, score
+
+        indices = np.asarray(indices, dtype=np.int64)
+        edges = self._delta_indptr[indices + 1] - self._delta_indptr[indices]
+        expected = np.maximum(self.sizes, 1).astype(np.float64)[:, None]
+        block = max(1, _SCORE_BLOCK_CELLS // n_haplogroups)
+
+        for start in range(0, samples, block):
+            stop = min(start + block, samples)
+            width = stop - start
+            lo, hi = indptr[start], indptr[stop]
+
+            # Expand every sample polymorphism to the tree edges that change it
+            counts = edges[lo:hi]
+            columns = np.repeat(np.repeat(np.arange(width), np.diff(indptr[start:stop + 1])), counts)
+            begin = np.repeat(self._delta_indptr[indices[lo:hi]], counts)
+            offsets = begin + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+            found = np.bincount(
+                self._delta_owners[offsets] * width + columns,
+                weights=self._delta_signs[offsets],
+                minlength=n_haplogroups * width
+            ).reshape(n_haplogroups, width)
+            for level in self._levels:
+                found[level] += found[self.parents[level]]
+
+            sample_total = totals[start:stop].astype(np.float64)[None, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                of_sample = np.where(sample_total > 0, found / sample_total, 1.0)
+            of_expected = np.where(self.sizes[:, None] > 0, found / expected, 1.0)
+            scores = 0.5 * (of_expected + of_sample)
+
+            best[start:stop] = scores.argmax(axis=0)
+            score[start:stop] = scores[best[start:stop], np.arange(width)]
+
+        return best, score
+
+    def classify(self, profiles: Sequence[Iterable[str]]) -> List[Tuple[str, float]]:
+        """
+        Get the best-scoring haplogroup of every sample profile.
+
+        Args:
+            profiles: Polymorphisms of every sample in Haplogrep notation
+
+        Returns:
+            (haplogroup, score) per sample
+        """
+        best, score = self.score_encoded(*self.encode(profiles))
+        return [(self.haplogroups[b], float(s)) for b, s in zip(best, score)]
+
+
+@lru_cache(maxsize=None)
+def _load_profiles_cached(directory: str) -> ExpectedProfiles:
+    return ExpectedProfiles(directory)
+
+
+def load_expected_profiles(tree: str, trees_dir: Union[str, Path]) -> ExpectedProfiles:
+    """
+    Load the expected haplogroup profiles of a tree, reusing earlier loads.
+
+    Args:
+        tree: Tree name, e.g. ``phylotree-fu-rcrs@1.2``
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Returns:
+        ExpectedProfiles for the requested tree
+    """
+    directory = tree_directory(tree, trees_dir).resolve()
+    return _load_profiles_cached(str(directory))
@@ -0,0 +1,408 @@
+"""
+QC Module
+
+This module screens multi-sample VCF files for contamination and
+heteroplasmy. Allele fractions of all samples are read into one matrix, split
+into a major and a minor profile per sample and both profile sets are scored
+against every haplogroup of the tree at once (see ``profiles``), so a screen
+costs about as much as one classification pass over the cohort.
+
+A sample is reported as contaminated when its major and minor profiles fall
+into different haplogroups that are far enough apart in the tree and enough
+heteroplasmic sites tell the two apart.
+"""
+
+import csv
+import statistics
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from .phylotree import PhyloTree
+from .profiles import ExpectedProfiles
+
+
+@dataclass
+class AlleleFractions:
+    """
+    Allele fractions of all samples of a VCF file.
+
+    Attributes:
+        samples: Sample IDs in column order
+        polys: Polymorphisms (Haplogrep notation) of every ALT allele, one
+            entry per row of ``fractions``
+        fractions: Array of shape (alleles, samples) with the fraction of
+            reads supporting each ALT allele; NaN where a sample has no call
+    """
+    samples: List[str]
+    polys: List[List[str]]
+    fractions: np.ndarray
+
+
+@dataclass
+class ContaminationResult:
+    """
+    Contamination screen of a single sample.
+
+    Attributes:
+        sample_id: Sample identifier
+        contaminated: Whether the sample looks like a mixture of two lineages
+        major_haplogroup: Best haplogroup of the major profile
+        major_score: Score of the major haplogroup (0.0-1.0)
+        minor_haplogroup: Best haplogroup of the minor profile
+        minor_score: Score of the minor haplogroup (0.0-1.0)
+        heteroplasmies: Number of heteroplasmic sites
+        informative_heteroplasmies: Heteroplasmic sites expected by exactly
+            one of the two haplogroups
+        minor_level: Median fraction of the minor allele at the informative
+            sites (an estimate of the contamination level)
+        distance: Branches between the two haplogroups in the tree
+    """
+    sample_id: str
+    contaminated: bool
+    major_haplogroup: str
+    major_score: float
+    minor_haplogroup: str
+    minor_score: float
+    heteroplasmies: int
+    informative_heteroplasmies: int
+    minor_level: Optional[float] = None
+    distance: Optional[int] = None
+
+
+def vcf_polys(position: int, ref: str, alt: str) -> List[str]:
+    """
+    Convert a VCF allele to polymorphisms in Haplogrep notation.
+
+    Shared leading and trailing bases are trimmed first, so padded SNPs
+    (``CT`` -> ``TT``) become plain substitutions. Deletions are reported per
+    deleted base (``3107d``), insertions as one polymorphism with all inserted
+    bases (``309.1CC``), as haplogrep3 writes them.
+
+    Args:
+        position: POS of the VCF record
+        ref: REF allele
+        alt: ALT allele
+
+    Returns:
+        Polymorphisms (empty for symbolic, missing or complex alleles)
+    """
+    ref, alt = ref.upper(), alt.upper()
+    if not alt or alt in (".", "*") or alt.startswith("<") or not alt.isalpha():
+        return []
+
+    while len(ref) > 1 and len(alt) > 1 and ref[-1] == alt[-1]:
+        ref, alt = ref[:-1], alt[:-1]
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref, alt = ref[1:], alt[1:]
+        position += 1
+
+    if len(ref) == len(alt):
+        return [f"{position + i}{b}" for i, (a, b) in enumerate(zip(ref, alt)) if a != b]
+    if len(alt) == 1 and ref[0] == alt:
+        return [f"{position + i}d" for i in range(1, len(ref))]
+    if len(ref) == 1 and alt[0] == ref:
+        return [f"{position}.1{alt[1:]}"]
+    return []
+
+
+def _format_values(calls: str, samples: int, keys: int, index: int) -> List[str]:
+    """Get one FORMAT field of all samples from the tab-separated calls of a record."""
+    if keys == 1:
+        values = calls.split("\t")
+    else:
+        values = calls.replace("\t", ":").split(":")
+        if len(values) == samples * keys:
+            return values[index::keys]
+
+        # Some calls have fewer fields than FORMAT lists
+        values = [cell.split(":") for cell in calls.split("\t")]
+        values = [parts[index] if index < len(parts) else "." for parts in values]
+    if len(values) != samples:
+        raise ValueError(f"Expected {samples} calls, found {len(values)}")
+    return values
+
+
+def _to_float(values: List[str]) -> np.ndarray:
+    try:
+        return np.array(list(map(float, values)))
+    except ValueError:
+        return np.array([float(v) if v not in (".", "") else np.nan for v in values])
+
+
+def _record_fractions(keys: List[str], calls: str, samples: int, alts: int) -> np.ndarray:
+    """Get the (alts x samples) fractions of one VCF record from AF, AD or GT."""
+    fractions = np.full((alts, samples), np.nan)
+
+    if "AF" in keys:
+        values = _format_values(calls, samples, len(keys), keys.index("AF"))
+        if alts == 1:
+            return _to_float(values)[None, :]
+        flat = ",".join(values).split(",")
+        if len(flat) == alts * samples:
+            return _to_float(flat).reshape(samples, alts).T
+        for j, value in enumerate(values):
+            for i, af in enumerate(value.split(",")[:alts]):
+                if af not in (".", ""):
+                    fractions[i, j] = float(af)
+        return fractions
+
+    if "AD" in keys:
+        for j, value in enumerate(_format_values(calls, samples, len(keys), keys.index("AD"))):
+            depths = [int(d) if d.isdigit() else 0 for d in value.split(",")]
+            total = sum(depths)
+            if total > 0:
+                for i, depth in enumerate(depths[1:alts + 1]):
+                    fractions[i, j] = depth / total
+        return fractions
+
+    if "GT" in keys:
+        values = _format_values(calls, samples, len(keys), keys.index("GT"))
+        codes = np.array(values)
+        if codes.dtype.itemsize == np.dtype("U1").itemsize and "".join(values).isdigit():
+            # Haploid calls only
+            alleles = codes.astype(np.int64)
+            for i in range(alts):
+                fractions[i] = alleles == i + 1
+            return fractions
+        for j, value in enumerate(values):
+            alleles = [a for a in value.replace("|", "/").split("/") if a.isdigit()]
+            if alleles:
+                fractions[:, j] = 0.0
+                for allele in alleles:
+                    if 0 < int(allele) <= alts:
+                        fractions[int(allele) - 1, j] += 1 / len(alleles)
+    return fractions
+
+
+def read_allele_fractions(vcf_file: Union[str, Path]) -> AlleleFractions:
+    """
+    Read the allele fractions of all samples of a VCF file.
+
+    Fractions come from the ``AF`` format field where a record has one,
+    otherwise from the allele depths (``AD``) or, for plain genotype calls,
+    from the share of called alleles (``GT``).
+
+    Args:
+        vcf_file: Path to a (multi-sample) VCF file
+
+    Returns:
+        AlleleFractions with one row per ALT allele
+
+    Raises:
+        FileNotFoundError: If the VCF file does not exist
+        ValueError: If the file has no ``#CHROM`` header line or a record
+            has the wrong number of calls
+    """
+    vcf_path = Path(vcf_file)
+    if not vcf_path.exists():
+        raise FileNotFoundError(f"VCF file not found: {vcf_path}")
+
+    samples = None
+    polys: List[List[str]] = []
+    blocks: List[np.ndarray] = []
+    with open(vcf_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("##"):
+                continue
+            record = line.rstrip("\r\n").split("\t", 9)
+            if line.startswith("#CHROM"):
+                samples = record[9].split("\t") if len(record) > 9 else []
+                continue
+            if samples is None:
+                raise ValueError(f"VCF file has no #CHROM header: {vcf_path}")
+            if len(record) < 10 or not record[1].isdigit():
+                continue
+
+            position, ref, alts = int(record[1]), record[3], record[4].split(",")
+            polys.extend(vcf_polys(position, ref, alt) for alt in alts)
+            blocks.append(_record_fractions(record[8].split(":"), record[9], len(samples), len(alts)))
+
+    if samples is None:
+        raise ValueError(f"VCF file has no #CHROM header: {vcf_path}")
+
+    fractions = np.concatenate(blocks) if blocks else np.zeros((0, len(samples)))
+    return AlleleFractions(samples=samples, polys=polys, fractions=fractions)
+
+
+def _gather(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the CSR offsets of the given rows, concatenated, and their lengths."""
+    counts = indptr[rows + 1] - indptr[rows]
+    offsets = np.repeat(indptr[rows], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return offsets, counts
+
+
+class ContaminationScreen:
+    """
+    Vectorized contamination and heteroplasmy screen.
+
+    Every allele is classified by its fraction relative to ``het_level``, the
+    level Haplogrep3 uses to tell heteroplasmies from homoplasmies: at or
+    above ``het_level`` it is homoplasmic, at or below ``1 - het_level`` (the
+    other allele reaching ``het_level``) it is absent, and in between it is
+    heteroplasmic. Homoplasmies go into both profiles of a sample; at
+    heteroplasmic sites the major profile gets the allele with the higher
+    fraction and the minor profile the other one.
+
+    Args:
+        profiles: Expected haplogroup profiles of the tree
+        tree: Tree used to measure the distance between major and minor
+            haplogroups (optional)
+        het_level: Allele fraction from which a variant is homoplasmic
+        min_level: Lowest fraction counted as heteroplasmy
+            (default: ``1 - het_level``)
+        min_heteroplasmies: Informative heteroplasmic sites needed to report
+            contamination
+        min_distance: Branches needed between major and minor haplogroup to
+            report contamination (only checked with a tree)
+
+    Example:
+        >>> screen = ContaminationScreen(load_expected_profiles(tree, trees_dir))
+        >>> for result in screen.screen_file("cohort.vcf"):
+        ...     print(result.sample_id, result.contaminated, result.minor_level)
+    """
+
+    def __init__(
+        self,
+        profiles: ExpectedProfiles,
+        tree: Optional[PhyloTree] = None,
+        het_level: float = 0.9,
+        min_level: Optional[float] = None,
+        min_heteroplasmies: int = 2,
+        min_distance: int = 2
+    ):
+        if not 0.5 <= het_level <= 1.0:
+            raise ValueError("het_level must be between 0.5 and 1.0")
+        self.profiles = profiles
+        self.tree = tree
+        self.het_level = het_level
+        self.min_level = 1.0 - het_level if min_level is None else min_level
+        self.min_heteroplasmies = min_heteroplasmies
+        self.min_distance = min_distance
+
+    def _alleles(self, polys: List[List[str]]):
+        """Map allele rows to tree polymorphism indices (CSR) and counted sizes."""
+        vocabulary, hotspots = self.profiles.vocabulary, self.profiles.hotspots
+        indptr = [0]
+        indices: List[int] = []
+        totals = []
+        for row in polys:
+            counted = [p for p in row if p not in hotspots]
+            indices.extend(vocabulary[p] for p in counted if p in vocabulary)
+            indptr.append(len(indices))
+            totals.append(len(counted))
+        return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(totals, dtype=np.int64)
+
+    def _encode(self, present: np.ndarray, alleles) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Encode the (alleles x samples) presence matrix as sample profiles."""
+        row_indptr, row_indices, row_totals = alleles
+        n_samples = present.shape[1]
+        samples, rows = np.nonzero(present.T)
+        offsets, counts = _gather(row_indptr, rows)
+
+        width = max(len(self.profiles.polys), 1)
+        keys = np.unique(np.repeat(samples, counts) * width + row_indices[offsets])
+        indptr = np.zeros(n_samples + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(keys // width, minlength=n_samples))
+        totals = np.bincount(samples, weights=row_totals[rows], minlength=n_samples).astype(np.int64)
+        return indptr, keys % width, totals
+
+    def screen(self, data: AlleleFractions) -> List[ContaminationResult]:
+        """
+        Screen all samples of an allele fraction matrix.
+
+        Args:
+            data: Allele fractions, e.g. from ``read_allele_fractions``
+
+        Returns:
+            ContaminationResult per sample, in column order
+        """
+        fractions = np.nan_to_num(np.asarray(data.fractions, dtype=np.float64), nan=0.0)
+        homoplasmic = fractions >= self.het_level
+        heteroplasmic = (fractions > self.min_level) & ~homoplasmic
+        major = homoplasmic | (heteroplasmic & (fractions >= 0.5))
+        minor = homoplasmic | (heteroplasmic & (fractions < 0.5))
+
+        alleles = self._alleles(data.polys)
+        major_best, major_score = self.profiles.score_encoded(*self._encode(major, alleles))
+        minor_best, minor_score = self.profiles.score_encoded(*self._encode(minor, alleles))
+
+        # A heteroplasmy is informative if only one of the two haplogroups
+        # expects one of its polymorphisms (an allele can be several, e.g. MNVs)
+        rows, samples = np.nonzero(heteroplasmic)
+        row_indptr, row_indices, _ = alleles
+        offsets, counts = _gather(row_indptr, rows)
+        owners = np.repeat(np.arange(rows.size), counts)
+        polys = row_indices[offsets]
+        differs = (
+            self.profiles.contains(major_best[samples[owners]], polys)
+            != self.profiles.contains(minor_best[samples[owners]], polys)
+        )
+        informative = np.bincount(owners[differs], minlength=rows.size) > 0
+        levels = fractions[rows, samples]
+        levels = np.minimum(levels, 1.0 - levels)
+
+        sample_informative = np.bincount(samples[informative], minlength=len(data.samples))
+        sample_heteroplasmies = heteroplasmic.sum(axis=0)
+        order = np.argsort(samples[informative], kind="stable")
+        grouped = np.split(levels[informative][order], np.cumsum(sample_informative)[:-1])
+
+        haplogroups = self.profiles.haplogroups
+        results = []
+        for s, sample_id in enumerate(data.samples):
+            major_hg, minor_hg = haplogroups[major_best[s]], haplogroups[minor_best[s]]
+            distance = None
+            if self.tree is not None:
+                try:
+                    distance = self.tree.distance(major_hg, minor_hg)
+                except KeyError:
+                    distance = None
+
+            contaminated = (
+                major_hg != minor_hg
+                and sample_informative[s] >= self.min_heteroplasmies
+                and (distance is None or distance >= self.min_distance)
+            )
+            results.append(ContaminationResult(
+                sample_id=sample_id,
+                contaminated=bool(contaminated),
+                major_haplogroup=major_hg,
+                major_score=float(major_score[s]),
+                minor_haplogroup=minor_hg,
+                minor_score=float(minor_score[s]),
+                heteroplasmies=int(sample_heteroplasmies[s]),
+                informative_heteroplasmies=int(sample_informative[s]),
+                minor_level=float(statistics.median(grouped[s])) if len(grouped[s]) else None,
+                distance=distance
+            ))
+        return results
+
+    def screen_file(self, vcf_file: Union[str, Path]) -> List[ContaminationResult]:
+        """
+        Screen all samples of a VCF file.
+
+        Raises:
+            FileNotFoundError: If the VCF file does not exist
+        """
+        return self.screen(read_allele_fractions(vcf_file))
+
+
+def write_contamination_report(results: List[ContaminationResult], path: Union[str, Path]) -> Path:
+    """
+    Write contamination results as a tab-separated file with one row per sample.
+
+    Returns:
+        Path of the written report
+    """
+    report_path = Path(path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    columns = [f.name for f in fields(ContaminationResult)]
+    with open(report_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, delimiter="\t")
+        writer.writeheader()
+        for result in results:
+            row = asdict(result)
+            writer.writerow({k: "" if v is None else v for k, v in row.items()})
+    return report_path
@@ -0,0 +1,379 @@
+"""
+Results Module
+
+This module parses Haplogrep3 classification output files and folds them into
+bounded-memory haplogroup frequency tables for cohort-level summaries.
+"""
+
+import csv
+import json
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .phylotree import PhyloTree
+
+
+@dataclass
+class ResultRecord:
+    """
+    A single row of a Haplogrep3 results file.
+
+    Attributes:
+        sample_id: Sample identifier
+        haplogroup: Reported haplogroup
+        rank: Rank of the hit (1 is the best hit)
+        quality: Classification quality score (0.0-1.0)
+        range: Covered range of the profile
+        extra: Any additional columns, e.g. from an extended report
+    """
+    sample_id: str
+    haplogroup: str
+    rank: int
+    quality: float
+    range: str = ""
+    extra: Dict[str, str] = field(default_factory=dict)
+
+
+def iter_results(output_file: Union[str, Path]) -> Iterator[ResultRecord]:
+    """
+    Stream the rows of a Haplogrep3 results file.
+
+    The file is read line by line, so arbitrarily large outputs can be
+    processed without loading them into memory.
+
+    Args:
+        output_file: Path to the results file
+
+    Yields:
+        ResultRecord for each data row
+
+    Raises:
+        FileNotFoundError: If the results file does not exist
+        ValueError: If the file does not have the expected header
+    """
+    output_path = Path(output_file)
+
+    if not output_path.exists():
+        raise FileNotFoundError(f"Output file not found: {output_path}")
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, None)
+        if header is None:
+            return
+
+        columns = [c.strip() for c in header]
+        if "SampleID" not in columns or "Haplogroup" not in columns:
+            raise ValueError(f"Not a Haplogrep3 results file: {output_path}")
+
+        known = {"SampleID", "Haplogroup", "Rank", "Quality", "Range"}
+        for row in reader:
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            values = dict(zip(columns, (cell.strip() for cell in row)))
+            yield ResultRecord(
+                sample_id=values.get("SampleID", ""),
+                haplogroup=values.get("Haplogroup", ""),
+                rank=int(values.get("Rank") or 1),
+                quality=float(values.get("Quality") or "nan"),
+                range=values.get("Range", ""),
+                extra={k: v for k, v in values.items() if k not in known}
+            )
+
+
+def is_complete_results_file(output_file: Union[str, Path]) -> bool:
+    """
+    Check that a results file was written completely.
+
+    A complete file has a Haplogrep3 header, ends with a newline and every
+    data row has as many columns as the header. Files cut short by a crash
+    fail at least one of these checks.
+
+    Args:
+        output_file: Path to the results file
+
+    Returns:
+        True if the file looks complete
+    """
+    output_path = Path(output_file)
+
+    try:
+        with open(output_path, 'rb') as f:
+            f.seek(0, 2)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                return False
+
+        with open(output_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f, delimiter='\t')
+            header = [c.strip() for c in next(reader, [])]
+            if "SampleID" not in header or "Haplogroup" not in header:
+                return False
+            for row in reader:
+                if row and len(row) != len(header):
+                    return False
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return False
+
+    return True
+
+
+@dataclass
+class CladeFrequency:
+    """
+    One row of a haplogroup frequency table.
+
+    Attributes:
+        clade: Clade name at the requested level
+        count: Number of samples in the clade
+        frequency: Fraction of all counted samples
+        mean_quality: Mean quality score of the samples in the clade
+        min_quality: Lowest quality score
+        max_quality: Highest quality score
+        quality_histogram: Sample counts per quality bin over [0, 1]
+    """
+    clade: str
+    count: int
+    frequency: float
+    mean_quality: float
+    min_quality: float
+    max_quality: float
+    quality_histogram: List[int]
+
+
+class _CladeStats:
+    """Running count and quality distribution for one haplogroup."""
+
+    __slots__ = ("count", "quality_sum", "min_quality", "max_quality", "histogram")
+
+    def __init__(self, bins: int):
+        self.count = 0
+        self.quality_sum = 0.0
+        self.min_quality = math.inf
+        self.max_quality = -math.inf
+        self.histogram = [0] * bins
+
+    def add(self, quality: float):
+        self.count += 1
+        if math.isnan(quality):
+            return
+        bins = len(self.histogram)
+        self.quality_sum += quality
+        self.min_quality = min(self.min_quality, quality)
+        self.max_quality = max(self.max_quality, quality)
+        self.histogram[min(max(int(quality * bins), 0), bins - 1)] += 1
+
+    def merge(self, other: "_CladeStats"):
+        self.count += other.count
+        self.quality_sum += other.quality_sum
+        self.min_quality = min(self.min_quality, other.min_quality)
+        self.max_quality = max(self.max_quality, other.max_quality)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    @property
+    def scored(self) -> int:
+        return sum(self.histogram)
+
+
+class HaplogroupAggregator:
+    """
+    Streaming, mergeable aggregate of haplogroup assignments.
+
+    Counts and quality histograms are kept per reported haplogroup (private
+    mutations such as ``+16189`` are dropped), so memory is bounded by the
+    size of the tree rather than the number of samples. Rolling up to
+    macro-haplogroups or L-level happens only when a table is requested.
+    Partial aggregates from different workers can be combined with
+    ``merge()`` or ``+`` and exchanged as JSON via ``save()``/``load()``.
+
+    Args:
+        bins: Number of quality histogram bins over [0, 1]
+
+    Example:
+        >>> aggregator = HaplogroupAggregator()
+        >>> aggregator.add_files(Path("results").glob("*_haplogroups.txt"))
+        >>> table = aggregator.frequency_table(tree, level="macro")
+    """
+
+    def __init__(self, bins: int = 20):
+        if bins < 1:
+            raise ValueError("bins must be at least 1")
+        self.bins = bins
+        self.samples = 0
+        self._stats: Dict[str, _CladeStats] = {}
+
+    def __len__(self) -> int:
+        return self.samples
+
+    def add(self, haplogroup: str, quality: float = math.nan):
+        """
+        Count one sample.
+
+        Args:
+            haplogroup: Haplogroup as reported by Haplogrep3
+            quality: Classification quality score
+        """
+        name = haplogroup.strip().strip('"').split("+", 1)[0].strip()
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _CladeStats(self.bins)
+        stats.add(quality)
+        self.samples += 1
+
+    def add_records(self, records: Iterable[ResultRecord]):
+        """Count the best hit (rank 1) of each record."""
+        for record in records:
+            if record.rank == 1:
+                self.add(record.haplogroup, record.quality)
+
+    def add_file(self, output_file: Union[str, Path]):
+        """Stream one Haplogrep3 results file into the aggregate."""
+        self.add_records(iter_results(output_file))
+
+    def add_files(self, output_files: Iterable[Union[str, Path]]):
+        """Stream several Haplogrep3 results files into the aggregate."""
+        for output_file in output_files:
+            self.add_file(output_file)
+
+    def merge(self, other: "HaplogroupAggregator") -> "HaplogroupAggregator":
+        """
+        Fold another partial aggregate into this one.
+
+        Args:
+            other: Aggregate built with the same number of bins
+
+        Returns:
+            This aggregator, for chaining
+        """
+        if other.bins != self.bins:
+            raise ValueError(f"Cannot merge aggregates with {other.bins} and {self.bins} bins")
+        for name, stats in other._stats.items():
+            mine = self._stats.get(name)
+            if mine is None:
+                mine = self._stats[name] = _CladeStats(self.bins)
+            mine.merge(stats)
+        self.samples += other.samples
+        return self
+
+    def __add__(self, other: "HaplogroupAggregator") -> "HaplogroupAggregator":
+        combined = HaplogroupAggregator(self.bins)
+        combined.merge(self)
+        combined.merge(other)
+        return combined
+
+    def __iadd__(self, other: "HaplogroupAggregator") -> "HaplogroupAggregator":
+        return self.merge(other)
+
+    def _rolled_up(self, tree: Optional[PhyloTree], level: Union[str, int]) -> Dict[str, _CladeStats]:
+        if tree is None and level != "haplogroup":
+            raise ValueError(f"A tree is required to roll up to level {level!r}")
+
+        clades: Dict[str, _CladeStats] = {}
+        for name, stats in self._stats.items():
+            clade = name
+            if tree is not None and tree.resolve(name) is not None:
+                clade = tree.rollup(name, level)
+            target = clades.get(clade)
+            if target is None:
+                target = clades[clade] = _CladeStats(self.bins)
+            target.merge(stats)
+        return clades
+
+    def counts(self, tree: Optional[PhyloTree] = None, level: Union[str, int] = "haplogroup") -> Dict[str, int]:
+        """
+        Get sample counts per clade.
+
+        Args:
+            tree: Tree used to roll haplogroups up (not needed for ``"haplogroup"``)
+            level: ``"haplogroup"``, ``"macro"``, ``"L"`` or an integer depth
+
+        Returns:
+            Mapping of clade name to sample count
+        """
+        return {clade: stats.count for clade, stats in self._rolled_up(tree, level).items()}
+
+    def frequency_table(
+        self,
+        tree: Optional[PhyloTree] = None,
+        level: Union[str, int] = "haplogroup"
+    ) -> List[CladeFrequency]:
+        """
+        Build a frequency table with quality distributions per clade.
+
+        Haplogroups that are not part of the tree are reported under their
+        own name.
+
+        Args:
+            tree: Tree used to roll haplogroups up (not needed for ``"haplogroup"``)
+            level: ``"haplogroup"``, ``"macro"``, ``"L"`` or an integer depth
+
+        Returns:
+            List of CladeFrequency rows, most frequent clade first
+        """
+        table = []
+        for clade, stats in self._rolled_up(tree, level).items():
+            scored = stats.scored
+            table.append(CladeFrequency(
+                clade=clade,
+                count=stats.count,
+                frequency=stats.count / self.samples if self.samples else 0.0,
+                mean_quality=stats.quality_sum / scored if scored else math.nan,
+                min_quality=stats.min_quality if scored else math.nan,
+                max_quality=stats.max_quality if scored else math.nan,
+                quality_histogram=list(stats.histogram)
+            ))
+        table.sort(key=lambda row: (-row.count, row.clade))
+        return table
+
+    def to_dict(self) -> dict:
+        """Serialize the aggregate to a JSON-compatible dictionary."""
+        return {
+            "bins": self.bins,
+            "samples": self.samples,
+            "haplogroups": {
+                name: {
+                    "count": stats.count,
+                    "quality_sum": stats.quality_sum,
+                    "min_quality": stats.min_quality if stats.scored else None,
+                    "max_quality": stats.max_quality if stats.scored else None,
+                    "histogram": stats.histogram
+                }
+                for name, stats in self._stats.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HaplogroupAggregator":
+        """Rebuild an aggregate serialized with ``to_dict()``."""
+        aggregator = cls(bins=int(data["bins"]))
+        aggregator.samples = int(data["samples"])
+        for name, values in data["haplogroups"].items():
+            stats = _CladeStats(aggregator.bins)
+            stats.count = int(values["count"])
+            stats.quality_sum = float(values["quality_sum"])
+            if values["min_quality"] is not None:
+                stats.min_quality = float(values["min_quality"])
+                stats.max_quality = float(values["max_quality"])
+            stats.histogram = [int(v) for v in values["histogram"]]
+            aggregator._stats[name] = stats
+        return aggregator
+
+    def save(self, path: Union[str, Path]):
+        """Write the aggregate to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "HaplogroupAggregator":
+        """Read an aggregate written with ``save()``."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def bin_edges(bins: int) -> List[Tuple[float, float]]:
+    """Get the (lower, upper) quality bounds of each histogram bin."""
+    return [(i / bins, (i + 1) / bins) for i in range(bins)]
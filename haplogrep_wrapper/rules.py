@@ -0,0 +1,308 @@
+"""
+Rules Module
+
+This module applies a tree's alignment rules (``rules.csv``) to sample
+profiles in Python, the way haplogrep3 does before classification, and
+optionally masks the tree's hotspots. Whole cohorts are normalized in bulk,
+so profiles can be cached, deduplicated or scored in the tree's notation
+without starting haplogrep3.
+
+Each rule maps a set of polymorphisms in an alternative alignment (the
+``error`` column, e.g. ``956d``) to the notation used by the tree (the
+``expected`` column, e.g. ``960d``). A rule applies when a profile contains
+all of its error polymorphisms; they are then replaced by the expected ones.
+Rules are tried in file order and each rule is applied at most once, so a
+rule can complete a later one. A later line with the same error
+polymorphisms replaces an earlier one (phylotree-fu-rcrs@1.2 remaps
+``5894.1C`` to ``5899.XC`` this way).
+
+These semantics follow haplogrep3 but have not yet been confirmed against
+its output: ``tests/test_rules.py`` compares them with a haplogrep3
+extended report and is skipped until one is available.
+"""
+
+import csv
+import heapq
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import yaml
+
+from .phylotree import tree_directory
+from .profiles import _POLY_PATTERN, canonical_poly, read_reference
+
+
+def _sort_key(poly: str) -> Tuple[int, int, str]:
+    match = _POLY_PATTERN.match(poly)
+    if match is None:
+        return (1 << 30, 0, poly)
+    insert = match.group(2)
+    return (int(match.group(1)), 0 if insert is None else 1, poly)
+
+
+@dataclass(frozen=True)
+class AlignmentRule:
+    """
+    One line of ``rules.csv``.
+
+    Attributes:
+        error: Polymorphisms of the alternative alignment (canonical)
+        expected: Polymorphisms in the tree's notation (canonical)
+    """
+    error: Tuple[str, ...]
+    expected: Tuple[str, ...]
+
+
+def read_rules(rules_file: Union[str, Path], reference: Optional[str] = None) -> List[AlignmentRule]:
+    """
+    Read the alignment rules of a tree package.
+
+    Both columns hold space-separated polymorphisms; stray spaces around
+    them are ignored, as are fields after the ``expected`` column. When
+    several lines have the same error polymorphisms, the last one wins but
+    keeps the position of the first.
+
+    Args:
+        rules_file: Path to ``rules.csv``
+        reference: Reference sequence, for bare-position transitions
+
+    Returns:
+        Rules in file order
+
+    Raises:
+        FileNotFoundError: If the rules file does not exist
+    """
+    rules_path = Path(rules_file)
+    if not rules_path.exists():
+        raise FileNotFoundError(f"Rules file not found: {rules_path}")
+
+    rules: Dict[Tuple[str, ...], AlignmentRule] = {}
+    with open(rules_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 2 or not row[0].strip():
+                continue
+            error = tuple(canonical_poly(p, reference) for p in row[0].split())
+            expected = tuple(canonical_poly(p, reference) for p in row[1].split())
+            rules[error] = AlignmentRule(error=error, expected=expected)
+    return list(rules.values())
+
+
+class AlignmentRules:
+    """
+    Compiled alignment rules and hotspots of a tree package.
+
+    Rules are indexed by each of their error polymorphisms, so a profile is
+    only checked against the rules that share a polymorphism with it.
+    Canonical notation is computed once per distinct input token and cached,
+    which makes bulk normalization of cohorts cheap: cohorts share most of
+    their polymorphisms.
+
+    Args:
+        rules: Alignment rules in the order they are applied
+        reference: Reference sequence, for bare-position transitions
+        hotspots: Polymorphisms removed when masking hotspots
+
+    Example:
+        >>> rules = AlignmentRules.from_directory("haplogrep/trees/phylotree-fu-rcrs/1.2")
+        >>> rules.normalize(["73G", "956d", "523DEL", "524DEL"])
+        ['73G', '523d', '524d', '960d']
+        >>> rules.normalize(["73G", "956d", "523DEL", "524DEL"], mask_hotspots=True)
+        ['73G', '960d']
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[AlignmentRule],
+        reference: Optional[str] = None,
+        hotspots: Iterable[str] = ()
+    ):
+        self.rules = list(rules)
+        self.reference = reference
+        self.hotspots: Set[str] = {canonical_poly(p, reference) for p in hotspots}
+
+        self._triggers: Dict[str, List[int]] = {}
+        for index, rule in enumerate(self.rules):
+            for poly in set(rule.error):
+                self._triggers.setdefault(poly, []).append(index)
+        self._trigger_set = frozenset(self._triggers)
+
+        # Canonical notation per input token, sort key per canonical token
+        self._tokens: Dict[str, str] = {}
+        self._order: Dict[str, Tuple[int, int, str]] = {
+            poly: _sort_key(poly) for rule in self.rules for poly in rule.expected
+        }
+
+    @classmethod
+    def from_directory(cls, directory: Union[str, Path]) -> "AlignmentRules":
+        """
+        Compile the rules and hotspots listed in a tree package's ``tree.yaml``.
+
+        Raises:
+            FileNotFoundError: If the tree package files do not exist
+        """
+        directory = Path(directory)
+        config_file = directory / "tree.yaml"
+        if not config_file.exists():
+            raise FileNotFoundError(f"Tree configuration not found: {config_file}")
+
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+
+        fasta = directory / config.get("fasta", "rcrs.fasta")
+        reference = read_reference(fasta) if fasta.exists() else None
+        rules_name = config.get("alignmentRules")
+        rules = read_rules(directory / rules_name, reference) if rules_name else []
+        return cls(rules, reference=reference, hotspots=[str(h) for h in config.get("hotspots") or []])
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def canonical(self, poly: str) -> str:
+        """Get the canonical notation of a polymorphism, cached per token."""
+        token = self._tokens.get(poly)
+        if token is None:
+            token = self._tokens[poly] = canonical_poly(poly, self.reference)
+            self._order[token] = _sort_key(token)
+        return token
+
+    def apply(self, polys: Iterable[str]) -> Tuple[List[str], List[int]]:
+        """
+        Apply the rules to one profile.
+
+        Args:
+            polys: Polymorphisms of the profile
+
+        Returns:
+            (polys, applied): normalized polymorphisms sorted by position and
+            the indices of the rules that were applied
+        """
+        canonical = self.canonical
+        profile = {canonical(p) for p in polys}
+        profile.discard("")
+
+        pending = sorted({i for p in profile & self._trigger_set for i in self._triggers[p]})
+        applied = []
+        while pending:
+            index = heapq.heappop(pending)
+            rule = self.rules[index]
+            if not all(p in profile for p in rule.error):
+                continue
+            profile.difference_update(rule.error)
+            profile.update(rule.expected)
+            applied.append(index)
+
+            # Expected polymorphisms can complete rules further down the file
+            for poly in rule.expected:
+                for later in self._triggers.get(poly, ()):
+                    if later > index and later not in pending:
+                        heapq.heappush(pending, later)
+
+        return sorted(profile, key=self._order.__getitem__), applied
+
+    def normalize(self, polys: Iterable[str], mask_hotspots: bool = False) -> List[str]:
+        """
+        Normalize one profile.
+
+        Args:
+            polys: Polymorphisms of the profile
+            mask_hotspots: Also remove the tree's hotspots
+
+        Returns:
+            Normalized polymorphisms, sorted by position
+        """
+        normalized, _ = self.apply(polys)
+        if mask_hotspots:
+            normalized = [p for p in normalized if p not in self.hotspots]
+        return normalized
+
+    def normalize_many(
+        self,
+        profiles: Iterable[Iterable[str]],
+        mask_hotspots: bool = False
+    ) -> List[List[str]]:
+        """
+        Normalize a cohort of profiles.
+
+        Identical profiles are normalized once.
+
+        Args:
+            profiles: Polymorphisms of every sample
+            mask_hotspots: Also remove the tree's hotspots
+
+        Returns:
+            Normalized polymorphisms per sample, in input order
+        """
+        seen: Dict[Tuple[str, ...], List[str]] = {}
+        results = []
+        for polys in profiles:
+            key = tuple(polys)
+            normalized = seen.get(key)
+            if normalized is None:
+                normalized = seen[key] = self.normalize(key, mask_hotspots)
+            results.append(list(normalized))
+        return results
+
+    def normalize_hsd(
+        self,
+        input_file: Union[str, Path],
+        output_file: Union[str, Path],
+        mask_hotspots: bool = False
+    ) -> int:
+        """
+        Write a normalized copy of an HSD file.
+
+        Sample IDs and ranges are kept; the polymorphism columns are replaced
+        by the normalized profile.
+
+        Args:
+            input_file: HSD file (ID, range, haplogroup, polymorphisms)
+            output_file: Path of the normalized HSD file
+            mask_hotspots: Also remove the tree's hotspots
+
+        Returns:
+            Number of profiles written
+
+        Raises:
+            FileNotFoundError: If the input file does not exist
+        """
+        input_path = Path(input_file)
+        if not input_path.exists():
+            raise FileNotFoundError(f"Input file not found: {input_path}")
+
+        with open(input_path, 'r', encoding='utf-8') as f:
+            rows = [line.rstrip("\r\n").split("\t") for line in f if line.strip()]
+        profiles = self.normalize_many(
+            ([p for p in row[3:] if p.strip()] for row in rows), mask_hotspots
+        )
+
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for row, polys in zip(rows, profiles):
+                fields = (row + ["", "", ""])[:3]
+                f.write("\t".join(fields + polys) + "\n")
+        return len(rows)
+
+
+@lru_cache(maxsize=None)
+def _load_rules_cached(directory: str) -> AlignmentRules:
+    return AlignmentRules.from_directory(directory)
+
+
+def load_alignment_rules(tree: str, trees_dir: Union[str, Path]) -> AlignmentRules:
+    """
+    Load the compiled alignment rules of a tree, reusing earlier loads.
+
+    Args:
+        tree: Tree name, e.g. ``phylotree-fu-rcrs@1.2``
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Returns:
+        AlignmentRules for the requested tree
+    """
+    directory = tree_directory(tree, trees_dir).resolve()
+    return _load_rules_cached(str(directory))
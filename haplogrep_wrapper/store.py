@@ -0,0 +1,359 @@
+"""
+Results Store Module
+
+This module keeps classification results in a Parquet dataset partitioned by
+tree and macro-haplogroup, so cohort questions can be answered without
+re-reading every results file.
+
+Requires the optional ``pyarrow`` dependency.
+"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+from .phylotree import PhyloTree, load_tree
+from .results import ResultRecord, iter_results
+from .wrapper import Haplogrep3Result
+
+
+# Partition value for haplogroups that are not part of the tree
+UNASSIGNED = "unassigned"
+
+# Name prefix of the markers written by ResultStore.compact()
+_COMPACT_PREFIX = "_compact-"
+
+
+def _schema():
+    return pa.schema([
+        ("sample_id", pa.string()),
+        ("haplogroup", pa.string()),
+        ("node", pa.string()),
+        ("rank", pa.int16()),
+        ("quality", pa.float64()),
+        ("range", pa.string()),
+        ("source", pa.string()),
+    ])
+
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([("tree", pa.string()), ("macro", pa.string())]),
+        flavor="hive"
+    )
+
+
+class ResultStore:
+    """
+    Partitioned Parquet store for Haplogrep3 results.
+
+    Rows are written below ``<root>/tree=<tree>/macro=<macro>/`` so that
+    queries restricted to a tree or clade only touch the matching
+    partitions. Every ingest appends new files; ``compact()`` merges them
+    into one sorted file per partition.
+
+    Args:
+        root: Directory of the dataset (created if missing)
+        trees_dir: The ``trees`` directory next to the haplogrep3 executable
+
+    Example:
+        >>> store = ResultStore("results/store", "haplogrep/trees")
+        >>> store.ingest(wrapper.classify_batch(vcf_files, "results"))
+        >>> table = store.query(tree="phylotree-fu-rcrs@1.2", clade="L3e", min_quality=0.9)
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+
+    def __init__(self, root: Union[str, Path], trees_dir: Union[str, Path]):
+        if pa is None:
+            raise ImportError("ResultStore requires pyarrow (pip install pyarrow)")
+
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.trees_dir = Path(trees_dir)
+
+    def _tree(self, tree: str) -> PhyloTree:
+        return load_tree(tree, self.trees_dir)
+
+    def _partition_dir(self, tree: str, macro: str) -> Path:
+        return self.root / f"tree={tree}" / f"macro={macro}"
+
+    def _write(self, table, path: Path):
+        """Write a table next to its final location and move it into place."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def ingest_records(self, records: Iterable[ResultRecord], tree: str, source: str = "") -> int:
+        """
+        Append result rows classified with a given tree.
+
+        Args:
+            records: Result rows, e.g. from ``iter_results()``
+            tree: Tree used for the classification
+            source: Origin of the rows, stored alongside them
+
+        Returns:
+            Number of rows written
+        """
+        return self._append(((record, source) for record in records), tree)
+
+    def _append(self, rows: Iterable[Tuple[ResultRecord, str]], tree: str) -> int:
+        """Buffer (record, source) pairs per partition and write one file each."""
+        phylotree = self._tree(tree)
+        partitions = {}
+
+        for record, source in rows:
+            node = phylotree.resolve(record.haplogroup)
+            macro = phylotree.macro_haplogroup(node) if node else UNASSIGNED
+            columns = partitions.get(macro)
+            if columns is None:
+                columns = partitions[macro] = {name: [] for name in _schema().names}
+            columns["sample_id"].append(record.sample_id)
+            columns["haplogroup"].append(record.haplogroup)
+            columns["node"].append(node)
+            columns["rank"].append(record.rank)
+            columns["quality"].append(record.quality)
+            columns["range"].append(record.range)
+            columns["source"].append(source)
+
+        written = 0
+        for macro, columns in partitions.items():
+            table = pa.Table.from_pydict(columns, schema=_schema())
+            path = self._partition_dir(tree, macro) / f"part-{uuid.uuid4().hex}.parquet"
+            self._write(table, path)
+            written += table.num_rows
+
+        return written
+
+    def ingest(
+        self,
+        results: Union[Haplogrep3Result, Iterable[Haplogrep3Result]],
+        tree: Optional[str] = None
+    ) -> int:
+        """
+        Append the output of one or more classification runs.
+
+        Failed runs are skipped. All rows of one call are buffered and
+        written as a single file per partition, so ingesting a whole batch at
+        once avoids creating many small files.
+
+        Args:
+            results: Haplogrep3Result or list of results from ``classify_batch()``
+            tree: Tree used for the runs (defaults to ``result.tree``)
+
+        Returns:
+            Number of rows written
+
+        Raises:
+            ValueError: If the tree of a result is unknown
+        """
+        if isinstance(results, Haplogrep3Result):
+            results = [results]
+
+        by_tree = {}
+        for result in results:
+            if not result.success:
+                continue
+            result_tree = tree or result.tree
+            if not result_tree:
+                raise ValueError(f"Tree is unknown for result: {result.output_file}")
+            by_tree.setdefault(result_tree, []).append(result.output_file)
+
+        written = 0
+        for result_tree, output_files in by_tree.items():
+            rows = (
+                (record, output_file)
+                for output_file in output_files
+                for record in iter_results(output_file)
+            )
+            written += self._append(rows, result_tree)
+        return written
+
+    def compact(self, tree: Optional[str] = None) -> int:
+        """
+        Merge the files of each partition into one file sorted by haplogroup.
+
+        The merged file is written under a hidden name, and a marker listing
+        the files it replaces is written next to it, before it is renamed
+        into place. From that rename on, readers skip the listed files, so a
+        crash before they are deleted never exposes rows twice; the next
+        ``compact()`` finishes the cleanup. Only one ``compact()`` may run on
+        a store at a time.
+
+        Args:
+            tree: Only compact partitions of this tree
+
+        Returns:
+            Number of partitions that were rewritten
+        """
+        pattern = f"tree={tree}/macro=*" if tree else "tree=*/macro=*"
+        compacted = 0
+
+        for partition in sorted(self.root.glob(pattern)):
+            self._finish_compactions(partition)
+            files = sorted(partition.glob("part-*.parquet"))
+            if len(files) < 2:
+                continue
+            table = pa.concat_tables(
+                [pq.read_table(f, schema=_schema()) for f in files]
+            ).sort_by([("node", "ascending"), ("quality", "descending")])
+
+            name = uuid.uuid4().hex
+            path = partition / f"part-{name}.parquet"
+            tmp_path = partition / f".part-{name}.parquet.tmp"
+            marker = partition / f"{_COMPACT_PREFIX}{name}.json"
+            pq.write_table(table, tmp_path)
+            self._write_marker(marker, path, files)
+            os.replace(tmp_path, path)
+            self._finish_compactions(partition)
+            compacted += 1
+
+        return compacted
+
+    @staticmethod
+    def _write_marker(marker: Path, output: Path, inputs: Sequence[Path]):
+        tmp_marker = marker.with_name(f".{marker.name}.tmp")
+        with open(tmp_marker, 'w', encoding='utf-8') as f:
+            json.dump({"output": output.name, "inputs": [p.name for p in inputs]}, f)
+        os.replace(tmp_marker, marker)
+
+    @staticmethod
+    def _read_markers(partition: Path) -> List[Tuple[Path, dict]]:
+        markers = []
+        for marker in sorted(partition.glob(f"{_COMPACT_PREFIX}*.json")):
+            try:
+                with open(marker, 'r', encoding='utf-8') as f:
+                    markers.append((marker, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return markers
+
+    def _finish_compactions(self, partition: Path):
+        """Delete the files replaced by earlier compactions, or undo unfinished ones."""
+        for marker, info in self._read_markers(partition):
+            output = partition / info["output"]
+            if output.exists():
+                leftovers = [partition / name for name in info["inputs"]]
+            else:
+                # Crashed before the rename: the original files are still valid
+                leftovers = [output.with_name(f".{output.name}.tmp")]
+            for path in leftovers + [marker]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _files(self) -> List[str]:
+        """Data files of the store, without those replaced by a compaction."""
+        files = []
+        for partition in sorted(self.root.glob("tree=*/macro=*")):
+            superseded = set()
+            for _, info in self._read_markers(partition):
+                if (partition / info["output"]).exists():
+                    superseded.update(info["inputs"])
+            files.extend(
+                str(path) for path in sorted(partition.glob("*.parquet"))
+                if not path.name.startswith((".", "_")) and path.name not in superseded
+            )
+        return files
+
+    def dataset(self):
+        """Get the underlying ``pyarrow.dataset.Dataset``."""
+        return ds.dataset(
+            self._files(),
+            schema=_schema().append(pa.field("tree", pa.string())).append(pa.field("macro", pa.string())),
+            format="parquet",
+            partitioning=_partitioning(),
+            partition_base_dir=str(self.root),
+            exclude_invalid_files=False
+        )
+
+    def query(
+        self,
+        tree: Optional[str] = None,
+        clade: Optional[str] = None,
+        min_quality: Optional[float] = None,
+        sample_ids: Optional[Sequence[str]] = None,
+        best_hit_only: bool = True,
+        columns: Optional[List[str]] = None
+    ):
+        """
+        Select stored results.
+
+        Filters are pushed down to the Parquet scan: the tree and clade prune
+        whole partitions, and the remaining predicates use row group
+        statistics.
+
+        Args:
+            tree: Only results classified with this tree
+            clade: Only samples in this haplogroup or below it (requires tree)
+            min_quality: Only results with a quality above this value
+            sample_ids: Only these samples
+            best_hit_only: Only rank 1 hits
+            columns: Columns to return (default: all)
+
+        Returns:
+            ``pyarrow.Table`` with the matching rows
+
+        Example:
+            >>> store.query(tree="phylotree-fu-rcrs@1.2", clade="L3e", min_quality=0.9)
+        """
+        expression = None
+
+        def conjoin(condition):
+            nonlocal expression
+            expression = condition if expression is None else expression & condition
+
+        if tree is not None:
+            conjoin(ds.field("tree") == tree)
+
+        if clade is not None:
+            if tree is None:
+                raise ValueError("Querying by clade requires a tree")
+            phylotree = self._tree(tree)
+            nodes = phylotree.descendants(clade)
+            macros = {phylotree.macro_haplogroup(node) for node in nodes}
+            conjoin(ds.field("macro").isin(sorted(macros)))
+            conjoin(ds.field("node").isin(sorted(nodes)))
+
+        if min_quality is not None:
+            conjoin(ds.field("quality") > min_quality)
+
+        if sample_ids is not None:
+            conjoin(ds.field("sample_id").isin(list(sample_ids)))
+
+        if best_hit_only:
+            conjoin(ds.field("rank") == 1)
+
+        return self.dataset().to_table(columns=columns, filter=expression)
+
+    def count(self, **filters) -> int:
+        """Count the stored results matching the filters of ``query()``."""
+        return self.query(columns=["sample_id"], **filters).num_rows
+
+    def haplogroup_counts(self, **filters):
+        """
+        Count matching samples per haplogroup.
+
+        Returns:
+            ``pyarrow.Table`` with ``node`` and ``count`` columns
+        """
+        table = self.query(columns=["node"], **filters)
+        counts = pc.value_counts(table["node"])
+        return pa.table({
+            "node": counts.field("values"),
+            "count": counts.field("counts")
+        })
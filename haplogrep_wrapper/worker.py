@@ -0,0 +1,271 @@
+"""
+Queue Worker Module
+
+This module runs classification jobs from a journal on shared storage. Any
+number of workers, on any number of nodes, can pull from the same journal;
+throughput is scaled by starting more workers.
+
+Usage:
+    python -m haplogrep_wrapper.worker enqueue --journal /shared/queue.db \\
+        --output-dir /shared/results /shared/VCFs/*.vcf
+    python -m haplogrep_wrapper.worker run --journal /shared/queue.db \\
+        --haplogrep haplogrep/haplogrep3
+    python -m haplogrep_wrapper.worker status --journal /shared/queue.db
+"""
+
+import argparse
+import json
+import logging
+import shutil
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .journal import BatchJournal, JobState, JournalJob, worker_id
+from .wrapper import ClassificationMetric, Haplogrep3Result, Haplogrep3Wrapper, enqueue_jobs
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueWorker:
+    """
+    Worker that claims jobs from a shared journal using leases.
+
+    Every claimed job holds a lease that a background thread renews while
+    haplogrep3 runs. If a worker dies, its lease expires and another worker
+    takes the job over; a worker that loses its lease kills its haplogrep3
+    run. Results are staged next to the output directory and moved into
+    place only when complete and only by the worker holding the job.
+
+    Args:
+        wrapper: Wrapper used to run haplogrep3
+        journal: Journal shared by all workers
+        lease: Seconds a claim stays valid without a heartbeat
+        heartbeat_interval: Seconds between lease renewals (default: lease / 3)
+        poll_interval: Seconds to wait before polling an empty queue again
+        worker: Worker identifier (default: ``<hostname>:<pid>``)
+
+    Example:
+        >>> worker = QueueWorker(wrapper, BatchJournal("/shared/queue.db"))
+        >>> worker.run()
+    """
+
+    def __init__(
+        self,
+        wrapper: Haplogrep3Wrapper,
+        journal: BatchJournal,
+        lease: float = 300.0,
+        heartbeat_interval: Optional[float] = None,
+        poll_interval: float = 5.0,
+        worker: Optional[str] = None
+    ):
+        if lease <= 0:
+            raise ValueError("lease must be positive")
+
+        self.wrapper = wrapper
+        self.journal = journal
+        self.lease = lease
+        self.heartbeat_interval = heartbeat_interval or lease / 3
+        self.poll_interval = poll_interval
+        self.worker = worker or worker_id()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ask the worker to exit after the current job."""
+        self._stop.set()
+
+    def _heartbeat(self, job: JournalJob, done: threading.Event, lost: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            if not self.journal.heartbeat(job, self.lease):
+                logger.warning("Lost lease on job %s (%s), cancelling run", job.id, job.input_file)
+                lost.set()
+                return
+
+    def process(self, job: JournalJob) -> Haplogrep3Result:
+        """
+        Run one claimed job while renewing its lease.
+
+        If the lease is lost (another worker took the job over), the running
+        haplogrep3 process is killed and its output is discarded.
+
+        Args:
+            job: Job claimed from the journal
+
+        Returns:
+            Haplogrep3Result of the run
+        """
+        done = threading.Event()
+        lost = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done, lost), daemon=True)
+        heartbeat.start()
+
+        staging_dir = Path(job.output_file).parent / _staging_name(self.worker, job.id)
+        try:
+            return self.wrapper.run_job(self.journal, job, staging_dir=staging_dir, cancel=lost)
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def clean_staging(self) -> int:
+        """
+        Remove staging directories left behind by workers that died.
+
+        A staging directory is kept only while the worker that created it
+        still holds the lease on its job.
+
+        Returns:
+            Number of staging directories removed
+        """
+        now = time.time()
+        held = {
+            _staging_name(job.worker, job.id)
+            for job in self.journal.jobs(JobState.RUNNING)
+            if job.worker and (job.lease_expires is None or job.lease_expires > now)
+        }
+        output_dirs = {Path(job.output_file).parent for job in self.journal.jobs()}
+
+        removed = 0
+        for output_dir in output_dirs:
+            if not output_dir.is_dir():
+                continue
+            for staging_dir in output_dir.glob(".staging-*"):
+                if staging_dir.is_dir() and staging_dir.name not in held:
+                    logger.info("Removing stale staging directory %s", staging_dir)
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def run(self, max_jobs: Optional[int] = None, wait: bool = False) -> int:
+        """
+        Process jobs until the queue is drained or the worker is stopped.
+
+        Staging directories of dead workers are removed first.
+
+        Args:
+            max_jobs: Stop after this many jobs
+            wait: Keep polling an empty queue instead of exiting
+
+        Returns:
+            Number of jobs processed
+        """
+        self.clean_staging()
+        processed = 0
+
+        while not self._stop.is_set():
+            if max_jobs is not None and processed >= max_jobs:
+                break
+
+            job = self.journal.claim(self.worker, lease=self.lease)
+            if job is None:
+                if not wait:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+
+            logger.info("Worker %s running job %s (%s)", self.worker, job.id, job.input_file)
+            result = self.process(job)
+            if not result.success:
+                logger.error("Job %s failed: %s", job.id, result.stderr)
+            processed += 1
+
+        return processed
+
+
+def _staging_name(worker: str, job_id: int) -> str:
+    return f".staging-{worker.replace(':', '-')}-{job_id}"
+
+
+def _build_wrapper(args) -> Haplogrep3Wrapper:
+    return Haplogrep3Wrapper(
+        haplogrep_path=args.haplogrep,
+        use_jar=args.use_jar,
+        timeout=args.timeout,
+        stall_timeout=args.stall_timeout,
+        retries=args.retries,
+        retry_backoff=args.retry_backoff
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="haplogrep-worker",
+        description="Run Haplogrep3 classification jobs from a shared journal."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub, needs_wrapper=True):
+        sub.add_argument("--journal", required=True, help="Path to the shared journal database")
+        if needs_wrapper:
+            sub.add_argument("--haplogrep", required=True, help="Path to the haplogrep3 executable or JAR")
+            sub.add_argument("--use-jar", action="store_true", help="Run haplogrep3 with java -jar")
+
+    enqueue = subparsers.add_parser("enqueue", help="Add input files to the queue")
+    add_common(enqueue, needs_wrapper=False)
+    enqueue.add_argument("--tree", default="phylotree-fu-rcrs@1.2", help="Classification tree")
+    enqueue.add_argument("--output-dir", required=True, help="Directory for the results files")
+    enqueue.add_argument("--metric", choices=[m.value for m in ClassificationMetric])
+    enqueue.add_argument("--extend-report", action="store_true")
+    enqueue.add_argument("--hits", type=int)
+    enqueue.add_argument("--het-level", type=float)
+    enqueue.add_argument("input_files", nargs="+", help="Input VCF files")
+
+    run = subparsers.add_parser("run", help="Process jobs from the queue")
+    add_common(run)
+    run.add_argument("--lease", type=float, default=300.0, help="Lease duration in seconds")
+    run.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between polls of an empty queue")
+    run.add_argument("--max-jobs", type=int, help="Exit after this many jobs")
+    run.add_argument("--wait", action="store_true", help="Keep waiting for new jobs when the queue is empty")
+    run.add_argument("--timeout", type=float, help="Kill a haplogrep3 run after this many seconds")
+    run.add_argument("--stall-timeout", type=float, help="Kill a haplogrep3 run that prints nothing for this many seconds")
+    run.add_argument("--retries", type=int, default=0, help="Retries after a timeout, stall or signal")
+    run.add_argument("--retry-backoff", type=float, default=1.0, help="Seconds before the first retry (doubles)")
+
+    status = subparsers.add_parser("status", help="Show job counts per state")
+    add_common(status, needs_wrapper=False)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    journal = BatchJournal(args.journal)
+
+    if args.command == "status":
+        print(json.dumps(journal.summary(), indent=2))
+        return 0
+
+    if args.command == "enqueue":
+        options = {}
+        if args.metric:
+            options["metric"] = ClassificationMetric(args.metric)
+        if args.extend_report:
+            options["extend_report"] = True
+        if args.hits is not None:
+            options["hits"] = args.hits
+        if args.het_level is not None:
+            options["het_level"] = args.het_level
+        jobs = enqueue_jobs(args.input_files, args.output_dir, journal, args.tree, **options)
+        print(f"Enqueued {len(jobs)} jobs")
+        return 0
+
+    wrapper = _build_wrapper(args)
+
+    worker = QueueWorker(
+        wrapper,
+        journal,
+        lease=args.lease,
+        poll_interval=args.poll_interval
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+
+    started = time.time()
+    processed = worker.run(max_jobs=args.max_jobs, wait=args.wait)
+    logger.info("Worker %s processed %d jobs in %.1fs", worker.worker, processed, time.time() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
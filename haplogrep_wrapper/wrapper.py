@@ -7,10 +7,35 @@ This module provides a Python wrapper for the Haplogrep3 CLI tool.
 import subprocess
 import json
 import os
+import queue
+import re
+import shutil
+import signal
+import statistics
+import sys
+import threading
+import time
 from pathlib import Path
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from .annotation import FeatureIndex, load_annotation
+from .journal import BatchJournal, JobState, JournalJob
+from .metrics import (
+    JobMetrics,
+    MetricsHook,
+    PhaseTiming,
+    count_input_samples,
+    count_output_samples,
+    notify_hooks,
+    process_tree_cpu,
+)
+from .phylotree import PhyloTree, load_tree
+from .profiles import load_expected_profiles
+from .qc import ContaminationResult, ContaminationScreen
+from .rules import AlignmentRules, load_alignment_rules
+from .results import is_complete_results_file
 
 
 class ClassificationMetric(Enum):
@@ -32,12 +57,233 @@ class Haplogrep3Result:
         stdout: Standard output from the haplogrep3 command
         stderr: Standard error from the haplogrep3 command
         return_code: Return code from the command execution
+        tree: Classification tree used for the run
+        input_file: Path to the input file
+        metrics: Timing and resource measurements of the run
+        attempts: Number of times haplogrep3 was started for this result
+        retry_reasons: Why each earlier attempt was retried ("timeout",
+            "stalled" or "signal <n>")
+        timed_out: The final attempt was killed for exceeding the timeout
+        stalled: The final attempt was killed for producing no output
+        hedged: A duplicate run was started for this straggling job
+        hedge_won: The result comes from the duplicate run
     """
     output_file: str
     success: bool
     stdout: str
     stderr: str
     return_code: int
+    tree: Optional[str] = None
+    input_file: Optional[str] = None
+    metrics: Optional[JobMetrics] = None
+    attempts: int = 1
+    retry_reasons: List[str] = field(default_factory=list)
+    timed_out: bool = False
+    stalled: bool = False
+    hedged: bool = False
+    hedge_won: bool = False
+
+
+@dataclass
+class _ProcessRun:
+    """Captured output and timing of one haplogrep3 process."""
+    stdout: str
+    stderr: str
+    return_code: int
+    spawned_at: float
+    exited_at: float
+    spawn_cpu: float
+    # (perf_counter time, phase) at which each run phase started
+    phase_starts: List[Tuple[float, str]] = field(default_factory=list)
+    # Child CPU seconds sampled at the start of each run phase
+    phase_cpu: List[Optional[float]] = field(default_factory=list)
+    rusage: Optional[object] = None
+    # Why the watchdog killed the process: "timeout", "stalled" or "cancelled"
+    killed: Optional[str] = None
+
+
+# Shells report a child killed by signal n as exit code 128 + n
+_SHELL_SIGNAL_BASE = 128
+_MAX_SIGNAL = 64
+
+
+def _signal_group(proc: subprocess.Popen, sig: int):
+    """Send a signal to the process group of a child started in its own session."""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _run_process(
+    cmd: List[str],
+    markers: List[Tuple["re.Pattern", str]],
+    timeout: Optional[float] = None,
+    stall_timeout: Optional[float] = None,
+    kill_grace: float = 5.0,
+    cancel: Optional[threading.Event] = None
+) -> _ProcessRun:
+    """
+    Run a command, recording when it first prints and when markers match.
+
+    stdout and stderr are drained by reader threads so their lines can be
+    timestamped as they arrive. On POSIX the child is reaped with wait4() to
+    obtain its resource usage.
+
+    The child runs in its own process group. A watchdog thread terminates the
+    whole group (SIGTERM, then SIGKILL after ``kill_grace`` seconds) when the
+    run exceeds ``timeout``, prints nothing for ``stall_timeout`` seconds or
+    ``cancel`` is set.
+    """
+    cpu_before = time.thread_time()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=os.name == "posix"
+    )
+    spawned_at = time.perf_counter()
+    spawn_cpu = time.thread_time() - cpu_before
+
+    phase_starts = [(started, "spawn"), (spawned_at, "startup")]
+    phase_cpu = [None, 0.0]
+    lock = threading.Lock()
+    streams = {"stdout": [], "stderr": []}
+    last_output = [spawned_at]
+    killed = []
+    exited = threading.Event()
+
+    def read(name, pipe):
+        for line in pipe:
+            now = time.perf_counter()
+            streams[name].append(line)
+            with lock:
+                last_output[0] = now
+                phase = None
+                if phase_starts[-1][1] == "startup":
+                    phase = "run"
+                for pattern, marker_phase in markers:
+                    if pattern.search(line):
+                        phase = marker_phase
+                if phase is not None and phase != phase_starts[-1][1]:
+                    phase_starts.append((now, phase))
+                    phase_cpu.append(process_tree_cpu(proc.pid))
+        pipe.close()
+
+    def watch():
+        limits = [limit for limit in (timeout, stall_timeout) if limit]
+        tick = min([0.1] + [limit / 10 for limit in limits])
+        while not exited.wait(tick):
+            now = time.perf_counter()
+            with lock:
+                silent = now - last_output[0]
+            if cancel is not None and cancel.is_set():
+                reason = "cancelled"
+            elif timeout and now - spawned_at > timeout:
+                reason = "timeout"
+            elif stall_timeout and silent > stall_timeout:
+                reason = "stalled"
+            else:
+                continue
+            killed.append(reason)
+            _signal_group(proc, signal.SIGTERM)
+            if not exited.wait(kill_grace):
+                _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+            return
+
+    readers = [
+        threading.Thread(target=read, args=("stdout", proc.stdout), daemon=True),
+        threading.Thread(target=read, args=("stderr", proc.stderr), daemon=True),
+    ]
+    watchdog = None
+    if timeout or stall_timeout or cancel is not None:
+        watchdog = threading.Thread(target=watch, daemon=True)
+        watchdog.start()
+
+    try:
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+
+        rusage = None
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else (
+                -(status & 0x7F) if status & 0x7F else status >> 8
+            )
+        else:
+            proc.wait()
+        exited_at = time.perf_counter()
+    except BaseException:
+        # Do not leave an orphaned haplogrep3 behind (e.g. on KeyboardInterrupt)
+        _signal_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        raise
+    finally:
+        exited.set()
+        if watchdog is not None:
+            watchdog.join()
+
+    return _ProcessRun(
+        stdout="".join(streams["stdout"]),
+        stderr="".join(streams["stderr"]),
+        return_code=proc.returncode,
+        spawned_at=spawned_at,
+        exited_at=exited_at,
+        spawn_cpu=spawn_cpu,
+        phase_starts=phase_starts,
+        phase_cpu=phase_cpu,
+        rusage=rusage,
+        killed=killed[0] if killed else None
+    )
+
+
+def enqueue_jobs(
+    input_files: List[Union[str, Path]],
+    output_dir: Union[str, Path],
+    journal: Union[BatchJournal, str, Path],
+    tree: str,
+    **kwargs
+) -> List[JournalJob]:
+    """
+    Register classification jobs in a journal.
+
+    Unlike ``Haplogrep3Wrapper.enqueue()``, this needs no haplogrep3
+    installation, so jobs can be added from any node.
+
+    Args:
+        input_files: List of input VCF file paths
+        output_dir: Directory to store output files
+        journal: BatchJournal or path to a journal database
+        tree: Classification tree
+        **kwargs: Additional arguments passed to classify()
+
+    Returns:
+        List of the journaled jobs
+    """
+    if not isinstance(journal, BatchJournal):
+        journal = BatchJournal(journal)
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    params = dict(kwargs)
+    params["tree"] = tree
+    if params.get("metric") is not None:
+        params["metric"] = params["metric"].value
+
+    jobs = []
+    for input_file in input_files:
+        input_path = Path(input_file)
+        output_file = output_path / f"{input_path.stem}_haplogroups.txt"
+        jobs.append(journal.add(input_path, output_file, params))
+
+    return jobs
 
 
 class Haplogrep3Wrapper:
@@ -66,7 +312,16 @@ class Haplogrep3Wrapper:
         self,
         haplogrep_path: str,
         default_tree: str = "phylotree-fu-rcrs@1.2",
-        use_jar: bool = False
+        use_jar: bool = False,
+        hooks: Optional[List[MetricsHook]] = None,
+        collect_metrics: bool = True,
+        phase_markers: Optional[List[Tuple[str, str]]] = None,
+        timeout: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        retries: int = 0,
+        retry_backoff: float = 1.0,
+        retry_backoff_max: float = 60.0,
+        kill_grace: float = 5.0
     ):
         """
         Initialize the Haplogrep3 wrapper.
@@ -75,9 +330,26 @@ class Haplogrep3Wrapper:
             haplogrep_path: Path to the haplogrep3 executable or JAR file
             default_tree: Default classification tree to use
             use_jar: If True, treats haplogrep_path as JAR file and uses java -jar
+            hooks: Metrics hooks notified after every run and batch
+            collect_metrics: Attach JobMetrics to every Haplogrep3Result
+            phase_markers: (regex, phase) pairs; when a line of haplogrep3
+                output matches, a new phase with that name starts. None are
+                set by default, so tree loading and scoring are both timed
+                as the ``run`` phase; splitting them is opt-in because the
+                log lines differ between haplogrep3 versions
+            timeout: Seconds after which a run is killed
+            stall_timeout: Seconds without any haplogrep3 output after which
+                a run is killed
+            retries: How often a run that timed out, stalled or was killed by
+                a signal is started again
+            retry_backoff: Seconds before the first retry; doubles with every
+                further retry
+            retry_backoff_max: Upper bound of the delay between retries
+            kill_grace: Seconds between SIGTERM and SIGKILL when a run is killed
 
         Raises:
             FileNotFoundError: If haplogrep3 executable/JAR is not found
+            ValueError: If timeouts or retry settings are invalid
         """
         self.haplogrep_path = Path(haplogrep_path)
 
@@ -88,6 +360,21 @@ class Haplogrep3Wrapper:
 
         self.default_tree = default_tree
         self.use_jar = use_jar
+        self.hooks = list(hooks or [])
+        self.collect_metrics = collect_metrics
+        self.phase_markers = [(re.compile(pattern), phase) for pattern, phase in (phase_markers or [])]
+
+        if (timeout is not None and timeout <= 0) or (stall_timeout is not None and stall_timeout <= 0):
+            raise ValueError("timeout and stall_timeout must be positive")
+        if retries < 0 or retry_backoff < 0:
+            raise ValueError("retries and retry_backoff must not be negative")
+
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.kill_grace = kill_grace
 
     def get_available_trees(self) -> List[str]:
         """
@@ -155,8 +442,44 @@ class Haplogrep3Wrapper:
         Raises:
             FileNotFoundError: If input file does not exist
         """
+        result = self._classify(
+            input_file,
+            output_file,
+            tree=tree,
+            metric=metric,
+            extend_report=extend_report,
+            chip=chip,
+            skip_alignment_rules=skip_alignment_rules,
+            hits=hits,
+            write_fasta=write_fasta,
+            write_fasta_msa=write_fasta_msa,
+            het_level=het_level
+        )
+
+        notify_hooks(self.hooks, "on_result", result)
+
+        return result
+
+    def _classify(
+        self,
+        input_file: Union[str, Path],
+        output_file: Union[str, Path],
+        tree: Optional[str] = None,
+        metric: Optional[ClassificationMetric] = None,
+        extend_report: bool = False,
+        chip: Optional[str] = None,
+        skip_alignment_rules: bool = False,
+        hits: Optional[int] = None,
+        write_fasta: bool = False,
+        write_fasta_msa: bool = False,
+        het_level: Optional[float] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Haplogrep3Result:
+        """Build the haplogrep3 command and run it, retrying as configured."""
+        started = time.perf_counter()
         input_path = Path(input_file)
         output_path = Path(output_file)
+        tree = tree or self.default_tree
 
         if not input_path.exists():
             raise FileNotFoundError(f"Input file not found: {input_path}")
@@ -169,7 +492,7 @@ class Haplogrep3Wrapper:
                 "classify",
                 "--in", str(input_path),
                 "--out", str(output_path),
-                "--tree", tree or self.default_tree
+                "--tree", tree
             ]
         else:
             # Use executable directly
@@ -178,7 +501,7 @@ class Haplogrep3Wrapper:
                 "classify",
                 "--in", str(input_path),
                 "--out", str(output_path),
-                "--tree", tree or self.default_tree
+                "--tree", tree
             ]
 
         # Add optional parameters
@@ -208,81 +531,648 @@ class Haplogrep3Wrapper:
 
         # Execute command
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=False  # Don't raise exception, handle manually
-            )
-
-            # Haplogrep3 outputs errors to stdout, not stderr
-            # Check for error indicators in stdout
-            success = result.returncode == 0
-            error_message = result.stderr
-
-            # If command failed but stderr is empty, check stdout for errors
-            if not success and not error_message and result.stdout:
-                # Extract error message from stdout
-                for line in result.stdout.split('\n'):
-                    if 'Error:' in line or 'error:' in line:
-                        error_message = line.strip()
-                        break
-                # If no specific error line found, use the whole stdout
-                if not error_message:
-                    error_message = result.stdout
-
-            return Haplogrep3Result(
-                output_file=str(output_path),
-                success=success,
-                stdout=result.stdout,
-                stderr=error_message,
-                return_code=result.returncode
-            )
-
+            return self._execute_with_retries(cmd, input_path, output_path, tree, started, cancel)
         except Exception as e:
             return Haplogrep3Result(
                 output_file=str(output_path),
                 success=False,
                 stdout="",
                 stderr=str(e),
-                return_code=-1
+                return_code=-1,
+                tree=tree,
+                input_file=str(input_path)
             )
 
+    @staticmethod
+    def _retry_reason(result: Haplogrep3Result) -> Optional[str]:
+        """Why a failed run is worth retrying, or None if it is not."""
+        if result.timed_out:
+            return "timeout"
+        if result.stalled:
+            return "stalled"
+        if result.return_code < 0:
+            # Killed by a signal, e.g. by the OOM killer
+            return f"signal {-result.return_code}"
+        if _SHELL_SIGNAL_BASE < result.return_code <= _SHELL_SIGNAL_BASE + _MAX_SIGNAL:
+            # The haplogrep3 launcher is a shell script, which reports a JVM
+            # killed by signal n as exit code 128 + n (137 for SIGKILL)
+            return f"signal {result.return_code - _SHELL_SIGNAL_BASE}"
+        return None
+
+    def _execute_with_retries(
+        self,
+        cmd: List[str],
+        input_path: Path,
+        output_path: Path,
+        tree: str,
+        started: float,
+        cancel: Optional[threading.Event] = None
+    ) -> Haplogrep3Result:
+        """
+        Run a command, retrying runs that timed out, stalled or were killed.
+
+        Runs that exit with an error code are not retried: haplogrep3 reports
+        problems with the input that way, and those fail again.
+        """
+        retry_reasons = []
+        attempt = 1
+
+        while True:
+            result = self._execute(cmd, input_path, output_path, tree, started, cancel)
+            cancelled = cancel is not None and cancel.is_set()
+            reason = None if result.success or cancelled else self._retry_reason(result)
+            if reason is None or attempt > self.retries:
+                break
+
+            retry_reasons.append(reason)
+            delay = min(self.retry_backoff * 2 ** (attempt - 1), self.retry_backoff_max)
+            if cancel is not None:
+                if cancel.wait(delay):
+                    break
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+        result.attempts = attempt
+        result.retry_reasons = retry_reasons
+        return result
+
+    def _execute(
+        self,
+        cmd: List[str],
+        input_path: Path,
+        output_path: Path,
+        tree: str,
+        started: float,
+        cancel: Optional[threading.Event] = None
+    ) -> Haplogrep3Result:
+        """Run a haplogrep3 command once and build its result and metrics."""
+        metrics = None
+        if self.collect_metrics:
+            input_cpu = time.thread_time()
+            metrics = JobMetrics(
+                input_size=input_path.stat().st_size,
+                # Reading the input is only worth it when someone listens
+                input_samples=count_input_samples(input_path) if self.hooks else None
+            )
+            metrics.phases["input"] = PhaseTiming(
+                wall=time.perf_counter() - started,
+                cpu=time.thread_time() - input_cpu
+            )
+
+        run = _run_process(
+            cmd,
+            self.phase_markers,
+            timeout=self.timeout,
+            stall_timeout=self.stall_timeout,
+            kill_grace=self.kill_grace,
+            cancel=cancel
+        )
+
+        # Haplogrep3 outputs errors to stdout, not stderr
+        # Check for error indicators in stdout
+        success = run.return_code == 0 and run.killed is None
+        error_message = run.stderr
+
+        # If command failed but stderr is empty, check stdout for errors
+        if not success and not error_message and run.stdout:
+            # Extract error message from stdout
+            for line in run.stdout.split('\n'):
+                if 'Error:' in line or 'error:' in line:
+                    error_message = line.strip()
+                    break
+            # If no specific error line found, use the whole stdout
+            if not error_message:
+                error_message = run.stdout
+
+        if run.killed == "timeout":
+            error_message = f"haplogrep3 timed out after {self.timeout}s"
+        elif run.killed == "stalled":
+            error_message = f"haplogrep3 produced no output for {self.stall_timeout}s"
+        elif run.killed == "cancelled":
+            error_message = "haplogrep3 run was cancelled"
+
+        if metrics is not None:
+            self._record_run(metrics, run)
+            output_started = time.perf_counter()
+            output_cpu = time.thread_time()
+            if success and output_path.exists():
+                metrics.output_samples = count_output_samples(output_path)
+            metrics.phases["output"] = PhaseTiming(
+                wall=time.perf_counter() - output_started,
+                cpu=time.thread_time() - output_cpu
+            )
+            metrics.wall_time = time.perf_counter() - started
+
+        return Haplogrep3Result(
+            output_file=str(output_path),
+            success=success,
+            stdout=run.stdout,
+            stderr=error_message,
+            return_code=run.return_code,
+            tree=tree,
+            input_file=str(input_path),
+            metrics=metrics,
+            timed_out=run.killed == "timeout",
+            stalled=run.killed == "stalled"
+        )
+
+    @staticmethod
+    def _record_run(metrics: JobMetrics, run: _ProcessRun):
+        """Convert the timestamps of a process run into phase timings."""
+        child_cpu = None
+        if run.rusage is not None:
+            metrics.child_user_cpu = run.rusage.ru_utime
+            metrics.child_system_cpu = run.rusage.ru_stime
+            metrics.child_peak_rss_kb = run.rusage.ru_maxrss
+            if sys.platform == "darwin":
+                # macOS reports ru_maxrss in bytes, Linux in kilobytes
+                metrics.child_peak_rss_kb //= 1024
+            child_cpu = run.rusage.ru_utime + run.rusage.ru_stime
+
+        ends = [start for start, _ in run.phase_starts[1:]] + [run.exited_at]
+        cpu_marks = run.phase_cpu[1:] + [child_cpu]
+        for i, ((start, phase), end) in enumerate(zip(run.phase_starts, ends)):
+            if phase == "spawn":
+                cpu = run.spawn_cpu
+            else:
+                begin_cpu, end_cpu = run.phase_cpu[i], cpu_marks[i]
+                cpu = end_cpu - begin_cpu if begin_cpu is not None and end_cpu is not None else None
+            timing = metrics.phases.get(phase)
+            if timing is None:
+                metrics.phases[phase] = PhaseTiming(wall=end - start, cpu=cpu)
+            else:
+                timing.wall += end - start
+                timing.cpu = None if timing.cpu is None or cpu is None else timing.cpu + cpu
+
     def classify_batch(
         self,
         input_files: List[Union[str, Path]],
         output_dir: Union[str, Path],
+        journal: Optional[Union[BatchJournal, str, Path]] = None,
+        max_workers: int = 1,
+        hedge_after: Optional[float] = None,
         **kwargs
     ) -> List[Haplogrep3Result]:
         """
         Classify multiple VCF files in batch.
 
+        With a journal, every job is recorded before it runs and files whose
+        output is already complete and unchanged are skipped, so an
+        interrupted batch can simply be started again. Jobs that failed in an
+        earlier run are retried. Several processes, also on different nodes,
+        may call this with the same journal to share the work; jobs are
+        claimed with a lease (see ``run_journal()``), so the jobs of a process
+        that died are taken over by the others.
+
+        With ``hedge_after``, once every job has been started, a duplicate
+        run is started on a free worker for each job that has been running
+        longer than ``hedge_after`` times the median duration of the finished
+        jobs. Whichever run succeeds first is kept and the other is killed.
+
         Args:
             input_files: List of input VCF file paths
             output_dir: Directory to store output files
+            journal: BatchJournal or path to a journal database
+            max_workers: Number of haplogrep3 processes run in parallel
+            hedge_after: Straggler threshold as a multiple of the median job
+                duration; None disables hedging
             **kwargs: Additional arguments passed to classify()
 
         Returns:
             List of Haplogrep3Result objects for each file
+
+        Raises:
+            ValueError: If max_workers or hedge_after is invalid, hedging is
+                requested with a single worker, or either is combined with a
+                journal
         """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if hedge_after is not None and hedge_after <= 0:
+            raise ValueError("hedge_after must be positive")
+        if hedge_after is not None and max_workers < 2:
+            raise ValueError("hedge_after needs max_workers of at least 2 to run duplicates")
+        if journal is not None and (max_workers > 1 or hedge_after is not None):
+            raise ValueError(
+                "max_workers and hedge_after cannot be used with a journal; "
+                "run several workers on the journal instead"
+            )
+
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
 
-        results = []
+        if journal is not None:
+            results = self._classify_batch_journaled(input_files, output_path, journal, kwargs)
+        elif max_workers > 1:
+            tasks = [
+                (Path(input_file), output_path / f"{Path(input_file).stem}_haplogroups.txt")
+                for input_file in input_files
+            ]
+            results = self._classify_batch_parallel(tasks, max_workers, hedge_after, kwargs)
+        else:
+            results = []
 
-        for input_file in input_files:
-            input_path = Path(input_file)
-            output_file = output_path / f"{input_path.stem}_haplogroups.txt"
+            for input_file in input_files:
+                input_path = Path(input_file)
+                output_file = output_path / f"{input_path.stem}_haplogroups.txt"
 
-            result = self.classify(
-                input_file=input_path,
-                output_file=output_file,
-                **kwargs
-            )
+                result = self.classify(
+                    input_file=input_path,
+                    output_file=output_file,
+                    **kwargs
+                )
+                results.append(result)
+
+        notify_hooks(self.hooks, "on_batch", results)
+
+        return results
+
+    def _classify_batch_parallel(
+        self,
+        tasks: List[Tuple[Path, Path]],
+        max_workers: int,
+        hedge_after: Optional[float],
+        kwargs: dict
+    ) -> List[Haplogrep3Result]:
+        """
+        Run (input, output) tasks on up to max_workers threads, hedging stragglers.
+
+        A hedged duplicate writes to a hidden file next to the output. Once
+        both runs of a job have ended, the hidden file replaces the output if
+        the duplicate won and is removed otherwise.
+        """
+        for input_path, _ in tasks:
+            if not input_path.exists():
+                raise FileNotFoundError(f"Input file not found: {input_path}")
+
+        pending = list(reversed(range(len(tasks))))
+        attempts = {}       # task index -> {output path: cancel event}
+        started_at = {}     # task index -> start of the first run
+        hedged = set()
+        winners = {}        # task index -> (result, won by the duplicate)
+        finished = {}
+        durations = []
+        done = queue.Queue()
+        free = max_workers
+
+        def attempt(index: int, output_file: Path, cancel: threading.Event):
+            try:
+                result = self._classify(tasks[index][0], output_file, cancel=cancel, **kwargs)
+            except Exception as e:
+                result = Haplogrep3Result(
+                    output_file=str(output_file),
+                    success=False,
+                    stdout="",
+                    stderr=str(e),
+                    return_code=-1,
+                    input_file=str(tasks[index][0])
+                )
+            done.put((index, output_file, result))
+
+        def start(index: int, output_file: Path):
+            cancel = threading.Event()
+            attempts.setdefault(index, {})[output_file] = cancel
+            started_at.setdefault(index, time.perf_counter())
+            threading.Thread(target=attempt, args=(index, output_file, cancel), daemon=True).start()
+
+        def finalize(index: int):
+            result, hedge_won = winners.pop(index)
+            output_file = tasks[index][1]
+            hedge_file = Path(result.output_file) if hedge_won else output_file.parent / f".hedge-{output_file.name}"
+            if hedge_won and result.success:
+                os.replace(hedge_file, output_file)
+            elif hedge_file.exists():
+                hedge_file.unlink()
+            result.output_file = str(output_file)
+            result.hedged = index in hedged
+            result.hedge_won = hedge_won
+            if result.success:
+                durations.append(time.perf_counter() - started_at[index])
+            finished[index] = result
+            notify_hooks(self.hooks, "on_result", result)
+
+        while len(finished) < len(tasks):
+            while free and pending:
+                index = pending.pop()
+                start(index, tasks[index][1])
+                free -= 1
+
+            wait = None
+            if hedge_after is not None and not pending and durations:
+                threshold = hedge_after * statistics.median(durations)
+                now = time.perf_counter()
+                stragglers = sorted(
+                    (started_at[index], index) for index in attempts
+                    if index not in hedged and index not in winners
+                )
+                for first_started, index in stragglers:
+                    if not free:
+                        break
+                    if now - first_started > threshold:
+                        output_file = tasks[index][1]
+                        start(index, output_file.parent / f".hedge-{output_file.name}")
+                        hedged.add(index)
+                        free -= 1
+                if any(index not in hedged for _, index in stragglers):
+                    # Look again once the next straggler may cross the threshold
+                    wait = min(max(threshold / 10, 0.05), 1.0)
+
+            try:
+                index, output_file, result = done.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+            free += 1
+            del attempts[index][output_file]
+            remaining = attempts[index]
+
+            if index not in winners and (result.success or not remaining):
+                winners[index] = (result, output_file != tasks[index][1])
+                for cancel in remaining.values():
+                    cancel.set()
+
+            if not remaining:
+                del attempts[index]
+                finalize(index)
+
+        return [finished[i] for i in range(len(tasks))]
+
+    def _classify_batch_journaled(
+        self,
+        input_files: List[Union[str, Path]],
+        output_path: Path,
+        journal: Union[BatchJournal, str, Path],
+        kwargs: dict
+    ) -> List[Haplogrep3Result]:
+        """Register the batch in a journal, run pending jobs and collect results."""
+        if not isinstance(journal, BatchJournal):
+            journal = BatchJournal(journal)
+
+        journal.recover()
+        jobs = self.enqueue(input_files, output_path, journal, **kwargs)
+        completed = {result.output_file: result for result in self.run_journal(journal)}
+
+        results = []
+        for job in jobs:
+            result = completed.get(job.output_file)
+            if result is None:
+                # Completed earlier or by another worker
+                job = journal.get(job.output_file)
+                success = job.state == JobState.DONE
+                error = job.error or ("" if success else f"Job is {job.state.value}")
+                result = Haplogrep3Result(
+                    output_file=job.output_file,
+                    success=success,
+                    stdout="",
+                    stderr=error,
+                    return_code=job.return_code if job.return_code is not None else -1,
+                    tree=job.params.get("tree"),
+                    input_file=job.input_file
+                )
             results.append(result)
 
         return results
 
+    def enqueue(
+        self,
+        input_files: List[Union[str, Path]],
+        output_dir: Union[str, Path],
+        journal: Union[BatchJournal, str, Path],
+        **kwargs
+    ) -> List[JournalJob]:
+        """
+        Register classification jobs in a journal without running them.
+
+        Output files are named like in classify_batch(). The jobs can then be
+        run by ``run_journal()`` or by queue workers on other nodes.
+
+        Args:
+            input_files: List of input VCF file paths
+            output_dir: Directory to store output files
+            journal: BatchJournal or path to a journal database
+            **kwargs: Additional arguments passed to classify()
+
+        Returns:
+            List of the journaled jobs
+        """
+        kwargs = dict(kwargs)
+        tree = kwargs.pop("tree", None) or self.default_tree
+        return enqueue_jobs(input_files, output_dir, journal, tree, **kwargs)
+
+    def run_journal(
+        self,
+        journal: BatchJournal,
+        worker: Optional[str] = None,
+        lease: float = 300.0
+    ) -> List[Haplogrep3Result]:
+        """
+        Run PENDING jobs from a journal until none are left.
+
+        Each job runs with the parameters recorded in the journal. A job only
+        counts as DONE if haplogrep3 succeeded and wrote a complete results
+        file; its output checksum is then recorded for later verification.
+        Jobs are claimed with a lease that is renewed while haplogrep3 runs,
+        as in ``QueueWorker``, so jobs left RUNNING by a process on another
+        node that died are taken over once their lease expires.
+
+        Args:
+            journal: Journal to pull jobs from
+            worker: Identifier recorded for claimed jobs
+            lease: Seconds a claim stays valid without a heartbeat
+
+        Returns:
+            List of Haplogrep3Result objects for the jobs run by this call
+        """
+        # Imported here because the worker module builds on this one
+        from .worker import QueueWorker
+
+        runner = QueueWorker(self, journal, lease=lease, worker=worker)
+        results = []
+
+        while True:
+            job = journal.claim(runner.worker, lease=lease)
+            if job is None:
+                break
+            results.append(runner.process(job))
+
+        return results
+
+    def run_job(
+        self,
+        journal: BatchJournal,
+        job: JournalJob,
+        staging_dir: Optional[Path] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Haplogrep3Result:
+        """
+        Run one claimed journal job and record its outcome.
+
+        With a staging directory (on the same filesystem as the output), the
+        job writes there and its files are moved into place only once the
+        results file is complete and only if the job is still held by this
+        worker, so readers never see partial output and a job that was taken
+        over is never published twice.
+
+        Args:
+            journal: Journal the job was claimed from
+            job: Claimed job
+            staging_dir: Directory for the output until it is complete
+            cancel: When set (e.g. because the job's lease was lost),
+                haplogrep3 is killed and nothing is recorded
+
+        Returns:
+            Haplogrep3Result of the run
+        """
+        params = dict(job.params)
+        if params.get("metric") is not None:
+            params["metric"] = ClassificationMetric(params["metric"])
+
+        final_path = Path(job.output_file)
+        run_path = final_path
+        if staging_dir is not None:
+            staging_dir.mkdir(parents=True, exist_ok=True)
+            run_path = staging_dir / final_path.name
+
+        try:
+            result = self._classify(
+                input_file=job.input_file,
+                output_file=run_path,
+                cancel=cancel,
+                **params
+            )
+        except Exception as e:
+            result = Haplogrep3Result(
+                output_file=str(run_path),
+                success=False,
+                stdout="",
+                stderr=str(e),
+                return_code=-1,
+                tree=params.get("tree"),
+                input_file=job.input_file
+            )
+
+        if result.success and not is_complete_results_file(run_path):
+            result.success = False
+            result.stderr = result.stderr or f"Incomplete output file: {run_path}"
+
+        lost = f"Job {job.id} is no longer held by worker {job.worker}"
+        if cancel is not None and cancel.is_set():
+            result.success = False
+            result.stderr = lost
+        elif result.success:
+            moves = []
+            if staging_dir is not None:
+                # Extra outputs (e.g. FASTA) are named after the results file,
+                # which is moved last
+                moves = [
+                    (staged, final_path.parent / staged.name)
+                    for staged in sorted(staging_dir.iterdir(), key=lambda p: p == run_path)
+                ]
+            if not journal.complete(job, result.return_code, moves=moves):
+                result.success = False
+                result.stderr = lost
+        else:
+            error = result.stderr or f"haplogrep3 exited with return code {result.return_code}"
+            if not journal.fail(job, error, result.return_code):
+                result.stderr = f"{error} ({lost})"
+
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            result.output_file = str(final_path)
+
+        notify_hooks(self.hooks, "on_result", result)
+
+        return result
+
+    def load_tree(self, tree: Optional[str] = None) -> PhyloTree:
+        """
+        Load a classification tree from the ``trees`` directory next to the
+        haplogrep3 executable.
+
+        Trees are cached, so repeated calls are cheap.
+
+        Args:
+            tree: Tree to load (defaults to default_tree)
+
+        Returns:
+            PhyloTree for the requested tree
+
+        Raises:
+            FileNotFoundError: If the tree package is not installed
+        """
+        return load_tree(tree or self.default_tree, self.haplogrep_path.parent / "trees")
+
+    def load_annotation(self, tree: Optional[str] = None) -> FeatureIndex:
+        """
+        Load the gene annotation (``mtdna.gff``) of a tree package.
+
+        Indexes are cached per tree, so repeated calls are cheap.
+
+        Args:
+            tree: Tree whose annotation to load (defaults to default_tree)
+
+        Returns:
+            FeatureIndex for mapping positions to genes and codons
+
+        Raises:
+            FileNotFoundError: If the tree package or its GFF file is missing
+        """
+        return load_annotation(tree or self.default_tree, self.haplogrep_path.parent / "trees")
+
+    def load_alignment_rules(self, tree: Optional[str] = None) -> AlignmentRules:
+        """
+        Load the alignment rules (``rules.csv``) and hotspots of a tree package.
+
+        Compiled rules are cached per tree, so repeated calls are cheap.
+
+        Args:
+            tree: Tree whose rules to load (defaults to default_tree)
+
+        Returns:
+            AlignmentRules for normalizing profiles to the tree's notation
+
+        Raises:
+            FileNotFoundError: If the tree package is not installed
+        """
+        return load_alignment_rules(tree or self.default_tree, self.haplogrep_path.parent / "trees")
+
+    def screen_contamination(
+        self,
+        input_file: Union[str, Path],
+        tree: Optional[str] = None,
+        het_level: Optional[float] = None,
+        **kwargs
+    ) -> List[ContaminationResult]:
+        """
+        Screen all samples of a VCF file for contamination.
+
+        The screen runs in Python on the tree package files; haplogrep3
+        itself is not started. Expected profiles are cached per tree.
+
+        Args:
+            input_file: Multi-sample VCF with ``AF``, ``AD`` or ``GT`` calls
+            tree: Tree to score against (defaults to default_tree)
+            het_level: Heteroplasmy level threshold (default: 0.9)
+            **kwargs: Further ContaminationScreen options, e.g.
+                ``min_heteroplasmies`` or ``min_distance``
+
+        Returns:
+            ContaminationResult per sample
+
+        Raises:
+            FileNotFoundError: If the VCF file or the tree package is missing
+        """
+        tree = tree or self.default_tree
+        trees_dir = self.haplogrep_path.parent / "trees"
+        screen = ContaminationScreen(
+            load_expected_profiles(tree, trees_dir),
+            tree=load_tree(tree, trees_dir),
+            het_level=0.9 if het_level is None else het_level,
+            **kwargs
+        )
+        return screen.screen_file(input_file)
+
     def read_results(self, output_file: Union[str, Path]) -> str:
         """
         Read and return the contents of a results file.
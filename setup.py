@@ -17,10 +17,19 @@ setup(
     long_description_content_type="text/markdown",
     author="DNABR_AFR Project",
     python_requires=">=3.7",
-    packages=find_packages(exclude=["examples", "docs", "tests"]),
+    packages=find_packages(exclude=["examples", "docs", "tests", "benchmarks"]),
     install_requires=[
-        # No external dependencies - uses only standard library
+        "PyYAML>=5.1",  # Tree package configuration (tree.yaml)
+        "numpy>=1.17",  # Vectorized annotation and profile computations
     ],
+    entry_points={
+        "console_scripts": [
+            "haplogrep-worker=haplogrep_wrapper.worker:main",
+        ],
+    },
+    extras_require={
+        "store": ["pyarrow>=10.0"],  # Parquet results store
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Science/Research",
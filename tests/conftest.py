@@ -0,0 +1,31 @@
+"""Shared fixtures for the haplogrep_wrapper tests."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FAKE_HAPLOGREP3 = REPO_ROOT / "benchmarks" / "fake_haplogrep3.py"
+EXAMPLE_VCF = REPO_ROOT / "haplogrep" / "data" / "examples" / "example-wgs.vcf"
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture
+def fake_haplogrep3() -> Path:
+    """Stand-in haplogrep3 launcher from the benchmark suite."""
+    return FAKE_HAPLOGREP3
+
+
+@pytest.fixture
+def vcf_files(tmp_path):
+    """Factory for single-sample VCFs taken from the bundled example."""
+    from benchmarks import datasets
+
+    def make(count: int):
+        return datasets.split_vcf(tmp_path / "inputs", count)
+
+    return make
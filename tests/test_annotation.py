@@ -0,0 +1,57 @@
+"""Tests for the GFF interval index."""
+
+import pytest
+
+from haplogrep_wrapper import load_annotation
+
+from .conftest import REPO_ROOT
+
+
+@pytest.fixture(scope="module")
+def index():
+    return load_annotation("phylotree-fu-rcrs@1.2", REPO_ROOT / "haplogrep" / "trees")
+
+
+def _codons(index, position):
+    """Map one position to {gene: (codon, codon_position)}."""
+    _, features, codon, within = index.codons([position])
+    return {index.names[f]: (int(c), int(w)) for f, c, w in zip(features, codon, within)}
+
+
+def test_d_loop_crosses_the_origin(index):
+    names = index.gene_names([16024, 16519, 16569, 1, 73, 576, 577, 16023, 16570])
+
+    assert list(names[:6]) == ["D-loop"] * 6
+    assert names[6] != "D-loop" and names[7] != "D-loop"
+    # Positions past the end wrap around
+    assert names[8] == "D-loop"
+    assert _codons(index, 16569) == {}
+
+
+def test_overlapping_reading_frames_are_both_found(index):
+    # ATP8 (8366-8572) and ATP6 (8527-9207) share 46 positions;
+    # the first ATP6 codon is the 54th of ATP8
+    assert _codons(index, 8527) == {"ATP8": (54, 3), "ATP6": (1, 1)}
+    assert _codons(index, 8572) == {"ATP8": (69, 3), "ATP6": (16, 1)}
+    assert _codons(index, 8573) == {"ATP6": (16, 2)}
+
+    rows = index.annotate(["8527G"])
+    assert (rows[0]["gene"], rows[0]["codon"], rows[0]["codon_position"]) == ("ATP8", 54, 3)
+
+
+def test_minus_strand_codons_count_from_the_feature_end(index):
+    # ND6 runs from 14673 down to 14149
+    assert _codons(index, 14673) == {"ND6": (1, 1)}
+    assert _codons(index, 14671) == {"ND6": (1, 3)}
+    # m.14484T>C is the M64V LHON mutation
+    assert _codons(index, 14484) == {"ND6": (64, 1)}
+    assert _codons(index, 14149) == {"ND6": (175, 3)}
+
+
+def test_cox1_codon_numbering(index):
+    assert _codons(index, 5904) == {"COX1": (1, 1)}
+    assert _codons(index, 5906) == {"COX1": (1, 3)}
+    assert _codons(index, 5907) == {"COX1": (2, 1)}
+    # m.7028C>T is the synonymous COX1 A375A
+    assert _codons(index, 7028) == {"COX1": (375, 3)}
+    assert _codons(index, 7445) == {"COX1": (514, 3)}
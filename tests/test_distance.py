@@ -0,0 +1,63 @@
+"""Tests for the blocked distance matrices."""
+
+import numpy as np
+import pytest
+
+from haplogrep_wrapper import ClassificationMetric, PackedProfiles, ProfileDistance
+from haplogrep_wrapper import distance as distance_module
+
+
+def _brute_force(profiles, metric):
+    sets = [set(p) for p in profiles]
+    n = len(sets)
+    result = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            a, b, s = len(sets[i]), len(sets[j]), len(sets[i] & sets[j])
+            if metric == ClassificationMetric.HAMMING:
+                result[i, j] = a + b - 2 * s
+            elif metric == ClassificationMetric.JACCARD:
+                result[i, j] = 1 - s / (a + b - s) if a + b - s else 0.0
+            elif a == 0 and b == 0:
+                result[i, j] = 0.0
+            elif a == 0 or b == 0:
+                result[i, j] = 1.0
+            else:
+                result[i, j] = 1 - (s / a + s / b) / 2
+    return result
+
+
+@pytest.fixture
+def profiles():
+    rng = np.random.default_rng(7)
+    polys = [f"{position}G" for position in range(100, 300)]
+    return [list(rng.choice(polys, size=rng.integers(0, 12), replace=False)) for _ in range(90)]
+
+
+@pytest.mark.parametrize("metric", [
+    ClassificationMetric.HAMMING, ClassificationMetric.JACCARD, ClassificationMetric.KULCZYNSKI
+])
+def test_blocked_matrix_matches_brute_force(profiles, metric, monkeypatch):
+    monkeypatch.setattr(distance_module, "_BLOCK_CELLS", 1 << 10)
+    distances = ProfileDistance(PackedProfiles(profiles), metric)
+
+    assert distances._block_size() < len(profiles)
+    np.testing.assert_allclose(distances.matrix(), _brute_force(profiles, metric), atol=1e-6)
+
+
+def test_block_size_is_bounded_for_small_vocabularies():
+    distances = ProfileDistance(PackedProfiles([["73G"], ["73G", "263G"]]))
+
+    assert distances._block_size() ** 2 <= distance_module._BLOCK_CELLS
+
+
+@pytest.mark.parametrize("metric", [ClassificationMetric.JACCARD, ClassificationMetric.KULCZYNSKI])
+def test_empty_profile_is_maximally_distant(metric):
+    distances = ProfileDistance(PackedProfiles([[], ["73G", "263G"], []]), metric)
+
+    np.testing.assert_array_equal(distances.matrix(), [[0, 1, 0], [1, 0, 1], [0, 1, 0]])
+
+
+def test_blocked_distances_is_abstract():
+    with pytest.raises(TypeError):
+        distance_module._BlockedDistances()
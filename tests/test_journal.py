@@ -0,0 +1,108 @@
+"""Tests for the batch journal."""
+
+import ctypes
+import os
+import socket
+
+import pytest
+
+from haplogrep_wrapper import journal as journal_module
+from haplogrep_wrapper.journal import BatchJournal, JobState
+
+
+class FakeKernel32:
+    """Stands in for kernel32 with a fixed set of running processes."""
+
+    def __init__(self, running, exited=()):
+        self.running = set(running)
+        self.exited = set(exited)
+        self.open_handles = set()
+        self.last_error = 0
+
+    def OpenProcess(self, access, inherit, pid):
+        if pid not in self.running and pid not in self.exited:
+            self.last_error = journal_module._ERROR_INVALID_PARAMETER
+            return 0
+        self.open_handles.add(pid)
+        return pid
+
+    def GetLastError(self):
+        return self.last_error
+
+    def GetExitCodeProcess(self, handle, exit_code):
+        ctypes.cast(exit_code, ctypes.POINTER(ctypes.c_ulong)).contents.value = (
+            journal_module._STILL_ACTIVE if handle in self.running else 0
+        )
+        return 1
+
+    def CloseHandle(self, handle):
+        self.open_handles.discard(handle)
+        return 1
+
+
+@pytest.fixture
+def windows(monkeypatch):
+    """Take the Windows code path and fail if os.kill() is called."""
+    def kill(pid, sig):
+        raise AssertionError("os.kill() terminates processes on Windows")
+
+    monkeypatch.setattr(journal_module, "_WINDOWS", True)
+    monkeypatch.setattr(journal_module.os, "kill", kill)
+
+    def install(kernel32):
+        monkeypatch.setattr(journal_module, "_kernel32", lambda: kernel32)
+        return kernel32
+
+    return install
+
+
+def _running_job(journal, tmp_path, name, pid):
+    input_file = tmp_path / f"{name}.vcf"
+    input_file.write_text("##fileformat=VCFv4.2\n", encoding="utf-8")
+    journal.add(input_file, tmp_path / f"{name}.txt", {"tree": "phylotree-fu-rcrs@1.2"})
+    return journal.claim(worker=f"{socket.gethostname()}:{pid}")
+
+
+def test_recover_on_windows_probes_without_killing(tmp_path, windows):
+    kernel32 = windows(FakeKernel32(running={101}, exited={102}))
+    journal = BatchJournal(tmp_path / "batch.journal")
+    alive = _running_job(journal, tmp_path, "alive", 101)
+    exited = _running_job(journal, tmp_path, "exited", 102)
+    missing = _running_job(journal, tmp_path, "missing", 103)
+
+    assert journal.recover() == 2
+    assert journal.get(alive.output_file).state == JobState.RUNNING
+    assert journal.get(exited.output_file).state == JobState.PENDING
+    assert journal.get(missing.output_file).state == JobState.PENDING
+    assert not kernel32.open_handles
+
+
+def test_windows_probe_keeps_jobs_it_cannot_inspect(windows):
+    kernel32 = windows(FakeKernel32(running=()))
+    kernel32.OpenProcess = lambda access, inherit, pid: 0
+    kernel32.last_error = 5  # ERROR_ACCESS_DENIED
+
+    assert journal_module._pid_alive(4242)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX signal probe")
+def test_recover_on_posix_requeues_dead_workers(tmp_path):
+    journal = BatchJournal(tmp_path / "batch.journal")
+    alive = _running_job(journal, tmp_path, "alive", os.getpid())
+    dead = _running_job(journal, tmp_path, "dead", 2 ** 22 + 1)
+
+    assert journal.recover() == 1
+    assert journal.get(alive.output_file).state == JobState.RUNNING
+    assert journal.get(dead.output_file).state == JobState.PENDING
+
+
+def test_add_requeues_failed_jobs(tmp_path):
+    journal = BatchJournal(tmp_path / "batch.journal")
+    job = _running_job(journal, tmp_path, "sample", os.getpid())
+    assert journal.fail(job, "haplogrep3 timed out", return_code=-9)
+
+    requeued = journal.add(job.input_file, job.output_file, job.params)
+
+    assert requeued.state == JobState.PENDING
+    assert requeued.error is None
+    assert journal.claim().id == job.id
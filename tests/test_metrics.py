@@ -0,0 +1,63 @@
+"""Tests for run metrics and hooks."""
+
+import logging
+
+from haplogrep_wrapper import Haplogrep3Wrapper, MetricsCollector, MetricsHook
+from haplogrep_wrapper import wrapper as wrapper_module
+
+
+class FailingHook(MetricsHook):
+    def on_result(self, result):
+        raise RuntimeError("exporter is down")
+
+    def on_batch(self, results):
+        raise RuntimeError("exporter is down")
+
+
+def test_failing_hook_does_not_fail_the_run(tmp_path, fake_haplogrep3, vcf_files, caplog):
+    collector = MetricsCollector()
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3), hooks=[FailingHook(), collector])
+
+    with caplog.at_level(logging.ERROR, logger="haplogrep_wrapper.metrics"):
+        results = wrapper.classify_batch(vcf_files(2), tmp_path / "results")
+
+    assert all(result.success for result in results)
+    assert collector.runs == {"success": 2, "failure": 0}
+    assert sum("exporter is down" in record.exc_text for record in caplog.records) == 3
+
+
+def test_input_samples_are_only_counted_for_hooks(tmp_path, fake_haplogrep3, vcf_files, monkeypatch):
+    counted = []
+    count = wrapper_module.count_input_samples
+    monkeypatch.setattr(wrapper_module, "count_input_samples", lambda path: counted.append(path) or count(path))
+    input_file = vcf_files(1)[0]
+
+    plain = Haplogrep3Wrapper(str(fake_haplogrep3))
+    assert plain.classify(input_file, tmp_path / "plain.txt").metrics.input_samples is None
+    assert not counted
+
+    hooked = Haplogrep3Wrapper(str(fake_haplogrep3), hooks=[MetricsCollector()])
+    assert hooked.classify(input_file, tmp_path / "hooked.txt").metrics.input_samples == 1
+    assert counted == [input_file]
+
+
+def test_peak_rss_is_reported_in_kilobytes_on_macos(monkeypatch):
+    class Rusage:
+        ru_utime = 1.0
+        ru_stime = 0.5
+        ru_maxrss = 512 * 1024 * 1024
+
+    run = wrapper_module._ProcessRun(
+        stdout="", stderr="", return_code=0, spawned_at=0.0, exited_at=1.0, spawn_cpu=0.0,
+        phase_starts=[(0.0, "spawn")], phase_cpu=[None], rusage=Rusage()
+    )
+
+    monkeypatch.setattr(wrapper_module.sys, "platform", "darwin")
+    metrics = wrapper_module.JobMetrics()
+    Haplogrep3Wrapper._record_run(metrics, run)
+    assert metrics.child_peak_rss_kb == 512 * 1024
+
+    monkeypatch.setattr(wrapper_module.sys, "platform", "linux")
+    metrics = wrapper_module.JobMetrics()
+    Haplogrep3Wrapper._record_run(metrics, run)
+    assert metrics.child_peak_rss_kb == 512 * 1024 * 1024
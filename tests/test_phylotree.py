@@ -0,0 +1,62 @@
+"""Tests for the tree ancestry loader."""
+
+import pytest
+
+from haplogrep_wrapper import load_tree
+
+from .conftest import REPO_ROOT
+
+
+TREES_DIR = REPO_ROOT / "haplogrep" / "trees"
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return load_tree("phylotree-fu-rcrs@1.2", TREES_DIR)
+
+
+def test_lineage_starts_at_the_root(tree):
+    lineage = tree.lineage("L3e1a2")
+
+    assert lineage[0] == tree.root
+    assert lineage[-1] == "L3e1a2"
+    assert "L3" in lineage
+
+
+@pytest.mark.parametrize("level, clade", [
+    ("haplogroup", "L3e1a2"),
+    ("macro", "L3"),
+    ("L", "L3"),
+])
+def test_rollup_levels(tree, level, clade):
+    assert tree.rollup("L3e1a2", level) == clade
+
+
+def test_out_of_africa_lineages_roll_up_to_l3(tree):
+    assert tree.rollup("H1", "macro") == "H"
+    assert tree.rollup("H1", "L") == "L3"
+
+
+def test_rollup_to_depth(tree):
+    lineage = tree.lineage("L3e1a2")
+
+    assert tree.rollup("L3e1a2", 2) == lineage[2]
+    assert tree.rollup("L3e1a2", 1000) == "L3e1a2"
+
+
+def test_reported_names_are_resolved(tree):
+    assert tree.resolve('"H1+195"') == "H1"
+    assert tree.macro_haplogroup("L3e1a2+195") == "L3"
+    assert tree.resolve("not-a-haplogroup") is None
+    with pytest.raises(KeyError):
+        tree.lineage("not-a-haplogroup")
+    with pytest.raises(ValueError):
+        tree.rollup("H1", "continent")
+
+
+def test_descendants_and_distance(tree):
+    clade = tree.descendants("L3e")
+
+    assert "L3e1a2" in clade and "L3e" in clade and "H1" not in clade
+    assert tree.distance("L3e1a2", "L3e1a2") == 0
+    assert tree.distance("L3e1a2", "L3e") == len(tree.lineage("L3e1a2")) - len(tree.lineage("L3e"))
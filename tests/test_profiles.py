@@ -0,0 +1,62 @@
+"""Tests for the polymorphism notation shared by profiles, rules and distances."""
+
+import pytest
+
+from haplogrep_wrapper import PackedProfiles, ProfileDistance, load_alignment_rules, load_expected_profiles
+from haplogrep_wrapper.profiles import canonical_poly, normalize_poly
+from haplogrep_wrapper.qc import vcf_polys
+
+from .conftest import REPO_ROOT
+
+
+TREE = "phylotree-fu-rcrs@1.2"
+TREES_DIR = REPO_ROOT / "haplogrep" / "trees"
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    return load_expected_profiles(TREE, TREES_DIR)
+
+
+@pytest.mark.parametrize("poly, canonical", [
+    ("16519", "16519C"),
+    ("523DEL", "523d"),
+    ("523D", "523d"),
+    ("73g", "73G"),
+    ("309.1CC", "309.1CC"),
+    ("573.XC", "573.XC"),
+    ("315.1C!", "315.1C"),
+])
+def test_normalize_poly_keeps_insertions_whole(profiles, poly, canonical):
+    assert normalize_poly(poly, profiles.reference) == [canonical]
+    assert canonical_poly(poly.rstrip("!"), profiles.reference) == canonical
+
+
+def test_unrecognized_polys_are_skipped(profiles):
+    assert normalize_poly("rs123", profiles.reference) == []
+    assert normalize_poly("315.1", profiles.reference) == []
+
+
+def test_profiles_rules_and_vcf_agree_on_insertions(profiles):
+    rules = load_alignment_rules(TREE, TREES_DIR)
+
+    assert "292.1AT" in profiles.profile("N22a")
+    assert "524.1ACAC" in profiles.hotspots
+    assert vcf_polys(292, "T", "TAT") == ["292.1AT"]
+    assert rules.normalize(["292.1AT"]) == ["292.1AT"]
+
+    indptr, indices, totals = profiles.encode([["292.1AT"], ["292.1A", "292.2T"]])
+    assert [profiles.polys[i] for i in indices[indptr[0]:indptr[1]]] == ["292.1AT"]
+    assert indptr[2] - indptr[1] == 0 and totals[1] == 2
+
+
+def test_distances_compare_insertions_whole(profiles):
+    packed = PackedProfiles(
+        [["16519", "309.1CC"], ["16519C", "309.1CC"], ["16519C", "309.1C", "309.2C"]],
+        reference=profiles.reference
+    )
+
+    matrix = ProfileDistance(packed).matrix()
+
+    assert matrix[0, 1] == 0
+    assert matrix[0, 2] == 3
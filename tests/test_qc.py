@@ -0,0 +1,114 @@
+"""Tests for allele fraction parsing and the contamination screen."""
+
+import re
+
+import numpy as np
+import pytest
+
+from haplogrep_wrapper import ContaminationScreen, load_expected_profiles, load_tree
+from haplogrep_wrapper.qc import AlleleFractions, read_allele_fractions, vcf_polys
+
+from .conftest import REPO_ROOT
+
+
+TREE = "phylotree-fu-rcrs@1.2"
+TREES_DIR = REPO_ROOT / "haplogrep" / "trees"
+SNP = re.compile(r"^\d+[ACGT]$")
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    return load_expected_profiles(TREE, TREES_DIR)
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return load_tree(TREE, TREES_DIR)
+
+
+def _write_vcf(path, samples, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.write("\t".join(["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples) + "\n")
+        for position, ref, alt, fmt, calls in records:
+            f.write("\t".join(["chrM", str(position), ".", ref, alt, ".", "PASS", ".", fmt] + calls) + "\n")
+    return path
+
+
+def _mixture(profiles, major, minor):
+    """Split the SNPs of two haplogroups into shared, major-only and minor-only."""
+    major_polys = {p for p in profiles.profile(major) if SNP.match(p)}
+    minor_polys = {p for p in profiles.profile(minor) if SNP.match(p)}
+    return sorted(major_polys & minor_polys), sorted(major_polys - minor_polys), sorted(minor_polys - major_polys)
+
+
+def test_vcf_polys():
+    assert vcf_polys(73, "A", "G") == ["73G"]
+    assert vcf_polys(8269, "GCCCCCTCTA", "G") == [f"{8270 + i}d" for i in range(9)]
+    assert vcf_polys(309, "C", "CCT") == ["309.1CT"]
+    assert vcf_polys(100, "CT", "TA") == ["100T", "101A"]
+    assert vcf_polys(100, "C", "<DEL>") == []
+
+
+def test_read_allele_fractions_from_af_ad_and_gt(tmp_path):
+    vcf = _write_vcf(tmp_path / "calls.vcf", ["S1", "S2"], [
+        # Multi-allelic, from AF
+        (150, "C", "T,A", "GT:AF", ["1:0.7,0.3", "2:0.05,0.95"]),
+        # Allele depths only
+        (195, "T", "C,G", "AD", ["10,30,0", "0,0,0"]),
+        # Genotypes only: haploid, diploid and missing calls
+        (263, "A", "G", "GT", ["1", "0/1"]),
+        (16519, "T", "C", "GT", [".", "1|1"]),
+    ])
+
+    data = read_allele_fractions(vcf)
+
+    assert data.samples == ["S1", "S2"]
+    assert data.polys == [["150T"], ["150A"], ["195C"], ["195G"], ["263G"], ["16519C"]]
+    expected = np.array([
+        [0.7, 0.05],
+        [0.3, 0.95],
+        [0.75, np.nan],
+        [0.0, np.nan],
+        [1.0, 0.5],
+        [np.nan, 1.0],
+    ])
+    np.testing.assert_allclose(data.fractions, expected)
+
+
+def test_two_haplogroup_mixture_is_called(tmp_path, profiles, tree):
+    shared, major_only, minor_only = _mixture(profiles, "H1", "L3e1a2")
+    reference = profiles.reference
+    records = []
+    for polys, mixed in ((shared, "1.0"), (major_only, "0.8"), (minor_only, "0.2")):
+        for poly in polys:
+            position, allele = int(poly[:-1]), poly[-1]
+            pure = "1.0" if poly in shared or poly in major_only else "0.0"
+            records.append((position, reference[position - 1], allele, "GT:AF", [f"1:{mixed}", f"1:{pure}"]))
+    records.sort()
+    vcf = _write_vcf(tmp_path / "mixture.vcf", ["MIXED", "PURE"], records)
+
+    mixed, pure = ContaminationScreen(profiles, tree).screen_file(vcf)
+
+    assert mixed.contaminated
+    assert (mixed.major_haplogroup, mixed.minor_haplogroup) == ("H1", "L3e1a2")
+    assert mixed.informative_heteroplasmies == len(major_only) + len(minor_only)
+    assert mixed.minor_level == pytest.approx(0.2)
+    assert mixed.distance == tree.distance("H1", "L3e1a2")
+
+    assert not pure.contaminated
+    assert pure.major_haplogroup == pure.minor_haplogroup == "H1"
+    assert pure.heteroplasmies == 0 and pure.minor_level is None
+
+
+def test_informative_check_looks_at_every_poly_of_an_allele(profiles, tree):
+    shared, major_only, minor_only = _mixture(profiles, "H1", "L3e1a2")
+    # Every minor allele leads with a polymorphism both haplogroups expect
+    polys = [[p] for p in shared] + [[p] for p in major_only] + [[shared[0], p] for p in minor_only]
+    fractions = np.array([[1.0]] * len(shared) + [[0.8]] * len(major_only) + [[0.2]] * len(minor_only))
+
+    result = ContaminationScreen(profiles, tree).screen(AlleleFractions(["S"], polys, fractions))[0]
+
+    assert (result.major_haplogroup, result.minor_haplogroup) == ("H1", "L3e1a2")
+    assert result.informative_heteroplasmies == len(major_only) + len(minor_only)
+    assert result.contaminated
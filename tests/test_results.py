@@ -0,0 +1,119 @@
+"""Tests for results parsing and haplogroup aggregation."""
+
+import math
+
+import pytest
+
+from haplogrep_wrapper import HaplogroupAggregator, iter_results, load_tree
+from haplogrep_wrapper.results import is_complete_results_file
+
+from .conftest import REPO_ROOT
+
+
+HEADER = '"SampleID"\t"Haplogroup"\t"Rank"\t"Quality"\t"Range"\n'
+
+
+def _results_file(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        for row in rows:
+            f.write("\t".join(f'"{v}"' for v in row) + "\n")
+    return path
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return load_tree("phylotree-fu-rcrs@1.2", REPO_ROOT / "haplogrep" / "trees")
+
+
+@pytest.fixture
+def files(tmp_path):
+    first = _results_file(tmp_path / "a.txt", [
+        ("S1", "L3e1a2", 1, 0.91, "1-16569"),
+        ("S1", "L3e1a", 2, 0.85, "1-16569"),
+        ("S2", "H1+16189", 1, 0.97, "1-16569"),
+    ])
+    second = _results_file(tmp_path / "b.txt", [
+        ("S3", "L3e2b", 1, 0.72, "1-16569"),
+        ("S4", "L2a1c", 1, 0.88, "1-16569"),
+        ("S5", "H1", 1, 0.99, "1-16569"),
+    ])
+    return first, second
+
+
+def test_iter_results_parses_rows(files):
+    records = list(iter_results(files[0]))
+
+    assert [(r.sample_id, r.haplogroup, r.rank) for r in records] == [
+        ("S1", "L3e1a2", 1), ("S1", "L3e1a", 2), ("S2", "H1+16189", 1)
+    ]
+    assert records[0].quality == pytest.approx(0.91)
+
+
+def test_merging_equals_aggregating_the_concatenated_input(files, tree):
+    first, second = HaplogroupAggregator(), HaplogroupAggregator()
+    first.add_file(files[0])
+    second.add_file(files[1])
+    together = HaplogroupAggregator()
+    together.add_files(files)
+
+    combined = first + second
+    assert combined.to_dict() == together.to_dict()
+    assert len(first) == 2 and len(combined) == 5
+
+    first += second
+    assert first.to_dict() == together.to_dict()
+    assert first.counts(tree, "macro") == {"L3": 2, "H": 2, "L2": 1}
+
+
+def test_merge_rejects_different_bins():
+    with pytest.raises(ValueError):
+        HaplogroupAggregator(bins=10).merge(HaplogroupAggregator(bins=20))
+
+
+def test_frequency_table_rolls_up(files, tree):
+    aggregator = HaplogroupAggregator(bins=10)
+    aggregator.add_files(files)
+
+    table = aggregator.frequency_table(tree, level="L")
+
+    assert [(row.clade, row.count) for row in table] == [("L3", 4), ("L2", 1)]
+    l3 = table[0]
+    assert l3.frequency == pytest.approx(0.8)
+    assert l3.min_quality == pytest.approx(0.72)
+    assert l3.max_quality == pytest.approx(0.99)
+    assert l3.mean_quality == pytest.approx((0.91 + 0.97 + 0.72 + 0.99) / 4)
+    assert sum(l3.quality_histogram) == 4
+    with pytest.raises(ValueError):
+        aggregator.frequency_table(level="macro")
+
+
+def test_save_and_load_round_trip(files, tmp_path):
+    aggregator = HaplogroupAggregator()
+    aggregator.add_files(files)
+    aggregator.add("X2")  # no quality score
+
+    aggregator.save(tmp_path / "aggregate.json")
+    loaded = HaplogroupAggregator.load(tmp_path / "aggregate.json")
+
+    assert loaded.to_dict() == aggregator.to_dict()
+    row = next(r for r in loaded.frequency_table() if r.clade == "X2")
+    assert row.count == 1 and math.isnan(row.mean_quality)
+
+
+def test_truncated_results_file_is_rejected(files, tmp_path):
+    assert is_complete_results_file(files[0])
+
+    content = files[0].read_bytes()
+    truncated = tmp_path / "truncated.txt"
+    truncated.write_bytes(content[:-10])
+    assert not is_complete_results_file(truncated)
+
+    cut_row = tmp_path / "cut_row.txt"
+    cut_row.write_bytes(content.rsplit(b"\t", 2)[0] + b"\n")
+    assert not is_complete_results_file(cut_row)
+
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert not is_complete_results_file(empty)
+    assert not is_complete_results_file(tmp_path / "missing.txt")
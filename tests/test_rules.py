@@ -0,0 +1,116 @@
+"""
+Tests for the alignment rules normalizer.
+
+``test_normalization_matches_haplogrep3`` compares the normalizer with the
+extended report of a real haplogrep3 run on the bundled evaluation data. It
+uses the golden file ``tests/data/evaluation-data.haplogrep3.txt`` when it
+is checked in; otherwise it runs haplogrep3 itself if ``haplogrep3.jar``
+(``haplogrep/haplogrep3.jar`` or the path in ``HAPLOGREP3_JAR``) and Java
+are available, and is skipped if not. To write the golden file, run the
+test once with haplogrep3 and ``HAPLOGREP3_UPDATE_GOLDEN=1``::
+
+    HAPLOGREP3_JAR=/opt/haplogrep3/haplogrep3.jar HAPLOGREP3_UPDATE_GOLDEN=1 \\
+        python -m pytest tests/test_rules.py
+
+and check in the file.
+"""
+
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from haplogrep_wrapper import AlignmentRule, AlignmentRules, iter_results, load_alignment_rules
+from haplogrep_wrapper.rules import read_rules
+
+from .conftest import REPO_ROOT
+
+
+TREE = "phylotree-fu-rcrs@1.2"
+TREES_DIR = REPO_ROOT / "haplogrep" / "trees"
+EVALUATION_HSD = REPO_ROOT / "haplogrep" / "data" / "examples" / "evaluation-data.hsd"
+GOLDEN_FILE = REPO_ROOT / "tests" / "data" / "evaluation-data.haplogrep3.txt"
+HAPLOGREP3_JAR = Path(os.environ.get("HAPLOGREP3_JAR", REPO_ROOT / "haplogrep" / "haplogrep3.jar"))
+UPDATE_GOLDEN = os.environ.get("HAPLOGREP3_UPDATE_GOLDEN") == "1"
+
+
+@pytest.fixture
+def rules() -> AlignmentRules:
+    return load_alignment_rules(TREE, TREES_DIR)
+
+
+def _haplogrep3_report(tmp_path):
+    if GOLDEN_FILE.exists() and not UPDATE_GOLDEN:
+        return GOLDEN_FILE
+    if not HAPLOGREP3_JAR.exists() or shutil.which("java") is None:
+        if UPDATE_GOLDEN:
+            pytest.fail(f"HAPLOGREP3_UPDATE_GOLDEN needs Java and haplogrep3.jar (not found: {HAPLOGREP3_JAR})")
+        pytest.skip(f"needs haplogrep3 output: check in {GOLDEN_FILE} or set HAPLOGREP3_JAR")
+    report = tmp_path / "evaluation-data.txt"
+    subprocess.run(
+        ["java", "-jar", str(HAPLOGREP3_JAR), "classify", "--in", str(EVALUATION_HSD),
+         "--out", str(report), "--tree", TREE, "--extend-report"],
+        check=True,
+        capture_output=True
+    )
+    if UPDATE_GOLDEN:
+        GOLDEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(report, GOLDEN_FILE)
+    return report
+
+
+def test_normalization_matches_haplogrep3(rules, tmp_path):
+    report = _haplogrep3_report(tmp_path)
+    expected = {
+        record.sample_id: sorted(rules.canonical(p) for p in record.extra["Input_Polys"].split())
+        for record in iter_results(report) if record.rank == 1
+    }
+
+    with open(EVALUATION_HSD, 'r', encoding='utf-8') as f:
+        rows = [line.rstrip("\r\n").split("\t") for line in f if line.strip()]
+    normalized = {row[0]: sorted(rules.normalize(p for p in row[3:] if p.strip())) for row in rows}
+
+    assert normalized.keys() == expected.keys()
+    mismatches = {sample: (normalized[sample], expected[sample])
+                  for sample in expected if normalized[sample] != expected[sample]}
+    assert not mismatches
+
+
+def test_documented_examples(rules):
+    assert rules.normalize(["73G", "956d", "523DEL", "524DEL"]) == ["73G", "523d", "524d", "960d"]
+    assert rules.normalize(["73G", "956d", "523DEL", "524DEL"], mask_hotspots=True) == ["73G", "960d"]
+
+
+def test_rules_apply_in_file_order_and_can_chain():
+    rules = AlignmentRules([
+        AlignmentRule(error=("100d",), expected=("101d",)),
+        AlignmentRule(error=("101d", "200G"), expected=("201G",)),
+        AlignmentRule(error=("201G",), expected=("100d",)),
+    ])
+
+    polys, applied = rules.apply(["200G", "100d"])
+
+    # The third rule recreates 100d, but every rule applies at most once
+    assert applied == [0, 1, 2]
+    assert polys == ["100d"]
+
+
+def test_insertions_are_matched_as_whole_tokens():
+    rules = AlignmentRules([AlignmentRule(error=("309.1C",), expected=("310.1C",))])
+
+    assert rules.normalize(["309.1CC"]) == ["309.1CC"]
+    assert rules.normalize(["309.1c"]) == ["310.1C"]
+
+
+def test_later_rule_with_the_same_error_wins(tmp_path):
+    rules_file = tmp_path / "rules.csv"
+    rules_file.write_text("error,expected\n5894.1C,5895.1C\n956d,960d\n5894.1C ,5899.XC,extra\n", encoding="utf-8")
+
+    rules = read_rules(rules_file)
+
+    assert rules == [
+        AlignmentRule(error=("5894.1C",), expected=("5899.XC",)),
+        AlignmentRule(error=("956d",), expected=("960d",)),
+    ]
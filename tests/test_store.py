@@ -0,0 +1,78 @@
+"""Tests for the Parquet results store."""
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from haplogrep_wrapper import ResultRecord, ResultStore
+from haplogrep_wrapper import store as store_module
+
+from .conftest import REPO_ROOT
+
+
+TREE = "phylotree-fu-rcrs@1.2"
+
+
+def _records(prefix: str, count: int):
+    return [
+        ResultRecord(sample_id=f"{prefix}{i}", haplogroup="L3e1a2", rank=1, quality=0.9, range="1-16569")
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(tmp_path / "store", REPO_ROOT / "haplogrep" / "trees")
+    store.ingest_records(_records("a", 3), TREE)
+    store.ingest_records(_records("b", 2), TREE)
+    return store
+
+
+def test_crash_after_compacted_file_is_visible_does_not_duplicate_rows(store, monkeypatch):
+    def crash(path, *args, **kwargs):
+        raise OSError("crashed before deleting the old files")
+
+    monkeypatch.setattr(Path, "unlink", crash)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    assert store.count(tree=TREE) == 5
+    assert store.compact() == 0
+    assert store.count(tree=TREE) == 5
+    partition = next(store.root.glob("tree=*/macro=*"))
+    assert [p.name.startswith("part-") for p in partition.iterdir()] == [True]
+
+
+def test_crash_before_compacted_file_is_renamed_keeps_the_original_files(store, monkeypatch):
+    replace = store_module.os.replace
+
+    def crash(source, destination):
+        if Path(source).name.startswith(".part-"):
+            raise OSError("crashed before renaming the compacted file")
+        replace(source, destination)
+
+    monkeypatch.setattr(store_module.os, "replace", crash)
+    with pytest.raises(OSError):
+        store.compact()
+    monkeypatch.undo()
+
+    assert store.count(tree=TREE) == 5
+    assert store.compact() == 1
+    assert store.count(tree=TREE) == 5
+    partition = next(store.root.glob("tree=*/macro=*"))
+    assert len(list(partition.iterdir())) == 1
+
+
+def test_min_quality_is_exclusive(store):
+    store.ingest_records([
+        ResultRecord(sample_id="c0", haplogroup="L3e1a2", rank=1, quality=0.95, range="1-16569"),
+        ResultRecord(sample_id="c1", haplogroup="H1", rank=1, quality=0.97, range="1-16569"),
+    ], TREE)
+
+    table = store.query(tree=TREE, clade="L3e", min_quality=0.9)
+
+    assert table.column("sample_id").to_pylist() == ["c0"]
+    assert store.count(tree=TREE, min_quality=0.89) == 7
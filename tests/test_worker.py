@@ -0,0 +1,176 @@
+"""Tests for journaled jobs and queue workers."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from haplogrep_wrapper import BatchJournal, Haplogrep3Wrapper, QueueWorker
+from haplogrep_wrapper.journal import JobState
+from haplogrep_wrapper.results import is_complete_results_file
+
+from .conftest import REPO_ROOT
+
+
+@pytest.mark.skipif(os.name != "posix", reason="counting launcher is a shell script")
+def test_workers_in_separate_processes_run_every_job_once(tmp_path, fake_haplogrep3, vcf_files):
+    log = tmp_path / "invocations.log"
+    launcher = tmp_path / "haplogrep3"
+    launcher.write_text(
+        "#!/bin/sh\n"
+        f'echo "$3" >> "{log}"\n'
+        f'exec "{sys.executable}" "{fake_haplogrep3}" "$@"\n',
+        encoding="utf-8"
+    )
+    launcher.chmod(0o755)
+
+    inputs = vcf_files(12)
+    journal_path = tmp_path / "queue.db"
+    output_dir = tmp_path / "results"
+    Haplogrep3Wrapper(str(launcher)).enqueue(inputs, output_dir, BatchJournal(journal_path))
+
+    env = dict(os.environ)
+    env["FAKE_HAPLOGREP3_STARTUP"] = "0.05"
+    env["PYTHONPATH"] = os.pathsep.join([str(REPO_ROOT), env.get("PYTHONPATH", "")])
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "haplogrep_wrapper.worker", "run",
+             "--journal", str(journal_path), "--haplogrep", str(launcher), "--lease", "60"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        for _ in range(3)
+    ]
+    for worker in workers:
+        assert worker.wait(timeout=120) == 0
+
+    jobs = BatchJournal(journal_path).jobs()
+    assert len(jobs) == len(inputs)
+    assert all(job.state == JobState.DONE and job.attempts == 1 for job in jobs)
+    assert all(is_complete_results_file(job.output_file) for job in jobs)
+
+    runs = Counter(line.strip() for line in log.read_text(encoding="utf-8").splitlines())
+    assert sorted(runs) == sorted(str(path) for path in inputs)
+    assert set(runs.values()) == {1}
+    assert not [p for p in output_dir.iterdir() if p.name.startswith(".staging-")]
+
+
+def test_job_taken_over_is_not_published(tmp_path, fake_haplogrep3, vcf_files):
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3))
+    journal = BatchJournal(tmp_path / "queue.db")
+    wrapper.enqueue(vcf_files(1), tmp_path / "results", journal)
+
+    first = journal.claim("node-a:1", lease=0.01)
+    time.sleep(0.05)
+    second = journal.claim("node-b:1", lease=60)
+    assert second.id == first.id
+
+    stale = wrapper.run_job(journal, first, staging_dir=tmp_path / ".staging-a")
+    assert not stale.success
+    assert not os.path.exists(first.output_file)
+    assert journal.get(first.output_file).worker == "node-b:1"
+
+    result = wrapper.run_job(journal, second, staging_dir=tmp_path / ".staging-b")
+    assert result.success
+    assert journal.get(second.output_file).state == JobState.DONE
+    assert journal.verify(journal.get(second.output_file))
+
+
+def test_lost_lease_cancels_the_running_process(tmp_path, fake_haplogrep3, vcf_files, monkeypatch):
+    monkeypatch.setenv("FAKE_HAPLOGREP3_HANG_RATE", "1")
+    monkeypatch.setenv("FAKE_HAPLOGREP3_HANG", "60")
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3), kill_grace=1.0)
+    journal = BatchJournal(tmp_path / "queue.db")
+    wrapper.enqueue(vcf_files(1), tmp_path / "results", journal)
+
+    worker = QueueWorker(wrapper, journal, lease=5.0, heartbeat_interval=0.1, worker="node-a:1")
+    job = journal.claim(worker.worker, lease=worker.lease)
+
+    def take_over():
+        time.sleep(0.5)
+        conn = sqlite3.connect(str(journal.path))
+        with conn:
+            conn.execute("UPDATE jobs SET worker = ? WHERE id = ?", ("node-b:1", job.id))
+        conn.close()
+
+    thief = threading.Thread(target=take_over)
+    thief.start()
+    started = time.perf_counter()
+    result = worker.process(job)
+    thief.join()
+
+    assert time.perf_counter() - started < 30
+    assert not result.success
+    assert not os.path.exists(job.output_file)
+    assert journal.get(job.output_file).state == JobState.RUNNING
+
+
+def test_journaled_batch_claims_with_leases(tmp_path, fake_haplogrep3, vcf_files, monkeypatch):
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3))
+    journal = BatchJournal(tmp_path / "queue.db")
+    inputs = vcf_files(2)
+    wrapper.enqueue(inputs, tmp_path / "results", journal)
+
+    # A node that died while holding a job
+    orphan = journal.claim("dead-node:1", lease=0.01)
+    time.sleep(0.05)
+
+    leases = []
+    claim = journal.claim
+
+    def recording_claim(worker=None, lease=None):
+        job = claim(worker, lease=lease)
+        if job is not None:
+            leases.append(journal.get(job.output_file).lease_expires)
+        return job
+
+    monkeypatch.setattr(journal, "claim", recording_claim)
+    results = wrapper.classify_batch(inputs, tmp_path / "results", journal=journal)
+
+    assert all(result.success for result in results)
+    job = journal.get(orphan.output_file)
+    assert job.state == JobState.DONE and job.worker != "dead-node:1"
+    assert len(leases) == 2 and None not in leases
+
+
+def test_run_removes_staging_dirs_of_dead_workers(tmp_path, fake_haplogrep3, vcf_files):
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3))
+    journal = BatchJournal(tmp_path / "queue.db")
+    output_dir = tmp_path / "results"
+    wrapper.enqueue(vcf_files(3), output_dir, journal)
+
+    held = journal.claim("node-a:1", lease=60)
+    expired = journal.claim("node-b:1", lease=0.01)
+    time.sleep(0.05)
+    for worker, job in [("node-a:1", held), ("node-b:1", expired), ("node-c:1", held)]:
+        staging_dir = output_dir / f".staging-{worker.replace(':', '-')}-{job.id}"
+        staging_dir.mkdir(parents=True)
+        (staging_dir / "partial.txt").write_text("SampleID", encoding="utf-8")
+
+    processed = QueueWorker(wrapper, journal, worker="node-d:1").run()
+
+    assert processed == 2
+    assert sorted(p.name for p in output_dir.iterdir() if p.name.startswith(".staging-")) == [
+        f".staging-node-a-1-{held.id}"
+    ]
+
+
+def test_cli_enqueue_does_not_need_haplogrep(tmp_path, vcf_files, capsys):
+    from haplogrep_wrapper.worker import main
+
+    inputs = vcf_files(2)
+    journal_path = tmp_path / "queue.db"
+    assert main([
+        "enqueue", "--journal", str(journal_path), "--output-dir", str(tmp_path / "results"),
+        "--tree", "phylotree-rcrs@17.2", "--hits", "2", *map(str, inputs)
+    ]) == 0
+
+    jobs = BatchJournal(journal_path).jobs()
+    assert "Enqueued 2 jobs" in capsys.readouterr().out
+    assert [job.params for job in jobs] == [{"tree": "phylotree-rcrs@17.2", "hits": 2}] * 2
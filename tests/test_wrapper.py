@@ -0,0 +1,39 @@
+"""Tests for Haplogrep3Wrapper."""
+
+import pytest
+
+from haplogrep_wrapper import Haplogrep3Result, Haplogrep3Wrapper
+
+
+def _failed(return_code: int) -> Haplogrep3Result:
+    return Haplogrep3Result(output_file="out.txt", success=False, stdout="", stderr="", return_code=return_code)
+
+
+@pytest.mark.parametrize("return_code, reason", [
+    (-9, "signal 9"),
+    (137, "signal 9"),
+    (143, "signal 15"),
+    (1, None),
+    (128, None),
+    (255, None),
+])
+def test_retry_reason_recognizes_signals_reported_by_the_launcher(return_code, reason):
+    assert Haplogrep3Wrapper._retry_reason(_failed(return_code)) == reason
+
+
+def test_hedging_needs_a_second_worker(tmp_path, fake_haplogrep3, vcf_files):
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3))
+
+    with pytest.raises(ValueError, match="max_workers"):
+        wrapper.classify_batch(vcf_files(1), tmp_path / "results", hedge_after=2.0)
+
+
+def test_stall_retry_gets_past_a_hanging_run(tmp_path, fake_haplogrep3, vcf_files, monkeypatch):
+    monkeypatch.setenv("FAKE_HAPLOGREP3_HANG_RATE", "1")
+    monkeypatch.setenv("FAKE_HAPLOGREP3_HANG", "60")
+    wrapper = Haplogrep3Wrapper(str(fake_haplogrep3), stall_timeout=1.0, retries=1, retry_backoff=0.0, kill_grace=1.0)
+
+    result = wrapper.classify(vcf_files(1)[0], tmp_path / "out.txt")
+
+    assert result.success
+    assert result.retry_reasons == ["stalled"]